@@ -0,0 +1,231 @@
+"""
+Throughput/latency benchmarks of the client against the fake engine in dockerxxx.testing.
+
+The engine runs in a separate process so it doesn't compete with the client for the
+event loop. Results can be saved as a baseline and later runs compared against it:
+
+    python benchmarks/run.py --save benchmarks/baseline.json
+    python benchmarks/run.py --compare benchmarks/baseline.json --tolerance 0.25
+
+Comparing exits with a non-zero status if any benchmark got slower than the baseline
+by more than the tolerance.
+
+benchmarks/baseline-lean.json holds the same run with the lean Unix socket client, to
+compare runs made with --http lean against:
+
+    python benchmarks/run.py --http lean --compare benchmarks/baseline-lean.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from typing import Awaitable, Callable, Dict
+from dockerxxx import AsyncDocker, __version__
+
+BENCHMARKS: Dict[str, Callable[[AsyncDocker, argparse.Namespace], Awaitable[int]]] = {}
+
+
+def benchmark(name: str):
+    """
+    Registers a benchmark. It is called with the client and the parsed arguments and
+    returns the number of items it processed, used to report a rate.
+    """
+
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+@benchmark("ping")
+async def ping(docker: AsyncDocker, args):
+    for _ in range(args.pings):
+        await docker.ping()
+    return args.pings
+
+
+@benchmark("containers.list")
+async def containers_list(docker: AsyncDocker, args):
+    return len(await docker.containers.list())
+
+
+@benchmark("containers.list.sparse")
+async def containers_list_sparse(docker: AsyncDocker, args):
+    return len(await docker.containers.list(sparse=True))
+
+
+@benchmark("containers.get")
+async def containers_get(docker: AsyncDocker, args):
+    for n in range(args.inspects):
+        await docker.containers.get(f"container{n % args.containers}")
+    return args.inspects
+
+
+@benchmark("logs.stream")
+async def logs_stream(docker: AsyncDocker, args):
+    container = await docker.containers.get("container0")
+    lines = 0
+    async for _ in await container.logs(stream=True):
+        lines += 1
+    return lines
+
+
+@benchmark("exec_run")
+async def exec_run(docker: AsyncDocker, args):
+    container = await docker.containers.get("container0")
+    received = 0
+    for _ in range(args.execs):
+        received += len((await container.exec_run("cat /dev/urandom")).output)
+    return received
+
+
+@benchmark("exec_run.stream")
+async def exec_run_stream(docker: AsyncDocker, args):
+    container = await docker.containers.get("container0")
+    received = 0
+    for _ in range(args.execs):
+        async for chunk in await container.exec_run("cat /dev/urandom", stream=True):
+            received += len(chunk)
+    return received
+
+
+@benchmark("events")
+async def events(docker: AsyncDocker, args):
+    return len([event async for event in docker.events(until=str(int(time.time())))])
+
+
+@benchmark("stats.stream")
+async def stats_stream(docker: AsyncDocker, args):
+    container = await docker.containers.get("container0")
+    return len([sample async for sample in await container.stats(stream=True)])
+
+
+@benchmark("export")
+async def export(docker: AsyncDocker, args):
+    container = await docker.containers.get("container0")
+    with tempfile.TemporaryDirectory(prefix='dockerxxx-bench-') as tmpdir:
+        return await (await container.export()).save(os.path.join(tmpdir, 'rootfs.tar'))
+
+
+async def wait_for_engine(url: str, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with AsyncDocker(base_url=url) as docker:
+                return await docker.ping()
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def run(args) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, func in BENCHMARKS.items():
+        if args.only and not any(pattern in name for pattern in args.only):
+            continue
+
+        timings = []
+        for _ in range(args.repeat):
+            # a fresh client per round so connection setup and model building count every time
+            docker = AsyncDocker(base_url=args.url, max_concurrency=args.max_concurrency,
+                                 decode_mode=args.decode_mode, http=args.http)
+            start = time.perf_counter()
+            items = await func(docker, args)
+            timings.append(time.perf_counter() - start)
+            await docker.aclose()
+
+        seconds = statistics.median(timings)
+        results[name] = {'seconds': seconds, 'items': items, 'per_second': items / seconds}
+        print(f"{name:<24} {seconds * 1000:10.2f} ms {items / seconds:14.1f} items/s", flush=True)
+
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline_path: str, tolerance: float) -> bool:
+    with open(baseline_path) as f:
+        baseline = json.load(f)['benchmarks']
+
+    ok = True
+    print(f"\ncompared to {baseline_path} (tolerance {tolerance:.0%})")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<24} no baseline")
+            continue
+
+        change = result['seconds'] / baseline[name]['seconds'] - 1
+        regressed = change > tolerance
+        ok &= not regressed
+        print(f"{name:<24} {change:+8.1%} {'REGRESSION' if regressed else ''}")
+
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help="benchmark an already running engine instead of spawning a fake one")
+    parser.add_argument('--only', action='append', help="only run benchmarks whose name contains this")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-concurrency', type=int, default=32)
+    parser.add_argument('--decode-mode', choices=['json', 'validate'], default='json')
+    parser.add_argument('--http', choices=['httpx', 'lean'], default='httpx', help="HTTP client of the transport")
+    parser.add_argument('--containers', type=int, default=1000)
+    parser.add_argument('--pings', type=int, default=1000)
+    parser.add_argument('--inspects', type=int, default=500)
+    parser.add_argument('--log-lines', type=int, default=100_000)
+    parser.add_argument('--execs', type=int, default=20)
+    parser.add_argument('--exec-output', type=int, default=1024 * 1024)
+    parser.add_argument('--events', type=int, default=20_000)
+    parser.add_argument('--stats-samples', type=int, default=2000)
+    parser.add_argument('--export-size', type=int, default=1024 ** 3, help="bytes of file data in the exported filesystem")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added by the engine to every response")
+    parser.add_argument('--save', metavar='PATH', help="write the results to PATH as a baseline")
+    parser.add_argument('--compare', metavar='PATH', help="compare the results to the baseline in PATH")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before failing a comparison")
+    args = parser.parse_args()
+
+    engine = None
+    tmpdir = tempfile.TemporaryDirectory(prefix='dockerxxx-bench-')
+    if args.url is None:
+        socket_path = os.path.join(tmpdir.name, 'docker.sock')
+        args.url = f"unix://{socket_path}"
+        engine = subprocess.Popen([
+            sys.executable, '-m', 'dockerxxx.testing', '--socket', socket_path,
+            '--containers', str(args.containers), '--log-lines', str(args.log_lines),
+            '--exec-output', str(args.exec_output), '--event-burst', str(args.events),
+            '--stats-samples', str(args.stats_samples), '--archive-size', str(args.export_size),
+            '--latency', str(args.latency)
+        ])
+
+    try:
+        asyncio.run(wait_for_engine(args.url))
+        results = asyncio.run(run(args))
+    finally:
+        if engine is not None:
+            engine.terminate()
+            engine.wait()
+        tmpdir.cleanup()
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'dockerxxx': __version__,
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'benchmarks': results
+            }, f, indent=2)
+            f.write('\n')
+
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+import os
+import json
+import time
+import asyncio
+import base64
+import inspect
+import tarfile
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional, BinaryIO, Tuple
+from pydantic import BaseModel, Field
+from ..utils import STREAM_CHUNK_SIZE
+from ..transports import SyncResponse
+
+# Go's os.ModeDir and os.ModeSymlink bits in the mode of a path stat
+MODE_DIR = 1 << 31
+MODE_SYMLINK = 1 << 27
+
+# how much of an archive read_file() reads past the file it wants before closing the connection
+ARCHIVE_DRAIN_LIMIT = 64 * 1024
+
+# ArchiveStream.save() hands chunks to its writer thread in batches of this size, reading
+# the next batch while the previous one is written
+SAVE_BATCH_SIZE = 1024 * 1024
+SAVE_BATCH_CHUNKS = 256
+
+ArchiveSource = bytes | str | os.PathLike | BinaryIO | Iterable[bytes] | AsyncIterable[bytes]
+
+_EXTENDED_TYPES = (tarfile.XHDTYPE, tarfile.XGLTYPE, tarfile.SOLARIS_XHDTYPE,
+                   tarfile.GNUTYPE_LONGNAME, tarfile.GNUTYPE_LONGLINK)
+
+
+class ContainerPathStat(BaseModel):
+    """
+    Stat of a path in a container, decoded from the X-Docker-Container-Path-Stat header
+    of the archive endpoints
+    """
+
+    name: str
+    size: int
+    mode: int
+    mtime: Optional[datetime] = None
+    link_target: str = Field('', alias='linkTarget')
+
+    @classmethod
+    def from_header(cls, value: str) -> "ContainerPathStat":
+        return cls.model_validate(json.loads(base64.b64decode(value)))
+
+    @property
+    def is_dir(self) -> bool:
+        return bool(self.mode & MODE_DIR)
+
+    @property
+    def is_symlink(self) -> bool:
+        return bool(self.mode & MODE_SYMLINK)
+
+    @property
+    def permissions(self) -> int:
+        return self.mode & 0o7777
+
+
+class ArchiveStream:
+    """
+    Tar archive of a get_archive() call (or an export) read from the daemon as it is
+    iterated, chunk_size bytes at a time. Iterating it to the end or aclose() releases
+    the connection.
+    """
+
+    def __init__(self, response, chunk_size: int = STREAM_CHUNK_SIZE):
+        self.response = response
+        self.chunk_size = chunk_size
+        self._chunks = self._iter_chunks()
+
+    @property
+    def stat(self) -> Optional[ContainerPathStat]:
+        header = self.response.headers.get('x-docker-container-path-stat')
+        return ContainerPathStat.from_header(header) if header else None
+
+    async def _iter_chunks(self):
+        try:
+            async for chunk in self.response.aiter_raw(self.chunk_size):
+                yield chunk
+        finally:
+            await self.response.aclose()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        return await self._chunks.__anext__()
+
+    async def aclose(self):
+        await self._chunks.aclose()
+        await self.response.aclose()
+
+    async def write_to(self, fileobj: Any) -> int:
+        """
+        Writes the archive into a binary file object (or one whose write() is a coroutine)
+        and returns the number of bytes written
+        """
+
+        written = 0
+        async for chunk in self:
+            result = fileobj.write(chunk)
+            if inspect.isawaitable(result):
+                await result
+            written += len(chunk)
+        return written
+
+    async def save(self, destination: str | os.PathLike | int) -> int:
+        """
+        Writes the archive to a file path or an open file descriptor and returns the number
+        of bytes written. Chunks are written in batches by a worker thread while the next
+        batch is read, so the event loop never blocks on the disk and at most two batches are
+        held in memory. The synchronous client writes in place.
+        """
+
+        fd = destination if isinstance(destination, int) else os.open(
+            destination, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644
+        )
+        blocking = isinstance(self.response, SyncResponse)
+        written, batch, batched, pending = 0, [], 0, None
+        try:
+            async for chunk in self:
+                written += len(chunk)
+                if blocking:
+                    write_all(fd, [chunk])
+                    continue
+
+                batch.append(chunk)
+                batched += len(chunk)
+                if batched >= SAVE_BATCH_SIZE or len(batch) >= SAVE_BATCH_CHUNKS:
+                    if pending is not None:
+                        await pending
+                    pending = asyncio.ensure_future(asyncio.to_thread(write_all, fd, batch))
+                    batch, batched = [], 0
+
+            if pending is not None:
+                await pending
+            if batch:
+                await asyncio.to_thread(write_all, fd, batch)
+        finally:
+            if pending is not None and not pending.done():
+                # the thread can't be interrupted, let it finish before closing the file
+                await asyncio.wait([pending])
+            if not isinstance(destination, int):
+                os.close(fd)
+        return written
+
+
+def write_all(fd: int, chunks: List[bytes]):
+    """
+    Writes chunks to fd with as few writev() calls as possible, without joining them
+    """
+
+    views = [memoryview(chunk) for chunk in chunks]
+    while views:
+        n = os.writev(fd, views)
+        while views and n >= len(views[0]):
+            n -= len(views.pop(0))
+        if n:
+            views[0] = views[0][n:]
+
+
+async def iter_in_thread(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Runs a blocking iterator of chunks (file reads, compression) in a worker thread, one
+    chunk ahead of the consumer
+    """
+
+    pending: Optional[asyncio.Future] = asyncio.ensure_future(asyncio.to_thread(next, chunks, None))
+    try:
+        while (chunk := await asyncio.shield(pending)) is not None:
+            pending = asyncio.ensure_future(asyncio.to_thread(next, chunks, None))
+            yield chunk
+        pending = None
+    finally:
+        if pending is not None:
+            # the iterator can't be closed while the thread is running it
+            await asyncio.wait([pending])
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def read_chunks(source: str | os.PathLike | BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield from read_chunks(f, chunk_size)
+        return
+
+    while chunk := source.read(chunk_size):
+        yield chunk
+
+
+async def iter_source(source: ArchiveSource, chunk_size: int = STREAM_CHUNK_SIZE,
+                      blocking: bool = False) -> AsyncIterator[bytes]:
+    """
+    Reads a file path or object, or an iterable or async iterable of chunks, chunk by chunk.
+    Files are read in a worker thread unless blocking (synchronous client).
+    """
+
+    if isinstance(source, (str, os.PathLike)) or hasattr(source, 'read'):
+        chunks = read_chunks(source, chunk_size)
+        async for chunk in (iter_source(chunks) if blocking else iter_in_thread(chunks)):
+            yield chunk
+    elif isinstance(source, AsyncIterable):
+        async for chunk in source:
+            yield chunk
+    else:
+        for chunk in source:
+            yield chunk
+
+
+def archive_content(source: ArchiveSource, chunk_size: int = STREAM_CHUNK_SIZE,
+                    blocking: bool = False) -> bytes | AsyncIterator[bytes]:
+    """
+    Request content for an archive upload: bytes are sent as is, anything else is
+    streamed so the archive is never held in memory
+    """
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source if isinstance(source, bytes) else bytes(source)
+    return iter_source(source, chunk_size, blocking)
+
+
+def parse_pax_headers(data: bytes) -> Dict[str, str]:
+    headers, pos = {}, 0
+    while pos < len(data) and data[pos] != 0:
+        space = data.index(b' ', pos)
+        length = int(data[pos:space])
+        key, _, value = data[space + 1:pos + length - 1].partition(b'=')
+        headers[key.decode()] = value.decode('utf-8', 'surrogateescape')
+        pos += length
+    return headers
+
+
+class TarParser:
+    """
+    Incremental tar reader. Chunks are fed as they arrive and the contents of members
+    come out as (TarInfo, memoryview) slices of those chunks, starting with an empty slice
+    when a member begins so empty files and directories show up too. PAX and GNU long
+    name headers are applied to the member that follows them.
+    """
+
+    def __init__(self):
+        self.done = False
+        self._header = bytearray()
+        self._member: Optional[tarfile.TarInfo] = None
+        self._extended: Optional[tarfile.TarInfo] = None
+        self._extended_data = bytearray()
+        self._overrides: Dict[str, str] = {}
+        self._remaining = 0
+        self._padding = 0
+
+    def feed(self, chunk: bytes) -> Iterator[Tuple[tarfile.TarInfo, memoryview]]:
+        view = memoryview(chunk)
+        pos, size = 0, len(view)
+        while pos < size and not self.done:
+            if self._remaining:
+                n = min(self._remaining, size - pos)
+                if self._extended is not None:
+                    self._extended_data += view[pos:pos + n]
+                else:
+                    yield self._member, view[pos:pos + n]
+                pos += n
+                self._remaining -= n
+                if not self._remaining and self._extended is not None:
+                    self._apply_extended()
+                continue
+
+            if self._padding:
+                n = min(self._padding, size - pos)
+                pos += n
+                self._padding -= n
+                continue
+
+            n = min(tarfile.BLOCKSIZE - len(self._header), size - pos)
+            self._header += view[pos:pos + n]
+            pos += n
+            if len(self._header) < tarfile.BLOCKSIZE:
+                continue
+
+            header = bytes(self._header)
+            self._header.clear()
+            if header == tarfile.NUL * tarfile.BLOCKSIZE:
+                self.done = True
+                break
+
+            info = tarfile.TarInfo.frombuf(header, 'utf-8', 'surrogateescape')
+            data_size = info.size
+            if info.type in _EXTENDED_TYPES:
+                self._extended = info
+            else:
+                self._member = self._override(info)
+                data_size = self._member.size if self._member.isreg() else 0
+                yield self._member, view[pos:pos]
+
+            self._remaining = data_size
+            self._padding = -data_size % tarfile.BLOCKSIZE
+            if not data_size and self._extended is not None:
+                self._apply_extended()
+
+    def _apply_extended(self):
+        data, info = bytes(self._extended_data), self._extended
+        self._extended, self._extended_data = None, bytearray()
+
+        if info.type == tarfile.GNUTYPE_LONGNAME:
+            self._overrides['path'] = data.rstrip(tarfile.NUL).decode('utf-8', 'surrogateescape')
+        elif info.type == tarfile.GNUTYPE_LONGLINK:
+            self._overrides['linkpath'] = data.rstrip(tarfile.NUL).decode('utf-8', 'surrogateescape')
+        elif info.type != tarfile.XGLTYPE:
+            self._overrides.update(parse_pax_headers(data))
+
+    def _override(self, info: tarfile.TarInfo) -> tarfile.TarInfo:
+        overrides, self._overrides = self._overrides, {}
+        if 'path' in overrides:
+            info.name = overrides['path']
+        if 'linkpath' in overrides:
+            info.linkname = overrides['linkpath']
+        if 'size' in overrides:
+            info.size = int(overrides['size'])
+        if 'mtime' in overrides:
+            info.mtime = float(overrides['mtime'])
+        return info
+
+
+def tar_member(name: str, data: bytes, mode: int = 0o644, mtime: Optional[float] = None) -> bytes:
+    """
+    Builds a tar archive holding a single file, in memory
+    """
+
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = mode
+    info.mtime = time.time() if mtime is None else mtime
+    return b''.join([
+        info.tobuf(tarfile.PAX_FORMAT), data,
+        tarfile.NUL * (-len(data) % tarfile.BLOCKSIZE + 2 * tarfile.BLOCKSIZE)
+    ])
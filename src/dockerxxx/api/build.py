@@ -0,0 +1,195 @@
+import os
+import re
+import stat
+import zlib
+import tarfile
+import posixpath
+from typing import AsyncIterator, Iterable, Iterator, List, Tuple
+from .archive import iter_in_thread
+
+# size of the chunks of a build context, each one is a trip to the worker thread producing it
+CONTEXT_CHUNK_SIZE = 1024 * 1024
+
+
+def _translate(pattern: str) -> str:
+    """
+    Converts a .dockerignore pattern to a regex with the daemon's semantics: * and ? don't
+    match /, ** matches any number of directories
+    """
+
+    regex, i = '', 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '*':
+            if pattern[i + 1:i + 2] == '*':
+                i += 1
+                if pattern[i + 1:i + 2] == '/':
+                    i += 1
+                    regex += '(?:.*/)?'
+                else:
+                    regex += '.*'
+            else:
+                regex += '[^/]*'
+        elif c == '?':
+            regex += '[^/]'
+        elif c == '[' and (end := pattern.find(']', i + 1)) != -1:
+            chars = pattern[i + 1:end]
+            regex += '[' + ('^' + chars[1:] if chars[:1] in ('!', '^') else chars) + ']'
+            i = end
+        elif c == '\\' and i + 1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        else:
+            regex += re.escape(c)
+        i += 1
+    return regex
+
+
+class DockerIgnore:
+    """
+    Matcher for the patterns of a .dockerignore file. The last pattern matching a path
+    decides, patterns starting with ! re-include what earlier ones excluded, and a pattern
+    matching a directory excludes everything under it.
+
+    https://docs.docker.com/engine/reference/builder/#dockerignore-file
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.patterns: List[Tuple[re.Pattern, bool, int]] = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith('#'):
+                continue
+
+            exclusion = pattern.startswith('!')
+            pattern = posixpath.normpath(pattern.removeprefix('!').strip()).lstrip('/')
+            self.patterns.append((re.compile(_translate(pattern)), exclusion, pattern.count('/') + 1))
+
+    @classmethod
+    def from_context(cls, path: str) -> "DockerIgnore":
+        try:
+            with open(os.path.join(path, '.dockerignore')) as f:
+                return cls(f.read().splitlines())
+        except FileNotFoundError:
+            return cls()
+
+    @property
+    def has_exclusions(self) -> bool:
+        return any(exclusion for _, exclusion, _ in self.patterns)
+
+    def excluded(self, path: str) -> bool:
+        """
+        Whether path, relative to the context with / separators, is left out of it
+        """
+
+        excluded, parts = False, path.split('/')
+        for regex, exclusion, depth in self.patterns:
+            match = regex.fullmatch(path) is not None
+            if not match and depth < len(parts):
+                match = regex.fullmatch('/'.join(parts[:depth])) is not None
+            if match:
+                excluded = not exclusion
+        return excluded
+
+
+def _tar_entries(path: str, ignore: DockerIgnore, keep: Iterable[str]) -> Iterator[bytes]:
+    keep = set(keep)
+    # without ! patterns nothing under an excluded directory can come back, skip it whole
+    prune = not ignore.has_exclusions
+
+    def walk(directory: str, prefix: str) -> Iterator[bytes]:
+        with os.scandir(directory) as scan:
+            entries = sorted(scan, key=lambda entry: entry.name)
+
+        for entry in entries:
+            name = prefix + entry.name
+            st = entry.stat(follow_symlinks=False)
+            excluded = ignore.excluded(name) and name not in keep
+            is_dir = stat.S_ISDIR(st.st_mode)
+            if excluded and (prune or not is_dir):
+                continue
+
+            if not excluded:
+                info = tarfile.TarInfo(name)
+                info.mode = stat.S_IMODE(st.st_mode)
+                info.mtime = int(st.st_mtime)
+                if is_dir:
+                    info.type = tarfile.DIRTYPE
+                elif stat.S_ISLNK(st.st_mode):
+                    info.type = tarfile.SYMTYPE
+                    info.linkname = os.readlink(entry.path)
+                elif stat.S_ISREG(st.st_mode):
+                    info.size = st.st_size
+                else:
+                    # sockets, fifos and devices can't be sent
+                    continue
+
+                yield info.tobuf(tarfile.PAX_FORMAT)
+                if info.isreg():
+                    yield from _file_data(entry.path, info.size)
+
+            if is_dir:
+                yield from walk(entry.path, name + '/')
+
+    yield from walk(path, '')
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+
+
+def _file_data(path: str, size: int) -> Iterator[bytes]:
+    # exactly size bytes, as announced in the header, even if the file changes meanwhile
+    remaining = size
+    with open(path, 'rb') as f:
+        while remaining and (chunk := f.read(min(CONTEXT_CHUNK_SIZE, remaining))):
+            remaining -= len(chunk)
+            yield chunk
+    yield tarfile.NUL * (remaining + (-size % tarfile.BLOCKSIZE))
+
+
+def iter_build_context(path: str, dockerfile: str = 'Dockerfile', gzip: bool = False,
+                       chunk_size: int = CONTEXT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Generates the tar of the build context in path chunk by chunk, leaving out what its
+    .dockerignore excludes (except the .dockerignore and the Dockerfile themselves, which
+    the daemon reads), gzip compressed if asked. Nothing is written to disk.
+    """
+
+    ignore = DockerIgnore.from_context(path)
+    compressor = zlib.compressobj(wbits=31) if gzip else None
+    pieces, buffered = [], 0
+
+    def flush() -> bytes:
+        data = b''.join(pieces)
+        pieces.clear()
+        return compressor.compress(data) if compressor else data
+
+    for piece in _tar_entries(path, ignore, ('.dockerignore', posixpath.normpath(dockerfile))):
+        pieces.append(piece)
+        buffered += len(piece)
+        if buffered >= chunk_size:
+            if data := flush():
+                yield data
+            buffered = 0
+
+    data = flush()
+    if compressor:
+        data += compressor.flush()
+    if data:
+        yield data
+
+
+async def build_context(path: str, dockerfile: str = 'Dockerfile', gzip: bool = False,
+                        blocking: bool = False) -> AsyncIterator[bytes]:
+    """
+    iter_build_context() for an upload: the files are read and compressed in a worker
+    thread, the next chunk while the previous one is sent. Blocking (synchronous client)
+    contexts are generated in place.
+    """
+
+    chunks = iter_build_context(path, dockerfile, gzip)
+    if blocking:
+        for chunk in chunks:
+            yield chunk
+        return
+
+    async for chunk in iter_in_thread(chunks):
+        yield chunk
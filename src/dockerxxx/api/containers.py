@@ -1,9 +1,11 @@
-import asyncio
-from typing import List, Optional, Dict, Any
+import json
+import posixpath
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 from datetime import datetime
 from .images import Image
-from .exec import Exec, ExecCreateConfig, ExecStartConfig, ExecResults
-from .generics import Response
+from .exec import Exec, ExecCreateConfig, ExecStartConfig, ExecResults, ExecStream, ExecSocket
+from .archive import ArchiveStream, ArchiveSource, ContainerPathStat, TarParser, ARCHIVE_DRAIN_LIMIT, archive_content, tar_member
+from .generics import SparseModel
 from ..models import (
     ContainerSummary, ContainerConfig, 
     ContainerCreateResponse, ContainerWaitResponse, 
@@ -11,10 +13,13 @@ from ..models import (
     NetworkSettings, MountPoint, RestartPolicy
 )
 from ..transports import BaseTransport
-from ..errors import ContainerError
+from ..concurrency import FanOut
+from ..cache import InspectCache
+from ..errors import ContainerError, DockerException
 from ..utils import (
-    split_command, convert_filters, get_raw_response_socket, 
-    get_results, frames_iter, parse_bytes
+    split_command, convert_filters,
+    demux_buffer, frames_iter, parse_bytes, is_not_found, FrameDemuxer,
+    JSONStreamDecoder, parse_timestamp, STREAM_CHUNK_SIZE
 )
 from pydantic import field_validator
 from pydantic import BaseModel, Field, ConfigDict
@@ -32,6 +37,8 @@ class ContainerUpdateResponse(BaseModel):
     warnings: List[str] = Field(alias="Warnings")
 
 class ContainerUpdateConfig(BaseModel):
+    model_config = ConfigDict(defer_build=True)
+
     blkio_weight: Optional[int] = Field(None, alias='BlkioWeight')
     cpu_period: Optional[int] = Field(None, alias='CpuPeriod')
     cpu_quota: Optional[int] = Field(None, alias='CpuQuota')
@@ -66,7 +73,93 @@ class ContainerAttachParams(BaseModel):
     stream: int = 0
     logs: int = 0
 
+class ContainerStatsSample(BaseModel):
+    """
+    A single sample of the stats stream with the rates the docker CLI shows precomputed.
+    I/O counters are cumulative, deltas and rates are relative to the previous sample.
+    """
+
+    read: float
+    cpu_percent: float
+    online_cpus: int
+    memory_usage: int
+    memory_limit: int
+    memory_percent: float
+    net_rx_bytes: int
+    net_tx_bytes: int
+    blk_read_bytes: int
+    blk_write_bytes: int
+    net_rx_delta: int = 0
+    net_tx_delta: int = 0
+    blk_read_delta: int = 0
+    blk_write_delta: int = 0
+    net_rx_rate: float = 0.0
+    net_tx_rate: float = 0.0
+    blk_read_rate: float = 0.0
+    blk_write_rate: float = 0.0
+    pids: int = 0
+
+    @classmethod
+    def from_stats(cls, stats: Dict[str, Any], previous: Optional["ContainerStatsSample"] = None):
+        """
+        https://github.com/docker/cli/blob/master/cli/command/container/stats_helpers.go
+        """
+
+        cpu_stats, precpu_stats = stats.get('cpu_stats') or {}, stats.get('precpu_stats') or {}
+        cpu_usage = cpu_stats.get('cpu_usage') or {}
+        online_cpus = cpu_stats.get('online_cpus') or len(cpu_usage.get('percpu_usage') or ()) or 1
+        cpu_delta = cpu_usage.get('total_usage', 0) - (precpu_stats.get('cpu_usage') or {}).get('total_usage', 0)
+        system_delta = cpu_stats.get('system_cpu_usage', 0) - precpu_stats.get('system_cpu_usage', 0)
+        cpu_percent = cpu_delta / system_delta * online_cpus * 100.0 if cpu_delta > 0 and system_delta > 0 else 0.0
+
+        memory_stats = stats.get('memory_stats') or {}
+        memory = memory_stats.get('stats') or {}
+        # cgroup v1 reports total_inactive_file, v2 inactive_file
+        cache = memory.get('total_inactive_file', memory.get('inactive_file', 0))
+        memory_usage = memory_stats.get('usage', 0)
+        memory_usage = memory_usage - cache if cache < memory_usage else memory_usage
+        memory_limit = memory_stats.get('limit', 0)
+
+        net_rx = net_tx = 0
+        for interface in (stats.get('networks') or {}).values():
+            net_rx += interface.get('rx_bytes', 0)
+            net_tx += interface.get('tx_bytes', 0)
+
+        blk_read = blk_write = 0
+        for entry in (stats.get('blkio_stats') or {}).get('io_service_bytes_recursive') or ():
+            op = entry.get('op', '').lower()
+            if op == 'read':
+                blk_read += entry.get('value', 0)
+            elif op == 'write':
+                blk_write += entry.get('value', 0)
+
+        sample = dict(
+            read=parse_timestamp(stats['read']),
+            cpu_percent=cpu_percent,
+            online_cpus=online_cpus,
+            memory_usage=memory_usage,
+            memory_limit=memory_limit,
+            memory_percent=memory_usage / memory_limit * 100.0 if memory_limit else 0.0,
+            net_rx_bytes=net_rx,
+            net_tx_bytes=net_tx,
+            blk_read_bytes=blk_read,
+            blk_write_bytes=blk_write,
+            pids=(stats.get('pids_stats') or {}).get('current', 0)
+        )
+
+        if previous is not None:
+            elapsed = sample['read'] - previous.read
+            for counter in ('net_rx', 'net_tx', 'blk_read', 'blk_write'):
+                delta = max(sample[f'{counter}_bytes'] - getattr(previous, f'{counter}_bytes'), 0)
+                sample[f'{counter}_delta'] = delta
+                sample[f'{counter}_rate'] = delta / elapsed if elapsed > 0 else 0.0
+
+        # every value is computed here, skip validation
+        return cls.model_construct(**sample)
+
 class ContainerInspectResponse(BaseModel):
+    model_config = ConfigDict(defer_build=True)
+
     id: str = Field(alias='Id', description='The ID of this container')
     created: str = Field(alias='Created', description='When the container was created')
     path: str = Field(alias='Path')
@@ -96,11 +189,40 @@ class ContainerInspectResponse(BaseModel):
     config: Optional[ContainerConfig] = Field(None, alias='Config')
     network_settings: Optional[NetworkSettings] = Field(None, alias='NetworkSettings')
 
-class Container(ContainerInspectResponse):
+class SparseContainerConfig(SparseModel, ContainerConfig):
+    pass
+
+class Container(SparseModel, ContainerInspectResponse):
     model_config = ConfigDict(validate_assignment=True)
 
     transport: Optional[BaseTransport] = Field(None)
 
+    @classmethod
+    def from_summary(cls, summary: ContainerSummary, transport: BaseTransport = None) -> "Container":
+        """
+        Builds a sparse container from a /containers/json entry without inspecting it
+        """
+
+        config = {'image': summary.image}
+        if summary.labels is not None:
+            config['labels'] = summary.labels
+
+        values = {
+            'id': summary.id[:12],
+            'state': ContainerState.model_validate({'Status': summary.state}),
+            'config': SparseContainerConfig.sparse_construct(**config),
+            'transport': transport
+        }
+
+        if summary.names:
+            values['name'] = summary.names[0].strip('/')
+        if summary.image_id:
+            values['image'] = summary.image_id.split(':')[-1][:12]
+        if summary.mounts is not None:
+            values['mounts'] = summary.mounts
+
+        return cls.sparse_construct(**values)
+
     @property
     def status(self) -> str:
         return self.state.status.value
@@ -120,42 +242,40 @@ class Container(ContainerInspectResponse):
     async def attach_socket(self, stdin: bool = False, stdout: bool = True, 
                             stderr: bool = True, stream: bool = True, logs: bool = False):
 
-        req = self.transport.client.build_request(
+        return await self.transport.hijack(
             "POST",
             f"/containers/{self.id}/attach",
             params=ContainerAttachParams(
                 stdin=stdin, stdout=stdout, 
-                stderr=stderr, stream=stream, logs=logs).model_dump(),
-            headers={
-                'Connection': 'Upgrade',
-                'Upgrade': 'tcp'
-            }
+                stderr=stderr, stream=stream, logs=logs).model_dump()
         )
 
-        r = await self.transport.client.send(req, stream=True)
-        return r, get_raw_response_socket(self.transport.client)
-
     async def attach(self, stdout: bool = True, stderr: bool = True,
                stream: bool = False, logs: bool = False, demux: bool = False):
 
-        try:
-            rstream, sock = await self.attach_socket(
-                stdout=stdout, stderr=stderr,
-                stream=stream, logs=logs
-            )
+        await self._ensure_inspected()
+        rstream, sock = await self.attach_socket(
+            stdout=stdout, stderr=stderr,
+            stream=stream, logs=logs
+        )
 
+        try:
             return b''.join(
-                [frame[1] async for frame in await frames_iter(sock, self.config.tty)]
+                [frame[1] async for frame in frames_iter(sock, self.config.tty)]
             )
         finally:
             await rstream.aclose()
 
+    async def _ensure_inspected(self):
+        if self.sparse:
+            await self.reload()
+
     async def commit(self):
         raise NotImplementedError
 
     async def inspect(self):
         r = await self.transport.client.get(f"/containers/{self.id}/json")
-        return ContainerInspectResponse.model_validate(r.json())
+        return self.transport.decode(ContainerInspectResponse, r)
 
     async def diff(self):
         raise NotImplementedError
@@ -163,7 +283,12 @@ class Container(ContainerInspectResponse):
     async def exec_run(self, cmd: str, stdout: bool = True, stderr: bool = True, stdin: bool = False, tty: bool = False,
                         privileged: bool = False, user: str = '', detach: bool = False, stream: bool = False,
                         socket: bool = False, environment: Dict[str, str] | List[str] = None, 
-                        workdir: str = None, demux: bool = False) -> ExecResults:
+                        workdir: str = None, demux: bool = False) -> ExecResults | ExecStream | ExecSocket:
+        """
+        Runs cmd in the container. With stream=True the output is returned as an ExecStream
+        as soon as the exec starts, its exit_code is set once the stream is exhausted.
+        With socket=True (and stdin=True to write to it) an ExecSocket is returned instead.
+        """
 
         exec_session = Exec(transport=self.transport)
 
@@ -183,6 +308,9 @@ class Container(ContainerInspectResponse):
                 demux=demux
         ))
 
+        if (stream or socket) and not detach:
+            return output
+
         inspection = await exec_session.inspect(resp['Id'])
 
         return ExecResults(
@@ -190,11 +318,105 @@ class Container(ContainerInspectResponse):
             output=output
         )
 
-    async def export(self):
-        raise NotImplementedError
+    async def export(self, chunk_size: int = STREAM_CHUNK_SIZE) -> ArchiveStream:
+        """
+        Returns the container's filesystem as a tar archive, an ArchiveStream read chunk by
+        chunk. Use its save() to write it to a file.
 
-    async def get_archive(self):
-        raise NotImplementedError
+        https://github.com/docker/docker-py/blob/6ceb08273c157cbab7b5c77bd71e7389f1a6acc5/docker/api/container.py#L717
+        """
+
+        request = self.transport.stream_client.build_request("GET", f"/containers/{self.id}/export")
+        return ArchiveStream(await self.transport.stream_client.send(request, stream=True), chunk_size)
+
+    async def get_archive(self, path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Tuple[ArchiveStream, ContainerPathStat]:
+        """
+        Returns the tar archive of path as an ArchiveStream read chunk by chunk, and the
+        stat of path
+
+        https://github.com/docker/docker-py/blob/6ceb08273c157cbab7b5c77bd71e7389f1a6acc5/docker/api/container.py#L740
+        """
+
+        request = self.transport.stream_client.build_request(
+            "GET", f"/containers/{self.id}/archive", params={'path': path}
+        )
+        archive = ArchiveStream(await self.transport.stream_client.send(request, stream=True), chunk_size)
+        return archive, archive.stat
+
+    async def stat_archive(self, path: str) -> ContainerPathStat:
+        """
+        Returns the stat of path without downloading its archive
+        """
+
+        r = await self.transport.client.head(f"/containers/{self.id}/archive", params={'path': path})
+        return ContainerPathStat.from_header(r.headers['x-docker-container-path-stat'])
+
+    async def put_archive(self, path: str, data: ArchiveSource, chunk_size: int = STREAM_CHUNK_SIZE) -> bool:
+        """
+        Extracts a tar archive into the directory path. data can be bytes, a file path or
+        binary file object or an (async) iterable of chunks, anything but bytes is streamed
+        to the daemon.
+        """
+
+        r = await self.transport.stream_client.put(
+            f"/containers/{self.id}/archive",
+            params={'path': path},
+            headers={'Content-Type': 'application/x-tar'},
+            content=archive_content(data, chunk_size, self.transport.blocking)
+        )
+        return r.status_code == 200
+
+    async def read_file(self, path: str, follow_symlinks: int = 8) -> bytes:
+        """
+        Returns the contents of the file at path. The archive of path is parsed as it
+        arrives and only read up to the end of the file, in a single request (one more per
+        symlink followed).
+        """
+
+        archive, stat = await self.get_archive(path)
+        parser, data, member = TarParser(), [], None
+        received = drained = 0
+        try:
+            async for chunk in archive:
+                if member is not None and (not member.isreg() or received == member.size):
+                    # past the file only the end of the archive is left, reading it keeps the connection
+                    drained += len(chunk)
+                    if drained > ARCHIVE_DRAIN_LIMIT:
+                        break
+
+                for info, piece in parser.feed(chunk):
+                    if member is None:
+                        if info.isdir():
+                            raise DockerException(f"{path} is a directory")
+                        member = info
+                    if info is member and piece:
+                        data.append(piece)
+                        received += len(piece)
+
+                if parser.done:
+                    break
+        finally:
+            await archive.aclose()
+
+        if member is None:
+            raise DockerException(f"{path} is not a file")
+        if member.issym():
+            if follow_symlinks <= 0:
+                raise DockerException(f"Too many levels of symbolic links in {path}")
+            target = posixpath.join(posixpath.dirname(path), stat.link_target or member.linkname)
+            return await self.read_file(target, follow_symlinks - 1)
+        return b''.join(data)
+
+    async def write_file(self, path: str, data: bytes | str, mode: int = 0o644) -> bool:
+        """
+        Writes data to the file at path, whose directory must exist. The file is sent as a
+        single-member tar archive built in memory.
+        """
+
+        if isinstance(data, str):
+            data = data.encode()
+        directory, name = posixpath.split(path)
+        return await self.put_archive(directory or '/', tar_member(name, data, mode))
 
     async def update(self, blkio_weight: int = None, cpu_period: int = None, cpu_quota: int = None,
         cpu_shares: int = None, cpuset_cpus: str = None, cpuset_mems: str = None, mem_limit: float | str = None,
@@ -211,7 +433,7 @@ class Container(ContainerInspectResponse):
             ).model_dump(by_alias=True)
         )
 
-        return ContainerUpdateResponse.model_validate(r.json())
+        return self.transport.decode(ContainerUpdateResponse, r)
 
     async def start(self):
         await self.transport.client.post(f"/containers/{self.id}/start")
@@ -234,7 +456,7 @@ class Container(ContainerInspectResponse):
         )
 
     async def restart(self):
-        await self.transport.client.post(
+        await self.transport.stream_client.post(
             f"/containers/{self.id}/restart",
             timeout=None
         )
@@ -256,17 +478,16 @@ class Container(ContainerInspectResponse):
         )
 
     async def _logs_stream(self, container_log_params: ContainerLogParams):
-        async with self.transport.client.stream(
+        await self._ensure_inspected()
+        async with self.transport.stream_client.stream(
             "GET",
             f"/containers/{self.id}/logs",
             params=container_log_params.model_dump()
         ) as r:
-            #raw_sock = get_raw_response_socket(self.transport.client)
-            #async for frame in await frames_iter(raw_sock, self.config.tty):
-            #    _, result = frame
-            #    yield result
-            async for chunk in r.aiter_bytes():
-                yield await get_results(chunk, self.config.tty)
+            demuxer = FrameDemuxer(self.config.tty)
+            async for chunk in r.aiter_raw():
+                for _, data in demuxer.feed(chunk):
+                    yield bytes(data)
 
     async def logs(self, stdout: bool = True, stderr: bool = True, stream: bool = False,
              timestamps: bool = False, tail: str | int = 'all', since: str = None, follow: bool = False,
@@ -281,12 +502,13 @@ class Container(ContainerInspectResponse):
         if stream:
             return self._logs_stream(log_params)
 
+        await self._ensure_inspected()
         r = await self.transport.client.get(
             f"/containers/{self.id}/logs",
             params=log_params.model_dump()
         )
 
-        return await get_results(r.content, self.config.tty)
+        return demux_buffer(r.content, self.config.tty)
 
     async def top(self, ps_args: str = None):
         r = await self.transport.client.get(
@@ -296,21 +518,44 @@ class Container(ContainerInspectResponse):
         return r.json()
 
     async def wait(self, timeout: int = None, condition: str = None):
-        r = await self.transport.client.post(
+        r = await self.transport.stream_client.post(
             f"/containers/{self.id}/wait",
             params={"condition": condition},
             timeout=timeout
         )
 
-        return ContainerWaitResponse.model_validate(r.json())
+        return self.transport.decode(ContainerWaitResponse, r)
 
     async def reload(self):
         r = await self.transport.client.get(f"/containers/{self.id}/json")
-        inspect = ContainerInspectResponse.model_validate(r.json())
+        inspect = self.transport.decode(ContainerInspectResponse, r)
         for k in inspect.model_fields:
             setattr(self, k, getattr(inspect, k))
 
+    async def _stats_stream(self) -> AsyncIterator[ContainerStatsSample]:
+        decoder = JSONStreamDecoder()
+        previous = None
+
+        async with self.transport.stream_client.stream(
+            "GET",
+            f"/containers/{self.id}/stats",
+            params={'stream': True},
+            timeout=None
+        ) as r:
+            async for chunk in r.aiter_raw():
+                for document in decoder.feed(chunk):
+                    previous = ContainerStatsSample.from_stats(json.loads(document), previous)
+                    yield previous
+
     async def stats(self, stream: bool = False, one_shot: bool = None):
+        """
+        Returns the raw stats dict, or with stream=True an async iterator of
+        ContainerStatsSample read incrementally from the daemon's stats feed
+        """
+
+        if stream:
+            return self._stats_stream()
+
         stats = await self.transport.client.get(
             f"/containers/{self.id}/stats",
             params={'stream': stream, 'one-shot': one_shot}
@@ -327,6 +572,8 @@ class Container(ContainerInspectResponse):
 
 class Containers(BaseModel):
     transport: BaseTransport
+    fanout: FanOut = Field(default_factory=FanOut)
+    cache: Optional[InspectCache] = None
 
     async def run(self, image: str | Image, command=None, stdout=True, stderr=False, remove=False, **kwargs):
         output = None
@@ -426,7 +673,7 @@ class Containers(BaseModel):
             json=ContainerConfig.model_validate(kwargs).model_dump(by_alias=True)
         )
 
-        container = ContainerCreateResponse.model_validate(r.json())
+        container = self.transport.decode(ContainerCreateResponse, r)
         return await self.get(container)
 
     async def get(self, container: str | ContainerSummary | ContainerCreateResponse) -> Container:
@@ -439,9 +686,19 @@ class Containers(BaseModel):
         else:
             raise NotImplementedError
 
+        if self.cache is not None:
+            cached = self.cache.get('container', container_id)
+            if cached is not None:
+                return cached
+            token = self.cache.token()
+
         r = await self.transport.client.get(f"/containers/{container_id}/json")
-        container = Container.model_validate(r.json())
-        container.transport =  self.transport
+        container = self.transport.decode(Container, r)
+        container.transport = self.transport
+
+        if self.cache is not None:
+            self.cache.put('container', container_id, container, container.id, token)
+
         return container
 
     async def list(self, all: bool = False, before: str = None,
@@ -456,10 +713,14 @@ class Containers(BaseModel):
             ).model_dump()
         )
 
-        containers = Response[ContainerSummary](data=r.json()).data
-        return await asyncio.gather(*[
-            self.get(container.id) for container in containers
-        ])
+        containers = self.transport.decode(List[ContainerSummary], r)
+        if sparse:
+            return [Container.from_summary(container, self.transport) for container in containers]
+
+        return await self.fanout.map(
+            self.get, [container.id for container in containers],
+            skip=is_not_found if ignore_removed else None
+        )
 
     async def prune(self):
         raise NotImplementedError
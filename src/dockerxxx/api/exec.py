@@ -1,12 +1,136 @@
-from typing import List, Optional, Dict, Any
+import socket
+import asyncio
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterable, Iterable
 from pydantic import BaseModel, Field, field_validator
 from ..utils import split_command
 from ..transports import BaseTransport
-from ..utils import get_raw_response_socket, frames_iter
+from ..utils import frames_iter, STDERR, STREAM_CHUNK_SIZE
 
 class ExecResults(BaseModel):
-    exit_code: int
-    output: bytes
+    exit_code: Optional[int]
+    output: Optional[bytes | Tuple[Optional[bytes], Optional[bytes]]]
+
+class ExecStream:
+    """
+    Output of a started exec as it is produced: an async iterator of bytes chunks, or of
+    (stdout, stderr) tuples with one side set to None when demux is enabled. exit_code is
+    set once the output has been consumed.
+    """
+
+    def __init__(self, exec_session: "Exec", exec_id: str, response, socket, tty: bool = False, demux: bool = False):
+        self.exec_session = exec_session
+        self.exec_id = exec_id
+        self.tty = tty
+        self.demux = demux
+        self.exit_code: Optional[int] = None
+        self._response = response
+        self._socket = socket
+        self._chunks = self._iter_chunks()
+
+    async def _iter_chunks(self):
+        try:
+            async for stream, data in frames_iter(self._socket, self.tty):
+                if not self.demux:
+                    yield bytes(data)
+                elif stream == STDERR:
+                    yield None, bytes(data)
+                else:
+                    yield bytes(data), None
+        finally:
+            await self._response.aclose()
+
+        self.exit_code = (await self.exec_session.inspect(self.exec_id))['ExitCode']
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._chunks.__anext__()
+
+    async def aclose(self):
+        await self._chunks.aclose()
+        await self._response.aclose()
+
+    async def read(self) -> bytes | Tuple[Optional[bytes], Optional[bytes]]:
+        """
+        Reads the whole output. Frames are collected as views of the chunks they arrived
+        in and joined once, so it takes linear time however large the output is.
+        """
+
+        stdout, stderr = [], []
+        try:
+            async for stream, data in frames_iter(self._socket, self.tty):
+                (stderr if self.demux and stream == STDERR else stdout).append(data)
+        finally:
+            await self._response.aclose()
+
+        if not self.demux:
+            return b''.join(stdout)
+        return (b''.join(stdout) if stdout else None, b''.join(stderr) if stderr else None)
+
+class ExecSocket(ExecStream):
+    """
+    Full-duplex exec session over the hijacked connection: write to the process' stdin
+    while its output is read like an ExecStream.
+
+    Writes go straight to the connection and only return once the data has been handed
+    to the kernel, so a producer awaiting them is held back by the container's pace and
+    never buffers more than a chunk in memory. Read the output concurrently (or use
+    communicate()) so the process doesn't stall on a full stdout pipe.
+    """
+
+    async def write(self, data: bytes):
+        await self._socket.write(data)
+
+    async def send(self, source: bytes | Iterable[bytes] | AsyncIterable[bytes], chunk_size: int = STREAM_CHUNK_SIZE):
+        """
+        Writes source, a bytes-like object or an (async) iterable of chunks, to stdin
+        """
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            view = memoryview(source)
+            for pos in range(0, len(view), chunk_size):
+                await self.write(view[pos:pos + chunk_size])
+        elif isinstance(source, AsyncIterable):
+            async for chunk in source:
+                await self.write(chunk)
+        else:
+            for chunk in source:
+                await self.write(chunk)
+
+    async def write_eof(self):
+        """
+        Closes stdin, the read side of the connection stays open for the remaining output
+        """
+
+        writer = self._socket.get_extra_info('stream_writer')
+        if writer is not None:
+            # asyncio streams (SSH channels, the lean transport) half-close once their buffer is flushed
+            writer.write_eof()
+        else:
+            self._socket.get_extra_info('socket').shutdown(socket.SHUT_WR)
+
+    async def communicate(self, input: bytes | Iterable[bytes] | AsyncIterable[bytes] = b'') -> bytes | Tuple[Optional[bytes], Optional[bytes]]:
+        """
+        Sends input and closes stdin while reading the output, returns the output
+        like a buffered exec_run (as a (stdout, stderr) tuple with demux). Needs an
+        event loop, with the synchronous client write() then iterate instead.
+        """
+
+        async def feed():
+            await self.send(input)
+            await self.write_eof()
+
+        writer = asyncio.ensure_future(feed())
+        try:
+            output = await self.read()
+            await writer
+        finally:
+            writer.cancel()
+
+        self.exit_code = (await self.exec_session.inspect(self.exec_id))['ExitCode']
+        return output
+
 
 class ExecCreateConfig(BaseModel):
     Container: str = Field(alias='container')
@@ -52,31 +176,29 @@ class Exec(BaseModel):
             json=exec_create_config.model_dump(exclude=['Container', 'detachKeys'])
         )).json()
 
-    async def start(self, exec_start_config: ExecStartConfig):
-        output = b''
-
-        headers = {} if exec_start_config.Detach else {
-            'Connection': 'Upgrade',
-            'Upgrade': 'tcp'
-        }
-
-        async with self.transport.client.stream("POST", f"/exec/{exec_start_config.ExecId}/start",
-            headers=headers,
-            json=exec_start_config.model_dump(include=['Tty', 'Detach']),
-        ) as r:
-
-            if exec_start_config.Detach:
-                return (await r.aread())
-
-            if exec_start_config.Socket:
-                raise NotImplementedError
-
-            raw_sock = get_raw_response_socket(self.transport.client)
-            async for frame in await frames_iter(raw_sock, exec_start_config.Tty):
-                stream, result = frame
-                output += result
-
-        return output
+    async def start(self, exec_start_config: ExecStartConfig) -> bytes | Tuple[Optional[bytes], Optional[bytes]] | ExecStream | ExecSocket:
+        """
+        Returns the output of the exec, an ExecStream reading it as it is produced when
+        Stream is set, or an ExecSocket to also write to its stdin when Socket is set
+        """
+
+        if exec_start_config.Detach:
+            r = await self.transport.client.post(
+                f"/exec/{exec_start_config.ExecId}/start",
+                json=exec_start_config.model_dump(include=['Tty', 'Detach'])
+            )
+            return r.content
+
+        r, raw_sock = await self.transport.hijack(
+            "POST", f"/exec/{exec_start_config.ExecId}/start",
+            json=exec_start_config.model_dump(include=['Tty', 'Detach'])
+        )
+
+        output = (ExecSocket if exec_start_config.Socket else ExecStream)(
+            self, exec_start_config.ExecId, r, raw_sock,
+            tty=exec_start_config.Tty, demux=exec_start_config.Demux
+        )
+        return output if exec_start_config.Stream or exec_start_config.Socket else await output.read()
 
     async def inspect(self, exec_id: str | Dict[Any, Any]):
         if isinstance(exec_id, dict):
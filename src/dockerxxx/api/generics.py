@@ -1,7 +1,35 @@
 from pydantic import BaseModel
 from typing import TypeVar, Generic, Optional, List
+from ..errors import DockerException
 
 DataT = TypeVar('DataT')
 
 class Response(BaseModel, Generic[DataT]):
     data: Optional[List[DataT]] = None
+
+class SparseModel:
+    """
+    Mixin for models that can be built from a list summary without inspecting the object.
+
+    Fields the summary doesn't carry are left unset and raise a DockerException on access
+    until the object is reloaded.
+    """
+
+    @classmethod
+    def sparse_construct(cls, **values):
+        obj = cls.model_construct(**values)
+        for name in cls.model_fields.keys() - values.keys():
+            obj.__dict__.pop(name, None)
+        return obj
+
+    @property
+    def sparse(self) -> bool:
+        return not type(self).model_fields.keys() <= self.__dict__.keys()
+
+    def __getattr__(self, item):
+        if item in type(self).model_fields:
+            raise DockerException(
+                f"'{item}' is not available for sparse objects. "
+                "Call reload() to retrieve all information"
+            )
+        return super().__getattr__(item)
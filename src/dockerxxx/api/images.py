@@ -1,11 +1,16 @@
+import re
 import json
-import asyncio
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, BinaryIO, Iterable, Tuple
 from pydantic import BaseModel, field_validator, Field
-from .generics import Response
-from ..utils import convert_filters, parse_repository_tag
+from .pulls import InflightPull, PullProgress, PullRegistry
+from .build import build_context
+from .archive import ArchiveStream, ArchiveSource, archive_content, tar_member
+from ..utils import convert_filters, parse_repository_tag, JSONStreamDecoder, STREAM_CHUNK_SIZE
 from ..transports import BaseTransport
-from ..models import ImageSummary, ImageInspect
+from ..concurrency import FanOut
+from ..cache import InspectCache
+from ..errors import BuildError, DockerException, ImageLoadError
+from ..models import ImageSummary, ImageInspect, BuildInfo
 from pydantic_core.core_schema import ValidationInfo
 
 class ImageListParams(BaseModel):
@@ -48,8 +53,23 @@ class Image(ImageInspect):
     async def reload(self, **kwargs):
         raise NotImplementedError
 
-    async def save(self, **kwargs):
-        raise NotImplementedError
+    async def save(self, chunk_size: int = STREAM_CHUNK_SIZE, named: bool | str = False) -> ArchiveStream:
+        """
+        Returns the image tarball as an ArchiveStream read chunk by chunk. Use its save() or
+        write_to() to write it to a file or an async sink. With named, the tarball keeps the
+        first tag of the image (or the tag given as named).
+
+        https://docker-py.readthedocs.io/en/stable/images.html#docker.models.images.Image.save
+        """
+
+        image = self.id
+        if named:
+            image = self.repo_tags[0] if named is True else named
+            if image not in self.repo_tags:
+                raise DockerException(f"{named} is not a valid tag for this image")
+
+        request = self.transport.stream_client.build_request("GET", f"/images/{image}/get", timeout=None)
+        return ArchiveStream(await self.transport.stream_client.send(request, stream=True), chunk_size)
 
     async def tag(self, name: str, repo: str = None, tag: str = None, force: bool = False):
         r = await self.transport.client.post(
@@ -100,9 +120,101 @@ class Images(BaseModel):
     """
 
     transport: BaseTransport
+    fanout: FanOut = Field(default_factory=FanOut)
+    cache: Optional[InspectCache] = None
+    pulls: PullRegistry = Field(default_factory=PullRegistry)
+
+    async def build(self, path: str = None, fileobj: BinaryIO | ArchiveSource = None, tag: str = None,
+                    quiet: bool = False, nocache: bool = False, rm: bool = False, forcerm: bool = False,
+                    pull: bool = False, dockerfile: str = None, buildargs: Dict[str, str] = None,
+                    labels: Dict[str, str] = None, target: str = None, network_mode: str = None,
+                    platform: str = None, cache_from: List[str] = None, extra_hosts: Dict[str, str] = None,
+                    shmsize: int = None, custom_context: bool = False, encoding: str = None,
+                    gzip: bool = False, stream: bool = False):
+        """
+        Builds an image from a context directory (path), a remote context (path is a URL),
+        a Dockerfile (fileobj) or a tar context (fileobj with custom_context). A directory
+        context is streamed as a tar generated on the fly, without the files its .dockerignore
+        excludes, and gzip compressed in a worker thread if asked.
 
-    async def build(self, **kwargs):
-        raise NotImplementedError
+        Returns the image and the BuildInfo messages of the build, or an async iterator of the
+        messages as they arrive with stream.
+
+        https://docker-py.readthedocs.io/en/stable/images.html#docker.models.images.ImageCollection.build
+        """
+
+        if path is None and fileobj is None:
+            raise TypeError("Either path or fileobj needs to be provided.")
+        if gzip and encoding is not None:
+            raise DockerException("Can not use custom encoding if gzip is enabled")
+
+        params = {
+            't': tag, 'q': quiet, 'nocache': nocache, 'rm': rm, 'forcerm': forcerm, 'pull': pull,
+            'dockerfile': dockerfile, 'target': target, 'networkmode': network_mode,
+            'platform': platform, 'shmsize': shmsize,
+            'buildargs': json.dumps(buildargs) if buildargs else None,
+            'labels': json.dumps(labels) if labels else None,
+            'cachefrom': json.dumps(cache_from) if cache_from else None,
+            'extrahosts': ','.join(f"{host}:{ip}" for host, ip in extra_hosts.items()) if extra_hosts else None,
+        }
+        headers = {'Content-Type': 'application/x-tar'}
+        content = None
+
+        if custom_context:
+            if fileobj is None:
+                raise TypeError("You must specify fileobj with custom_context")
+            content = archive_content(fileobj, blocking=self.transport.blocking)
+        elif fileobj is not None:
+            content = tar_member('Dockerfile', fileobj.read())
+        elif path.startswith(('http://', 'https://', 'git://', 'github.com/', 'git@')):
+            params['remote'] = path
+        else:
+            content = build_context(path, dockerfile or 'Dockerfile', gzip, blocking=self.transport.blocking)
+            encoding = 'gzip' if gzip else encoding
+
+        if encoding:
+            headers['Content-Encoding'] = encoding
+
+        request = self.transport.stream_client.build_request(
+            "POST", "/build",
+            params={k: v for k, v in params.items() if v is not None},
+            headers=headers, content=content, timeout=None
+        )
+        messages = self._progress_stream(request)
+        if stream:
+            return messages
+
+        build_log, image_id = [], None
+        async for message in messages:
+            build_log.append(message)
+            if message.error:
+                raise BuildError(message.error, build_log)
+            if message.aux is not None and message.aux.id:
+                image_id = message.aux.id
+            elif message.stream and (match := re.search(r'(^Successfully built |sha256:)([0-9a-f]+)$', message.stream.strip())):
+                image_id = match.group(2)
+
+        if image_id is None:
+            raise BuildError(build_log[-1].stream if build_log else 'Unknown', build_log)
+        return await self.get(image_id), build_log
+
+    async def _progress_stream(self, request) -> AsyncIterator[BuildInfo]:
+        """
+        Sends request and decodes the JSON messages of its response (build and load output)
+        as they arrive
+        """
+
+        decoder = JSONStreamDecoder()
+        response = await self.transport.stream_client.send(request, stream=True)
+        try:
+            async for chunk in response.aiter_bytes():
+                for document in decoder.feed(chunk):
+                    yield BuildInfo.model_validate_json(document)
+
+            for document in decoder.flush():
+                yield BuildInfo.model_validate_json(document)
+        finally:
+            await response.aclose()
 
     async def get(self, image: str | ImageSummary):
         if isinstance(image, str):
@@ -112,9 +224,19 @@ class Images(BaseModel):
         else:
             raise NotImplementedError
 
+        if self.cache is not None:
+            cached = self.cache.get('image', image_id)
+            if cached is not None:
+                return cached
+            token = self.cache.token()
+
         r = await self.transport.client.get(f"/images/{image_id}/json")
-        image = Image.model_validate(r.json())
+        image = self.transport.decode(Image, r)
         image.transport = self.transport
+
+        if self.cache is not None:
+            self.cache.put('image', image_id, image, image.id, token)
+
         return image
 
     async def get_registry_data(self, **kwargs):
@@ -140,36 +262,77 @@ class Images(BaseModel):
             ).model_dump()
         )
 
-        images = Response[ImageSummary](data=r.json()).data
-        return await asyncio.gather(*[
-            self.get(image.id) for image in images
-        ])
+        images = self.transport.decode(List[ImageSummary], r)
+        return await self.fanout.map(self.get, [image.id for image in images])
 
-    async def load(self, **kwargs):
-        raise NotImplementedError
+    async def save(self, images: Iterable[str | Image], chunk_size: int = STREAM_CHUNK_SIZE) -> ArchiveStream:
+        """
+        Returns one tarball of several images (names, IDs or Image objects) as an
+        ArchiveStream, the layers they share are in it once
+        """
+
+        names = [image.id if isinstance(image, Image) else image for image in images]
+        request = self.transport.stream_client.build_request(
+            "GET", "/images/get", params={'names': names}, timeout=None
+        )
+        return ArchiveStream(await self.transport.stream_client.send(request, stream=True), chunk_size)
+
+    async def load(self, data: ArchiveSource, quiet: bool = False, stream: bool = False,
+                   chunk_size: int = 1024 * 1024):
+        """
+        Loads images from a tarball, which can be bytes, a file path or binary file object
+        (read in a worker thread) or an (async) iterable of chunks. Anything but bytes is
+        sent as a chunked body without being held in memory.
+
+        Returns the loaded images, or the daemon's progress messages as an async iterator
+        with stream.
+
+        https://docker-py.readthedocs.io/en/stable/images.html#docker.models.images.ImageCollection.load
+        """
+
+        request = self.transport.stream_client.build_request(
+            "POST", "/images/load",
+            params={'quiet': quiet},
+            headers={'Content-Type': 'application/x-tar'},
+            content=archive_content(data, chunk_size, self.transport.blocking),
+            timeout=None
+        )
+        messages = self._progress_stream(request)
+        if stream:
+            return messages
+
+        loaded = []
+        async for message in messages:
+            if message.error:
+                raise ImageLoadError(message.error)
+            if message.stream and (match := re.search(r'(^Loaded image ID: |^Loaded image: )(.+)$', message.stream.strip())):
+                loaded.append(match.group(2))
+
+        return [await self.get(image) for image in loaded]
 
     async def prune(self, **kwargs):
         raise NotImplementedError
 
     async def _pull_stream(self, params, headers):
-        async with self.transport.client.stream(
+        decoder = JSONStreamDecoder()
+        async with self.transport.stream_client.stream(
             "POST",
             "/images/create",
             params=params,
             headers=headers,
             timeout=None
         ) as r:
-            async for chunk in r.aiter_lines():
-                yield json.loads(chunk)
+            async for chunk in r.aiter_bytes():
+                for document in decoder.feed(chunk):
+                    yield json.loads(document)
 
-    async def pull(self, repository: str, tag: str = None, auth_config: bool = None,
-             decode: bool = False, platform: str = None, all_tags: bool = False):
+            for document in decoder.flush():
+                yield json.loads(document)
 
+    def _join_pull(self, repository: str, tag: str = None, platform: str = None,
+                   all_tags: bool = False) -> Tuple[InflightPull, str, Optional[str]]:
         repository, image_tag = parse_repository_tag(repository)
-        tag = tag or image_tag or 'latest'
-
-        if all_tags:
-            tag = None
+        tag = None if all_tags else tag or image_tag or 'latest'
 
         #registry, repo_name = auth.resolve_repository_name(repository)
 
@@ -182,14 +345,52 @@ class Images(BaseModel):
         if platform:
             params['platform'] = platform
 
-        pull_logs = [log async for log in self._pull_stream(params, headers)]
+        reference = repository
+        if tag is not None:
+            reference += f"{'@' if tag.startswith('sha256:') else ':'}{tag}"
 
-        if not all_tags:
-            sep = '@' if tag.startswith('sha256:') else ':'
-            return await self.get(f'{repository}{sep}{tag}')
+        pull = self.pulls.join(
+            (repository, tag, platform), reference,
+            lambda: self._pull_stream(params, headers), blocking=self.transport.blocking
+        )
+        return pull, repository, tag
+
+    async def pull(self, repository: str, tag: str = None, auth_config: bool = None,
+             decode: bool = False, platform: str = None, all_tags: bool = False):
+        """
+        Pulls an image and returns it, or the list of images of the repository for all_tags.
+        Concurrent pulls of the same reference share a single pull.
+        """
+
+        pull, repository, tag = self._join_pull(repository, tag, platform, all_tags)
+        await pull.wait()
+
+        if tag is not None:
+            return await self.get(pull.progress.reference)
 
         return await self.list(filters={'reference': repository})
 
+    async def pull_progress(self, repository: str, tag: str = None, platform: str = None,
+                            all_tags: bool = False) -> AsyncIterator[PullProgress]:
+        """
+        Pulls an image, yielding its aggregated progress (per-layer state and byte counts)
+        as it changes. Joins the pull of the reference already in flight, if any.
+        """
+
+        pull, _, _ = self._join_pull(repository, tag, platform, all_tags)
+        async for progress in pull.updates():
+            yield progress
+
+    async def pull_many(self, repositories: Iterable[str], concurrency: int = 4,
+                        platform: str = None) -> List[Image]:
+        """
+        Pulls images with at most concurrency pulls in flight (and no more than the client's
+        max_concurrency) and returns them in order
+        """
+
+        return await self.fanout.map(lambda repository: self.pull(repository, platform=platform), repositories,
+                                     max_concurrency=concurrency)
+
     async def push(self, **kwargs):
         raise NotImplementedError
 
@@ -1,13 +1,13 @@
-import asyncio
 from ..models import Network as NetworkResponse
 from ..models import EndpointSettings, IPAM
 from ..transports import BaseTransport
-from .generics import Response
+from ..concurrency import FanOut
+from ..cache import InspectCache
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Dict, Optional, Any
 
 class NetworkCreateRequest(BaseModel):
-    model_config = ConfigDict(populate_by_name=True)
+    model_config = ConfigDict(populate_by_name=True, defer_build=True)
 
     name: str = Field(alias="Name")
     check_duplicate: Optional[bool] = Field(None, alias="CheckDuplicate")
@@ -32,6 +32,8 @@ class NetworkDisconnectRequest(BaseModel):
     force: bool = Field(alias="Force")
 
 class NetworkConnectRequest(BaseModel):
+    model_config = ConfigDict(defer_build=True)
+
     container: str = Field(alias="Container")
     endpoint_config: EndpointSettings = Field(alias="EndpointConfig")
 
@@ -62,7 +64,7 @@ class Network(NetworkResponse):
 
     async def reload(self):
         r = await self.transport.client.get(f"/networks/{self.id}")
-        inspect = NetworkResponse.model_validate(r.json())
+        inspect = self.transport.decode(NetworkResponse, r)
         for k in inspect.model_fields:
             setattr(self, k, getattr(inspect, k))
 
@@ -72,6 +74,8 @@ class Network(NetworkResponse):
 
 class Networks(BaseModel):
     transport: BaseTransport
+    fanout: FanOut = Field(default_factory=FanOut)
+    cache: Optional[InspectCache] = None
 
     async def create(self, name: str, driver = None, options = None, 
                      ipam = None, check_duplicate = None, internal = None, labels = None,
@@ -87,7 +91,7 @@ class Networks(BaseModel):
             ).model_dump(by_alias=True)
         )
 
-        network = NetworkCreateResponse.model_validate(r.json())
+        network = self.transport.decode(NetworkCreateResponse, r)
         return await self.get(network)
 
     async def get(self, network: str | NetworkResponse | Network | NetworkCreateResponse):
@@ -96,19 +100,27 @@ class Networks(BaseModel):
         elif isinstance(network, (NetworkResponse, NetworkCreateResponse, Network)):
             network_id = network.id
 
+        if self.cache is not None:
+            cached = self.cache.get('network', network_id)
+            if cached is not None:
+                return cached
+            token = self.cache.token()
+
         r = await self.transport.client.get(f"/networks/{network_id}")
-        network = Network.model_validate(r.json())
+        network = self.transport.decode(Network, r)
         network.transport = self.transport
+
+        if self.cache is not None:
+            self.cache.put('network', network_id, network, network.id, token)
+
         return network
 
     async def list(self, names: List[str] = None, ids: List[str] = None, 
                    filters: Dict[str, str] = None, greedy: bool = False):
         r = await self.transport.client.get("/networks")
 
-        networks = Response[NetworkResponse](data=r.json()).data
-        return await asyncio.gather(*[
-            self.get(network.id) for network in networks
-        ])
+        networks = self.transport.decode(List[NetworkResponse], r)
+        return await self.fanout.map(self.get, [network.id for network in networks])
 
     async def prune(self, filters: None):
         r = await self.transport.client.post(
@@ -116,4 +128,4 @@ class Networks(BaseModel):
             params={"filters": filters}
         )
 
-        return NetworkPruneResponse.model_validate(r.json())
+        return self.transport.decode(NetworkPruneResponse, r)
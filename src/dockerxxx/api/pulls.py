@@ -0,0 +1,180 @@
+import asyncio
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+from pydantic import BaseModel, Field, PrivateAttr
+from ..errors import DockerException
+
+# statuses after which a layer is fully downloaded
+_LAYER_DONE = ('Download complete', 'Extracting', 'Pull complete', 'Already exists')
+
+
+class LayerProgress(BaseModel):
+    id: str
+    status: str = ''
+    current: int = 0
+    total: Optional[int] = None
+    extracted: int = 0
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('Pull complete', 'Already exists')
+
+
+class PullProgress(BaseModel):
+    """
+    Progress of a pull, aggregated from the daemon's progress messages: the state and
+    downloaded bytes of every layer, and the last status not tied to a layer
+    """
+
+    reference: str
+    status: Optional[str] = None
+    digest: Optional[str] = None
+    layers: Dict[str, LayerProgress] = Field(default_factory=dict)
+
+    @property
+    def current(self) -> int:
+        return sum(layer.current for layer in self.layers.values())
+
+    @property
+    def total(self) -> Optional[int]:
+        """
+        Bytes to download, None until the size of every layer is known
+        """
+
+        totals = [layer.total for layer in self.layers.values() if layer.status != 'Already exists']
+        return None if None in totals else sum(totals)
+
+    @property
+    def done(self) -> bool:
+        return bool(self.layers) and all(layer.done for layer in self.layers.values())
+
+    def update(self, message: Dict[str, Any]):
+        """
+        Applies a progress message, raising a DockerException for an error message
+        """
+
+        if 'error' in message:
+            raise DockerException(message.get('errorDetail', {}).get('message') or message['error'])
+
+        status, layer_id = message.get('status', ''), message.get('id')
+        detail = message.get('progressDetail') or {}
+        if layer_id is None or status.startswith('Pulling from'):
+            self.status = status
+            if status.startswith('Digest: '):
+                self.digest = status.removeprefix('Digest: ')
+            return
+
+        layer = self.layers.get(layer_id)
+        if layer is None:
+            layer = self.layers[layer_id] = LayerProgress(id=layer_id)
+        layer.status = status
+
+        if status == 'Downloading':
+            layer.current = detail.get('current', layer.current)
+            layer.total = detail.get('total', layer.total)
+        elif status == 'Extracting':
+            layer.extracted = detail.get('current', layer.extracted)
+        if status in _LAYER_DONE and layer.total is not None:
+            layer.current = layer.total
+
+
+class InflightPull:
+    """
+    A pull shared by everyone pulling the same reference. Its progress stream is read by
+    a task of its own, callers wait for it or watch its progress without being able to
+    cancel it for the others.
+    """
+
+    def __init__(self, reference: str, messages: AsyncIterator[Dict[str, Any]]):
+        self.progress = PullProgress(reference=reference)
+        self.messages = messages
+        self.task: Optional[asyncio.Task] = None
+        self._version = 0
+        self._changed = asyncio.Event()
+
+    def start(self):
+        self.task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> PullProgress:
+        try:
+            async for message in self.messages:
+                self.progress.update(message)
+                self._notify()
+        finally:
+            self._notify()
+        return self.progress
+
+    def _notify(self):
+        self._version += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self) -> PullProgress:
+        if self.task is None:
+            async for _ in self.updates():
+                pass
+            return self.progress
+        return await asyncio.shield(self.task)
+
+    async def updates(self) -> AsyncIterator[PullProgress]:
+        """
+        Yields a snapshot of the progress whenever it changed. A slow consumer skips the
+        intermediate states instead of queueing them.
+        """
+
+        if self.task is None:
+            # not started, as for the synchronous client: the stream is read right here
+            async for message in self.messages:
+                self.progress.update(message)
+                yield self.progress.model_copy(deep=True)
+            return
+
+        seen = None
+        while True:
+            changed = self._changed
+            if seen != self._version:
+                seen = self._version
+                yield self.progress.model_copy(deep=True)
+            elif self.task.done():
+                self.task.result()
+                return
+            else:
+                await changed.wait()
+
+
+class PullRegistry(BaseModel):
+    """
+    Pulls in flight on a client, by reference. Pulling a reference that is already being
+    pulled joins that pull instead of starting another /images/create stream.
+    """
+
+    coalesced: int = 0
+
+    _pulls: Dict[Tuple, InflightPull] = PrivateAttr(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self._pulls)
+
+    def join(self, key: Tuple, reference: str, messages: Callable[[], AsyncIterator[Dict[str, Any]]],
+             blocking: bool = False) -> InflightPull:
+        """
+        Returns the pull in flight for key, or starts one reading messages(). Blocking pulls
+        (synchronous client) can't run in the background and are read by their caller.
+        """
+
+        pull = self._pulls.get(key)
+        if pull is not None:
+            self.coalesced += 1
+            return pull
+
+        pull = InflightPull(reference, messages())
+        if not blocking:
+            self._pulls[key] = pull
+            pull.start()
+            pull.task.add_done_callback(lambda task: self._finished(key, task))
+        return pull
+
+    def _finished(self, key: Tuple, task: asyncio.Task):
+        self._pulls.pop(key, None)
+        if not task.cancelled():
+            # retrieved here so a failure nobody waits for anymore isn't reported as unhandled
+            task.exception()
@@ -1,7 +1,7 @@
-import asyncio
 from ..transports import BaseTransport
+from ..concurrency import FanOut
+from ..cache import InspectCache
 from ..models import Volume as VolumeResponse
-from .generics import Response
 from ..models import VolumeCreateOptions, VolumeListResponse
 from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, Dict, List
@@ -17,7 +17,7 @@ class Volume(VolumeResponse):
 
     async def reload(self) -> None:
         r = await self.transport.client.get(f"/volumes/{self.id}")
-        inspect = VolumeResponse.model_validate(r.json())
+        inspect = self.transport.decode(VolumeResponse, r)
         for k in inspect.model_fields:
             setattr(self, k, getattr(inspect, k))
 
@@ -29,6 +29,8 @@ class Volume(VolumeResponse):
 
 class Volumes(BaseModel):
     transport: BaseTransport
+    fanout: FanOut = Field(default_factory=FanOut)
+    cache: Optional[InspectCache] = None
 
     async def create(self, name: str, driver: str = None, 
                      driver_opts: Dict[str, str] = None, labels: Dict[str, str] = None) -> Volume:
@@ -40,7 +42,7 @@ class Volumes(BaseModel):
             ).model_dump(by_alias=True)
         )
 
-        volume = VolumeResponse.model_validate(r.json())
+        volume = self.transport.decode(VolumeResponse, r)
         return await self.get(volume)
 
     async def list(self, filters: Dict[str, str] = None) -> List[Volume]:
@@ -49,10 +51,8 @@ class Volumes(BaseModel):
             params={"filters": filters}
         )
 
-        volumes = Response[VolumeListResponse](data=r.json()).data
-        return await asyncio.gather(*[
-            self.get(volume.id) for volume in volumes
-        ])
+        volumes = self.transport.decode(VolumeListResponse, r).volumes or []
+        return await self.fanout.map(self.get, [volume.name for volume in volumes])
 
     async def get(self, volume: str | VolumeResponse | VolumeListResponse) -> Volume:
         if isinstance(volume, str):
@@ -60,9 +60,19 @@ class Volumes(BaseModel):
         elif isinstance(volume, (VolumeResponse, VolumeListResponse)):
             volume_id = volume.id
 
+        if self.cache is not None:
+            cached = self.cache.get('volume', volume_id)
+            if cached is not None:
+                return cached
+            token = self.cache.token()
+
         r = await self.transport.client.get(f"/volumes/{volume_id}")
-        volume = Volume.model_validate(r.json())
+        volume = self.transport.decode(Volume, r)
         volume.transport = self.transport
+
+        if self.cache is not None:
+            self.cache.put('volume', volume_id, volume, volume.name, token)
+
         return volume
 
     async def prune(self, filters: Dict[str, str] = None) -> VolumePruneResponse:
@@ -71,4 +81,4 @@ class Volumes(BaseModel):
             params={"filters": filters}
         )
 
-        return VolumePruneResponse.model_validate(r.json())
+        return self.transport.decode(VolumePruneResponse, r)
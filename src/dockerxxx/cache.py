@@ -0,0 +1,225 @@
+import re
+import copy
+import time
+import asyncio
+import structlog
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Set, Tuple
+from pydantic import BaseModel, Field, PrivateAttr
+from .models import EventMessage
+
+log = structlog.get_logger()
+
+KINDS = {
+    'containers': 'container',
+    'images': 'image',
+    'networks': 'network',
+    'volumes': 'volume'
+}
+
+_API_PATH = re.compile(r'^(?:/v[\d.]+)?/(containers|images|networks|volumes)(?:/([^/]+))?')
+_FULL_ID = re.compile(r'^[0-9a-f]{64}$')
+
+def cache_key(key: str) -> str:
+    """
+    Normalizes object references so full IDs, sha256: digests and short IDs
+    of the same object share a cache entry
+    """
+
+    key = key.removeprefix('sha256:')
+    return key[:12] if _FULL_ID.match(key) else key
+
+def detached_copy(obj: Any) -> Any:
+    """
+    Deep copy of a cached object, so callers never share its nested models and dicts,
+    still bound to the same transport (clients and pools can't be copied)
+    """
+
+    transport = getattr(obj, 'transport', None)
+    return copy.deepcopy(obj, {id(transport): transport} if transport is not None else None)
+
+def daemon_time(response) -> float:
+    """
+    Reads the daemon's clock from a response Date header, falling back to ours
+    """
+
+    try:
+        return parsedate_to_datetime(response.headers['date']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+
+class CacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    evictions: int = 0
+    reconnects: int = 0
+
+
+class InspectCache(BaseModel):
+    """
+    LRU cache of inspect results for containers, images, networks and volumes.
+
+    Entries are invalidated from a background /events subscription and by any
+    write the client itself sends for the object. The subscription replays events
+    from the moment the cache was enabled (and from the last seen event after a
+    reconnect) so nothing that changes in between is missed.
+    """
+
+    max_size: int = Field(1024, gt=0)
+    stats: CacheStats = Field(default_factory=CacheStats)
+
+    _entries: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _aliases: Dict[Tuple[str, str], str] = PrivateAttr(default_factory=dict)
+    _aliases_of: Dict[Tuple[str, str], Set[str]] = PrivateAttr(default_factory=dict)
+    _invalidated: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _floor: int = PrivateAttr(0)
+    _epoch: int = PrivateAttr(0)
+    _watcher: Optional[asyncio.Task] = PrivateAttr(None)
+
+    def token(self) -> int:
+        """
+        Returns the current invalidation epoch. Pass it to put() to avoid caching
+        a result that was invalidated while its request was in flight.
+        """
+
+        return self._epoch
+
+    def get(self, kind: str, key: str) -> Optional[Any]:
+        canonical = self._aliases.get((kind, key), cache_key(key))
+        entry = self._entries.get((kind, canonical))
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        self._entries.move_to_end((kind, canonical))
+        self.stats.hits += 1
+        return detached_copy(entry)
+
+    def put(self, kind: str, key: str, obj: Any, canonical: str, token: int):
+        canonical = cache_key(canonical)
+        if max(self._invalidated.get((kind, canonical), 0), self._floor) > token:
+            return
+
+        self._entries[(kind, canonical)] = detached_copy(obj)
+        self._entries.move_to_end((kind, canonical))
+
+        if cache_key(key) != canonical:
+            self._aliases[(kind, key)] = canonical
+            self._aliases_of.setdefault((kind, canonical), set()).add(key)
+
+        while len(self._entries) > self.max_size:
+            (old_kind, old_canonical), _ = self._entries.popitem(last=False)
+            self._drop_aliases(old_kind, old_canonical)
+            self.stats.evictions += 1
+
+    def invalidate(self, kind: str, key: str):
+        self._epoch += 1
+        canonical = self._aliases.pop((kind, key), None) or cache_key(key)
+
+        for ref in {canonical, cache_key(key)}:
+            self._entries.pop((kind, ref), None)
+            self._drop_aliases(kind, ref)
+            self._invalidated[(kind, ref)] = self._epoch
+            self._invalidated.move_to_end((kind, ref))
+
+        while len(self._invalidated) > self.max_size * 4:
+            _, epoch = self._invalidated.popitem(last=False)
+            self._floor = max(self._floor, epoch)
+
+        self.stats.invalidations += 1
+
+    def clear(self, kind: Optional[str] = None):
+        self._epoch += 1
+        self._floor = self._epoch
+
+        if kind is None:
+            self._entries.clear()
+            self._aliases.clear()
+            self._aliases_of.clear()
+            return
+
+        for entry_kind, canonical in [k for k in self._entries if k[0] == kind]:
+            del self._entries[(entry_kind, canonical)]
+            self._drop_aliases(entry_kind, canonical)
+
+    def _drop_aliases(self, kind: str, canonical: str):
+        for alias in self._aliases_of.pop((kind, canonical), ()):
+            self._aliases.pop((kind, alias), None)
+
+    def handle_event(self, event: EventMessage):
+        kind = event.type.value if event.type else None
+        actor_id = event.actor.id if event.actor else None
+        attributes = (event.actor.attributes if event.actor else None) or {}
+
+        if kind in KINDS.values():
+            if actor_id:
+                self.invalidate(kind, actor_id)
+            if attributes.get('name'):
+                self.invalidate(kind, attributes['name'])
+
+        # network connect/disconnect and volume mounts change the container too
+        if attributes.get('container'):
+            self.invalidate('container', attributes['container'])
+
+    async def on_response(self, response):
+        """
+        httpx response hook invalidating the objects touched by the client's own writes
+        """
+
+        if response.request.method in ('GET', 'HEAD'):
+            return
+
+        match = _API_PATH.match(response.request.url.path)
+        if not match:
+            return
+
+        kind, key = KINDS[match.group(1)], match.group(2)
+        if kind == 'image' or key in (None, 'create', 'prune', 'load', 'build'):
+            # tags can move between images, drop them all
+            self.clear(kind)
+        else:
+            self.invalidate(kind, key)
+
+    def start(self, client, since: float):
+        # writes go through both lanes: restart, archives, pulls, builds and loads are long-lived
+        for http_client in (client.transport.client, client.transport.stream_client):
+            http_client.event_hooks['response'].append(self.on_response)
+        self._watcher = asyncio.create_task(self._watch(client, since))
+
+    async def stop(self, client):
+        for http_client in (client.transport.client, client.transport.stream_client):
+            hooks = http_client.event_hooks['response']
+            if self.on_response in hooks:
+                hooks.remove(self.on_response)
+
+        if self._watcher:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+        self.clear()
+
+    async def _watch(self, client, since: float):
+        since = f"{since:.9f}"
+
+        while True:
+            try:
+                async for event in client.events(since=since):
+                    self.handle_event(event)
+                    if event.time_nano:
+                        since = f"{event.time_nano // 10**9}.{event.time_nano % 10**9:09d}"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await log.adebug("event stream for inspect cache failed", error=str(e))
+
+            # events may have been missed while disconnected, don't trust anything cached
+            self.clear()
+            self.stats.reconnects += 1
+            await asyncio.sleep(1)
@@ -1,19 +1,26 @@
-import asyncio
 import structlog
 from .transports import (
     BaseTransport,
+    DecodeMode,
+    HttpMode,
+    PoolSettings,
+    PoolStats,
     UnixSocketTransport,
     HttpTransport,
-    SshTransport,
     AsyncUnixSocketTransport,
+    AsyncLeanUnixSocketTransport,
     AsyncHttpTransport,
     AsyncSshTransport
 )
 from .api import Images, Containers, Networks, Volumes
-from .models import SystemInfo, SystemVersion
-from .utils import convert_filters
+from .api.pulls import PullRegistry
+from .concurrency import FanOut
+from .cache import InspectCache, daemon_time
+from .models import SystemInfo, SystemVersion, EventMessage
+from .utils import convert_filters, JSONStreamDecoder
+from .sync import SyncProxy, SyncIterator, run_sync
 from .errors import DockerException
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator, Iterator
 from pydantic import BaseModel, AnyUrl, field_validator, Field, ConfigDict
 from pydantic.types import Path
 from pydantic_core.core_schema import ValidationInfo
@@ -47,39 +54,122 @@ class BaseDockerClient(BaseModel):
     tls: bool = True
     user_agent: Optional[str] = None
     cert_path: Optional[Path] = None
+    max_concurrency: int = Field(32, gt=0)
+    decode_mode: DecodeMode = 'json'
+    pool: PoolSettings = Field(default_factory=PoolSettings)
+    http: HttpMode = 'httpx'
     transport: Optional[BaseTransport] = Field(None, validate_default=True)
+    fanout: Optional[FanOut] = Field(None, validate_default=True)
+    cache: Optional[InspectCache] = None
+    pulls: PullRegistry = Field(default_factory=PullRegistry)
+
+    @field_validator('fanout')
+    def set_fanout(cls, v, info: ValidationInfo) -> FanOut:
+        return v or FanOut(max_concurrency=info.data['max_concurrency'])
+
+    @staticmethod
+    def transport_options(info: ValidationInfo) -> Dict[str, Any]:
+        return {
+            'url': info.data['base_url'],
+            'tls_verify': info.data['tls'],
+            'cert_path': info.data['cert_path'],
+            'decode_mode': info.data['decode_mode'],
+            'timeout': info.data['timeout'],
+            'pool': info.data['pool'],
+        }
 
     @classmethod
-    async def from_env(cls, version: str = "auto", timeout: int = 5):
+    def from_settings(cls, timeout: int = 5, max_concurrency: int = 32, decode_mode: DecodeMode = 'json',
+                      pool: Optional[PoolSettings] = None, http: HttpMode = 'httpx'):
         settings = EnvSettings()
-        client = cls(
+        return cls(
             base_url=settings.docker_host,
             timeout=timeout,
             tls=settings.docker_tls_verify,
-            cert_path=settings.docker_cert_path
+            cert_path=settings.docker_cert_path,
+            max_concurrency=max_concurrency,
+            decode_mode=decode_mode,
+            pool=pool or PoolSettings(),
+            http=http
         )
 
+    @classmethod
+    async def from_env(cls, version: str = "auto", timeout: int = 5, max_concurrency: int = 32,
+                       decode_mode: DecodeMode = 'json', pool: Optional[PoolSettings] = None,
+                       http: HttpMode = 'httpx'):
+        client = cls.from_settings(timeout, max_concurrency, decode_mode, pool, http)
+
         if version == "auto":
             client.version = (await client.daemon_version()).api_version
             log.debug("retrieved api version", api_version=client.version)
 
         return client
 
+    @property
+    def pool_stats(self) -> PoolStats:
+        """
+        Requests, waits for a connection and open connections of the API calls' pool
+        """
+
+        return self.transport.pool_stats
+
+    @property
+    def stream_pool_stats(self) -> PoolStats:
+        """
+        pool_stats of the long-lived calls (waits, followed logs, events, stats, pulls,
+        builds, archives), which have a pool of their own
+        """
+
+        return self.transport.stream_pool_stats
+
     @property
     def images(self):
-        return Images(transport=self.transport)
+        return Images(transport=self.transport, fanout=self.fanout, cache=self.cache, pulls=self.pulls)
 
     @property
     def containers(self):
-        return Containers(transport=self.transport)
+        return Containers(transport=self.transport, fanout=self.fanout, cache=self.cache)
 
     @property
     def networks(self):
-        return Networks(transport=self.transport)
+        return Networks(transport=self.transport, fanout=self.fanout, cache=self.cache)
 
     @property
     def volumes(self):
-        return Volumes(transport=self.transport)
+        return Volumes(transport=self.transport, fanout=self.fanout, cache=self.cache)
+
+    async def login(self):
+        raise NotImplementedError
+
+    async def df(self):
+        r = await self.transport.client.get("/system/df")
+        #return self.transport.decode(SystemDataUsageResponse, r)
+        return r.json()
+
+    async def events(self, since: str = None, until: str = None,
+                     filters: Dict[Any, Any] = None) -> AsyncIterator[EventMessage]:
+        decoder = JSONStreamDecoder()
+        async with self.transport.stream_client.stream(
+            "GET", "/events",
+            params=EventStreamParams(since=since, until=until, filters=filters).model_dump()
+        ) as event_stream:
+            async for chunk in event_stream.aiter_bytes():
+                for event in decoder.feed(chunk):
+                    yield EventMessage.model_validate_json(event)
+
+            for event in decoder.flush():
+                yield EventMessage.model_validate_json(event)
+
+    async def ping(self) -> str:
+        return (await self.transport.client.get("/_ping")).text
+
+    async def info(self) -> SystemInfo:
+        r = await self.transport.client.get("/info")
+        return self.transport.decode(SystemInfo, r)
+
+    async def daemon_version(self) -> SystemVersion:
+        r = await self.transport.client.get("/version")
+        return self.transport.decode(SystemVersion, r)
 
 class AsyncDocker(BaseDockerClient):
     '''
@@ -87,61 +177,137 @@ class AsyncDocker(BaseDockerClient):
     '''
 
     @field_validator('transport')
-    def set_transport(cls, v, info: ValidationInfo) -> AsyncUnixSocketTransport | AsyncSshTransport | AsyncHttpTransport:
+    def set_transport(cls, v, info: ValidationInfo) -> AsyncUnixSocketTransport | AsyncLeanUnixSocketTransport | AsyncSshTransport | AsyncHttpTransport:
+        if info.data['http'] == 'lean':
+            if info.data['base_url'].scheme != 'unix':
+                raise DockerException("The lean HTTP client only supports unix:// URLs")
+            return AsyncLeanUnixSocketTransport(**cls.transport_options(info))
+
         if info.data['base_url'].scheme == 'unix':
-            return AsyncUnixSocketTransport(url=info.data['base_url'])
+            return AsyncUnixSocketTransport(**cls.transport_options(info))
 
         elif info.data['base_url'].scheme in ['http', 'https']:
-            return AsyncHttpTransport(
-                url=info.data['base_url'],
-                tls_verify=info.data['tls']
-            )
+            return AsyncHttpTransport(**cls.transport_options(info))
 
-        elif info.data['base_url'].scheme in ['ssh', 'unix+ssh', 'ssh+unix']:
-            ssh_transport = AsyncSshTransport(url=info.data['base_url'])
-            asyncio.create_task(ssh_transport.forward_socket())
-            return AsyncUnixSocketTransport(url=ssh_transport.uds_url)
-
-        elif info.data['base_url'].scheme in ['ssh+http', 'http+ssh', 'https+ssh', 'ssh+https']:
-            raise NotImplementedError
+        elif info.data['base_url'].scheme in ['ssh', 'unix+ssh', 'ssh+unix', 'ssh+http', 'http+ssh', 'https+ssh', 'ssh+https']:
+            return AsyncSshTransport(**cls.transport_options(info))
 
         raise DockerException(
             f"Protocol {info.data['base_url'].scheme} is not supported, "
             "supported protocols are: unix://, ssh://, http://, https://, ssh+http://, ssh+https://"
         )
 
-    async def login(self):
-        raise NotImplementedError
+    async def enable_cache(self, max_size: int = 1024) -> InspectCache:
+        """
+        Serves container, image, network and volume inspects from an in-memory LRU cache
+        kept up to date by a background /events subscription
+        """
 
-    async def df(self):
-        r = await self.transport.client.get("/system/df")
-        #return SystemDataUsageResponse.model_validate(r.json())
-        return r.json()
+        if self.cache is None:
+            since = daemon_time(await self.transport.client.get("/_ping"))
+            self.cache = InspectCache(max_size=max_size)
+            self.cache.start(self, since)
 
-    async def events(self, since: str = None, until: str = None, filters: Dict[Any, Any] = None):
-        async with self.transport.client.stream(
-            "GET", "/events",
-            params=EventStreamParams(since=since, until=until, filters=filters).model_dump()
-        ) as event_stream:
-            async for event in event_stream.aiter_text():
-                #yield SystemEventResponse.model_validate(r.json())
-                yield event
+        return self.cache
 
-    async def ping(self) -> str:
-        return (await self.transport.client.get("/_ping")).text
+    async def disable_cache(self):
+        if self.cache is not None:
+            await self.cache.stop(self)
+            self.cache = None
 
-    async def info(self) -> SystemInfo:
-        r = await self.transport.client.get("/info")
-        return SystemInfo.model_validate(r.json())
+    async def aclose(self):
+        """
+        Stops the inspect cache and closes the clients of every lane, with their pooled
+        connections (and the SSH connection once its last client is closed)
+        """
 
-    async def daemon_version(self) -> SystemVersion:
-        r = await self.transport.client.get("/version")
-        return SystemVersion.model_validate(r.json())
+        await self.disable_cache()
+        await self.transport.client.aclose()
+        await self.transport.stream_client.aclose()
+        await self.transport.hijack_client.aclose()
+
+    async def __aenter__(self) -> "AsyncDocker":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
 
 class Docker(BaseDockerClient):
+    '''
+    Synchronous client. It runs the same API code as AsyncDocker over a pooled httpx.Client,
+    resource collections and the objects they return have blocking methods (see dockerxxx.sync).
+
+    https://github.com/docker/docker-py/blob/6ceb08273c157cbab7b5c77bd71e7389f1a6acc5/docker/client.py
+    '''
+
     @field_validator('transport')
-    def set_transport(cls, v, info: ValidationInfo) -> UnixSocketTransport | HttpTransport | SshTransport:
+    def set_transport(cls, v, info: ValidationInfo) -> UnixSocketTransport | HttpTransport:
+        if info.data['http'] == 'lean':
+            raise DockerException("The synchronous client does not support the lean HTTP client")
+
         if info.data['base_url'].scheme == 'unix':
-            return UnixSocketTransport(url=info.data['base_url'])
+            return UnixSocketTransport(**cls.transport_options(info))
 
-        raise NotImplementedError
+        elif info.data['base_url'].scheme in ['http', 'https']:
+            return HttpTransport(**cls.transport_options(info))
+
+        elif info.data['base_url'].scheme in ['ssh', 'unix+ssh', 'ssh+unix', 'ssh+http', 'http+ssh', 'https+ssh', 'ssh+https']:
+            raise DockerException("The synchronous client does not support ssh:// URLs, use AsyncDocker")
+
+        raise DockerException(
+            f"Protocol {info.data['base_url'].scheme} is not supported, "
+            "supported protocols are: unix://, http://, https://"
+        )
+
+    @field_validator('fanout')
+    def set_fanout(cls, v, info: ValidationInfo) -> FanOut:
+        # without an event loop list() inspects run one after the other
+        return v or FanOut(max_concurrency=1)
+
+    @classmethod
+    def from_env(cls, version: str = "auto", timeout: int = 5, decode_mode: DecodeMode = 'json',
+                 pool: Optional[PoolSettings] = None):
+        client = cls.from_settings(timeout, decode_mode=decode_mode, pool=pool)
+
+        if version == "auto":
+            client.version = client.daemon_version().api_version
+            log.debug("retrieved api version", api_version=client.version)
+
+        return client
+
+    @property
+    def images(self) -> Images:
+        return SyncProxy(super().images)
+
+    @property
+    def containers(self) -> Containers:
+        return SyncProxy(super().containers)
+
+    @property
+    def networks(self) -> Networks:
+        return SyncProxy(super().networks)
+
+    @property
+    def volumes(self) -> Volumes:
+        return SyncProxy(super().volumes)
+
+    def df(self):
+        return run_sync(super().df())
+
+    def events(self, since: str = None, until: str = None,
+               filters: Dict[Any, Any] = None) -> Iterator[EventMessage]:
+        return SyncIterator(super().events(since=since, until=until, filters=filters))
+
+    def ping(self) -> str:
+        return run_sync(super().ping())
+
+    def info(self) -> SystemInfo:
+        return run_sync(super().info())
+
+    def daemon_version(self) -> SystemVersion:
+        return run_sync(super().daemon_version())
+
+    def close(self):
+        self.transport.client.close()
+        self.transport.stream_client.close()
+        self.transport.hijack_client.close()
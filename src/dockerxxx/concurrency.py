@@ -0,0 +1,106 @@
+import time
+import asyncio
+import structlog
+from typing import Any, Awaitable, Callable, Iterable, List, Literal, Optional
+from pydantic import BaseModel, Field, PrivateAttr
+
+log = structlog.get_logger()
+
+_SKIPPED = object()
+
+
+class FanOutStats(BaseModel):
+    calls: int = 0
+    failed: int = 0
+    skipped: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+class FanOut(BaseModel):
+    """
+    Bounds the number of concurrent requests issued by list() inspect fan-outs.
+
+    A single instance is shared by all the resource collections of a client so the
+    limit applies to the client as a whole, not to each list() call.
+    """
+
+    max_concurrency: int = Field(32, gt=0)
+    on_error: Literal['raise', 'skip'] = 'raise'
+    stats: FanOutStats = Field(default_factory=FanOutStats)
+
+    _semaphore: asyncio.Semaphore = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def _call(self, func: Callable[[Any], Awaitable[Any]], item: Any,
+                    skip: Optional[Callable[[Exception], bool]], limit: Optional[asyncio.Semaphore] = None):
+        if limit is not None:
+            # the call's own limit first, so calls waiting on it don't hold the shared one
+            async with limit:
+                return await self._call(func, item, skip)
+
+        async with self._semaphore:
+            self.stats.in_flight += 1
+            self.stats.max_in_flight = max(self.stats.max_in_flight, self.stats.in_flight)
+            start = time.perf_counter()
+            try:
+                return await func(item)
+            except Exception as e:
+                if self.on_error == 'skip' or (skip is not None and skip(e)):
+                    self.stats.skipped += 1
+                    log.debug("skipping fan-out item", item=str(item), error=str(e))
+                    return _SKIPPED
+
+                self.stats.failed += 1
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                self.stats.in_flight -= 1
+                self.stats.calls += 1
+                self.stats.total_time += elapsed
+                self.stats.max_time = max(self.stats.max_time, elapsed)
+
+    async def map(self, func: Callable[[Any], Awaitable[Any]], items: Iterable[Any],
+                  skip: Optional[Callable[[Exception], bool]] = None,
+                  max_concurrency: Optional[int] = None) -> List[Any]:
+        """
+        Awaits func(item) for every item with at most max_concurrency calls in flight and
+        returns the results in order. Items whose call raises an exception matched by skip
+        (or any exception when on_error is 'skip') are left out of the results.
+
+        A max_concurrency given here further bounds the calls of this map, within the
+        limit shared with the other fan-outs of the client.
+        """
+
+        start = time.perf_counter()
+        if self.max_concurrency == 1 or max_concurrency == 1:
+            # sequential, without tasks, so it also runs for the synchronous client
+            results = [await self._call(func, item, skip) for item in items]
+        else:
+            limit = (
+                asyncio.Semaphore(max_concurrency)
+                if max_concurrency is not None and max_concurrency < self.max_concurrency
+                else None
+            )
+            tasks = [asyncio.ensure_future(self._call(func, item, skip, limit)) for item in items]
+            try:
+                results = await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+
+        # logged synchronously, FanOut runs without an event loop for the sync client
+        log.debug(
+            "fan-out complete", items=len(results),
+            elapsed=time.perf_counter() - start, max_concurrency=self.max_concurrency
+        )
+        return [result for result in results if result is not _SKIPPED]
@@ -29,3 +29,15 @@ class ContainerError(DockerException):
 
 class ImageNotFound(DockerException):
     pass
+
+class BuildError(DockerException):
+    """
+    Represents a build that failed, with the output it produced until then.
+    """
+    def __init__(self, reason, build_log):
+        super().__init__(reason)
+        self.msg = reason
+        self.build_log = build_log
+
+class ImageLoadError(DockerException):
+    pass
@@ -8,7 +8,14 @@ from datetime import datetime
 from enum import Enum
 from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, Field, conint, field_validator, ConfigDict
+from pydantic import BaseModel as PydanticBaseModel
+from pydantic import Field, conint, field_validator, ConfigDict
+
+
+class BaseModel(PydanticBaseModel):
+    # Schemas are built on first validation so importing the module
+    # doesn't pay for the ~200 models the client never touches
+    model_config = ConfigDict(defer_build=True)
 
 
 class Type(Enum):
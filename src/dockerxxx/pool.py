@@ -0,0 +1,227 @@
+import time
+import httpx
+from typing import Any, Literal, Optional
+from pydantic import BaseModel, Field
+
+# api: short calls, stream: long-lived calls, hijack: connections upgraded to raw streams
+Lane = Literal['api', 'stream', 'hijack']
+
+
+class PoolSettings(BaseModel):
+    """
+    Connection pools of a client's transport, and their timeouts. Timeouts that aren't set
+    are the client's timeout, set them to None to wait forever.
+
+    Short API calls and long-lived ones (waits, followed logs, events, stats, pulls, builds,
+    archives) go through separate pools, lanes, so the connections held by the latter never
+    hold back the former. The stream lane has limits of its own and doesn't time out reads.
+    """
+
+    max_connections: Optional[int] = Field(100, gt=0)
+    max_keepalive_connections: Optional[int] = Field(20, ge=0)
+    keepalive_expiry: Optional[float] = 5.0
+    stream_max_connections: Optional[int] = Field(None, gt=0)
+    stream_max_keepalive_connections: Optional[int] = Field(20, ge=0)
+    connect_timeout: Optional[float] = None
+    read_timeout: Optional[float] = None
+    write_timeout: Optional[float] = None
+    pool_timeout: Optional[float] = None
+    retries: int = Field(3, ge=0)
+
+    def limits(self, lane: Lane = 'api') -> httpx.Limits:
+        if lane == 'stream':
+            return httpx.Limits(
+                max_connections=self.stream_max_connections,
+                max_keepalive_connections=self.stream_max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry
+            )
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def timeout(self, default: Optional[float], lane: Lane = 'api') -> httpx.Timeout:
+        def value(name: str) -> Optional[float]:
+            return getattr(self, name) if name in self.model_fields_set else default
+
+        return httpx.Timeout(
+            default,
+            connect=value('connect_timeout'),
+            read=None if lane == 'stream' else value('read_timeout'),
+            write=value('write_timeout'),
+            pool=value('pool_timeout')
+        )
+
+
+class PoolStats(BaseModel):
+    """
+    Requests of a client's pool. wait_time is spent waiting for a connection (free or
+    new), total_time until the response headers, so a wait_time growing with it means the
+    pool rather than the daemon holds requests back.
+    """
+
+    requests: int = 0
+    failed: int = 0
+    waiting: int = 0
+    max_waiting: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    connects: int = 0
+    wait_time: float = 0.0
+    max_wait: float = 0.0
+    total_time: float = 0.0
+    connections: int = 0
+    idle_connections: int = 0
+
+    @property
+    def avg_wait(self) -> float:
+        return self.wait_time / self.requests if self.requests else 0.0
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.requests if self.requests else 0.0
+
+
+class RequestMeter:
+    """
+    Follows a request through the pool: waiting for a connection until httpcore's first
+    trace event (connecting, or sending on a kept-alive connection), holding it until the
+    response is closed
+    """
+
+    def __init__(self, stats: PoolStats, request: httpx.Request):
+        self.stats = stats
+        self.started = time.perf_counter()
+        self.acquired = False
+        self.released = False
+        self.trace = request.extensions.get('trace')
+
+        stats.requests += 1
+        stats.waiting += 1
+        stats.max_waiting = max(stats.max_waiting, stats.waiting)
+
+    def event(self, name: str):
+        if not self.acquired:
+            self.acquired = True
+            wait = time.perf_counter() - self.started
+            self.stats.waiting -= 1
+            self.stats.in_flight += 1
+            self.stats.max_in_flight = max(self.stats.max_in_flight, self.stats.in_flight)
+            self.stats.wait_time += wait
+            self.stats.max_wait = max(self.stats.max_wait, wait)
+        if name.startswith('connection.connect_') and name.endswith('.started'):
+            self.stats.connects += 1
+
+    def responded(self):
+        self.stats.total_time += time.perf_counter() - self.started
+
+    def release(self, failed: bool = False):
+        if self.released:
+            return
+        self.released = True
+        if failed:
+            self.stats.failed += 1
+        if self.acquired:
+            self.stats.in_flight -= 1
+        else:
+            self.stats.waiting -= 1
+
+
+class _MeteredStream(httpx.AsyncByteStream, httpx.SyncByteStream):
+    def __init__(self, stream, meter: RequestMeter):
+        self.stream = stream
+        self.meter = meter
+
+    def __aiter__(self):
+        # the chunks come straight from the wrapped stream, only closing is intercepted
+        return self.stream.__aiter__()
+
+    def __iter__(self):
+        return iter(self.stream)
+
+    async def aclose(self):
+        self.meter.release()
+        await self.stream.aclose()
+
+    def close(self):
+        self.meter.release()
+        self.stream.close()
+
+
+def _pool_connections(transport: Any, stats: PoolStats) -> PoolStats:
+    connections = transport._pool.connections
+    return stats.model_copy(update={
+        'connections': len(connections),
+        'idle_connections': sum(1 for connection in connections if connection.is_idle())
+    })
+
+
+class MeteredTransport(httpx.AsyncBaseTransport):
+    """
+    Keeps the PoolStats of the requests sent through transport
+    """
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport, stats: PoolStats):
+        self.transport = transport
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        meter = RequestMeter(self.stats, request)
+
+        async def trace(name: str, info: dict):
+            meter.event(name)
+            if meter.trace is not None:
+                await meter.trace(name, info)
+
+        request.extensions = {**request.extensions, 'trace': trace}
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            meter.release(failed=True)
+            raise
+
+        meter.responded()
+        response.stream = _MeteredStream(response.stream, meter)
+        return response
+
+    def snapshot(self) -> PoolStats:
+        return _pool_connections(self.transport, self.stats)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class MeteredSyncTransport(httpx.BaseTransport):
+    """
+    MeteredTransport for the synchronous client
+    """
+
+    def __init__(self, transport: httpx.HTTPTransport, stats: PoolStats):
+        self.transport = transport
+        self.stats = stats
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        meter = RequestMeter(self.stats, request)
+
+        def trace(name: str, info: dict):
+            meter.event(name)
+            if meter.trace is not None:
+                meter.trace(name, info)
+
+        request.extensions = {**request.extensions, 'trace': trace}
+        try:
+            response = self.transport.handle_request(request)
+        except BaseException:
+            meter.release(failed=True)
+            raise
+
+        meter.responded()
+        response.stream = _MeteredStream(response.stream, meter)
+        return response
+
+    def snapshot(self) -> PoolStats:
+        return _pool_connections(self.transport, self.stats)
+
+    def close(self):
+        self.transport.close()
@@ -0,0 +1,330 @@
+"""
+Docker over SSH without a local socket.
+
+The SSH transports give httpx an httpcore network backend whose connections are
+channels of an asyncssh connection: every HTTP connection of the pool is a direct
+streamlocal channel to the daemon's socket on the remote host (ssh://) or a direct TCP
+channel to a daemon listening on a port the SSH host can reach (ssh+http://,
+ssh+https://, with TLS spoken over the channel). One SSH connection per host (and user)
+is shared by all the clients of an event loop, kept alive with SSH keepalives and
+reopened on the next request once it's lost.
+
+Imported lazily by the transports, so asyncssh is only loaded for ssh:// URLs.
+"""
+
+import ssl
+import asyncio
+import weakref
+import asyncssh
+import httpx
+import httpcore
+import structlog
+from typing import Any, Dict, Optional, Tuple
+from .tls import AsyncTlsTransport
+
+log = structlog.get_logger()
+
+SshKey = Tuple[str, int, Optional[str]]
+
+# a lost connection is noticed within KEEPALIVE_INTERVAL * KEEPALIVE_COUNT_MAX seconds
+KEEPALIVE_INTERVAL = 30
+KEEPALIVE_COUNT_MAX = 3
+DEFAULT_REMOTE_PATH = "/var/run/docker.sock"
+
+# ssh+http(s):// URLs tunnel to <path> as host:port, the daemon's own ports by default
+TUNNEL_SCHEMES = {'ssh+http': 'http', 'http+ssh': 'http', 'ssh+https': 'https', 'https+ssh': 'https'}
+TUNNEL_PORTS = {'http': 2375, 'https': 2376}
+
+# how much ciphertext a TLS stream reads from its channel at a time
+TLS_READ_SIZE = 64 * 1024
+
+# shared connections, by event loop (asyncssh connections can't move between loops)
+_connections: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[SshKey, SshConnection]]" = \
+    weakref.WeakKeyDictionary()
+
+# errors meaning the SSH connection itself is gone, rather than a channel being refused
+_CONNECTION_ERRORS = (OSError, asyncssh.DisconnectError, asyncssh.ConnectionLost)
+
+
+class SshChannelStream(httpcore.AsyncNetworkStream):
+    """
+    An SSH channel as the network stream of an httpcore connection
+    """
+
+    def __init__(self, reader: asyncssh.SSHReader, writer: asyncssh.SSHWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def read(self, max_bytes: int, timeout: Optional[float] = None) -> bytes:
+        try:
+            return await asyncio.wait_for(self.reader.read(max_bytes), timeout)
+        except asyncio.TimeoutError as e:
+            raise httpcore.ReadTimeout(str(e)) from e
+        except (*_CONNECTION_ERRORS, asyncssh.Error) as e:
+            raise httpcore.ReadError(str(e)) from e
+
+    async def write(self, buffer: bytes, timeout: Optional[float] = None):
+        if not buffer:
+            return
+
+        try:
+            self.writer.write(buffer)
+            await asyncio.wait_for(self.writer.drain(), timeout)
+        except asyncio.TimeoutError as e:
+            raise httpcore.WriteTimeout(str(e)) from e
+        except (*_CONNECTION_ERRORS, asyncssh.Error) as e:
+            raise httpcore.WriteError(str(e)) from e
+
+    async def aclose(self):
+        self.writer.close()
+
+    async def start_tls(self, ssl_context: ssl.SSLContext, server_hostname: Optional[str] = None,
+                        timeout: Optional[float] = None) -> "SshTlsStream":
+        stream = SshTlsStream(self, ssl_context, server_hostname)
+        await stream.handshake(timeout)
+        return stream
+
+    def get_extra_info(self, info: str) -> Any:
+        # there's no socket of our own, the channel is multiplexed on the SSH connection's
+        if info == 'stream_writer':
+            return self.writer
+        if info == 'is_readable':
+            # asked of idle pooled connections: anything to read means the daemon hung up
+            return self.writer.is_closing() or self.reader.at_eof()
+        return None
+
+
+class SshTlsStream(httpcore.AsyncNetworkStream):
+    """
+    TLS over an SSH channel. A channel isn't an asyncio transport that could be upgraded
+    in place, so records go through memory BIOs of an SSLObject.
+    """
+
+    def __init__(self, stream: SshChannelStream, ssl_context: ssl.SSLContext, server_hostname: Optional[str] = None):
+        self.stream = stream
+        self._incoming = ssl.MemoryBIO()
+        self._outgoing = ssl.MemoryBIO()
+        self.ssl_object = ssl_context.wrap_bio(self._incoming, self._outgoing, server_hostname=server_hostname)
+
+    async def _call(self, operation, *args: Any, timeout: Optional[float] = None) -> Any:
+        # runs an SSLObject operation, moving records to and from the channel until it goes through
+        while True:
+            try:
+                result = operation(*args)
+            except ssl.SSLWantReadError:
+                await self._flush(timeout)
+                data = await self.stream.read(TLS_READ_SIZE, timeout)
+                if data:
+                    self._incoming.write(data)
+                else:
+                    self._incoming.write_eof()
+                continue
+            await self._flush(timeout)
+            return result
+
+    async def _flush(self, timeout: Optional[float]):
+        if self._outgoing.pending:
+            await self.stream.write(self._outgoing.read(), timeout)
+
+    async def handshake(self, timeout: Optional[float] = None):
+        try:
+            await self._call(self.ssl_object.do_handshake, timeout=timeout)
+        except ssl.SSLError as e:
+            raise httpcore.ConnectError(str(e)) from e
+
+    async def read(self, max_bytes: int, timeout: Optional[float] = None) -> bytes:
+        try:
+            return await self._call(self.ssl_object.read, max_bytes, timeout=timeout)
+        except (ssl.SSLZeroReturnError, ssl.SSLEOFError):
+            return b''
+        except ssl.SSLError as e:
+            raise httpcore.ReadError(str(e)) from e
+
+    async def write(self, buffer: bytes, timeout: Optional[float] = None):
+        view = memoryview(buffer)
+        try:
+            while view:
+                view = view[await self._call(self.ssl_object.write, view, timeout=timeout):]
+        except ssl.SSLError as e:
+            raise httpcore.WriteError(str(e)) from e
+
+    async def aclose(self):
+        await self.stream.aclose()
+
+    def get_extra_info(self, info: str) -> Any:
+        if info == 'ssl_object':
+            return self.ssl_object
+        return self.stream.get_extra_info(info)
+
+
+class SshConnection:
+    """
+    SSH connection to a host shared by every transport using it on an event loop. It is
+    opened on first use, reopened on the first use after it was lost and closed when its
+    last transport is.
+    """
+
+    def __init__(self, key: SshKey, options: Dict[str, Any]):
+        self.key = key
+        self.options = options
+        self.users = 0
+        self.connects = 0
+        self._conn: Optional[asyncssh.SSHClientConnection] = None
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def acquire(cls, key: SshKey, options: Dict[str, Any]) -> "SshConnection":
+        connections = _connections.setdefault(asyncio.get_running_loop(), {})
+        connection = connections.get(key)
+        if connection is None:
+            connection = connections[key] = cls(key, options)
+        connection.users += 1
+        return connection
+
+    async def release(self):
+        self.users -= 1
+        if self.users > 0:
+            return
+
+        _connections.get(asyncio.get_running_loop(), {}).pop(self.key, None)
+        if self._conn is not None:
+            self._conn.close()
+            await self._conn.wait_closed()
+            self._conn = None
+
+    async def connect(self, timeout: Optional[float] = None) -> asyncssh.SSHClientConnection:
+        conn = self._conn
+        if conn is not None and not conn.is_closed():
+            return conn
+
+        async with self._lock:
+            if self._conn is None or self._conn.is_closed():
+                host, port, username = self.key
+                await log.adebug("opening ssh connection", host=host, port=port, username=username)
+                try:
+                    self._conn = await asyncio.wait_for(
+                        asyncssh.connect(host, port, username=username, **self.options), timeout
+                    )
+                except asyncio.TimeoutError as e:
+                    raise httpcore.ConnectTimeout(f"SSH connection to {host}:{port} timed out") from e
+                except (*_CONNECTION_ERRORS, asyncssh.Error) as e:
+                    raise httpcore.ConnectError(f"SSH connection to {host}:{port} failed: {e}") from e
+                self.connects += 1
+            return self._conn
+
+    async def open_channel(self, opener: str, *args: Any, timeout: Optional[float] = None) -> SshChannelStream:
+        """
+        Opens a channel with opener (open_unix_connection, open_connection) of the SSH
+        connection, reconnecting once if the connection turns out to be lost
+        """
+
+        for attempt in range(2):
+            conn = await self.connect(timeout)
+            try:
+                reader, writer = await asyncio.wait_for(getattr(conn, opener)(*args), timeout)
+                return SshChannelStream(reader, writer)
+            except asyncio.TimeoutError as e:
+                raise httpcore.ConnectTimeout(str(e)) from e
+            except asyncssh.ChannelOpenError as e:
+                raise httpcore.ConnectError(f"SSH channel refused: {e.reason}") from e
+            except _CONNECTION_ERRORS as e:
+                conn.close()
+                if attempt:
+                    raise httpcore.ConnectError(str(e)) from e
+                await log.adebug("ssh connection lost, reconnecting", host=self.key[0], error=str(e))
+
+
+class SshNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    httpcore network backend connecting HTTP connections as channels of the host's shared
+    SSH connection: to the daemon's socket at remote_path whatever their host, or without
+    one to their host and port as seen from the SSH host
+    """
+
+    def __init__(self, key: SshKey, options: Dict[str, Any], remote_path: Optional[str] = None):
+        self.key = key
+        self.options = options
+        self.remote_path = remote_path
+        self.connection: Optional[SshConnection] = None
+
+    def _connection(self) -> SshConnection:
+        if self.connection is None:
+            self.connection = SshConnection.acquire(self.key, self.options)
+        return self.connection
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None,
+                          local_address: Optional[str] = None, socket_options=None) -> SshChannelStream:
+        if self.remote_path is None:
+            return await self._connection().open_channel('open_connection', host, port, timeout=timeout)
+        return await self._connection().open_channel('open_unix_connection', self.remote_path, timeout=timeout)
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None,
+                                  socket_options=None) -> SshChannelStream:
+        return await self._connection().open_channel('open_unix_connection', path, timeout=timeout)
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+    async def aclose(self):
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            await connection.release()
+
+
+def ssh_options(url) -> Tuple[SshKey, Dict[str, Any]]:
+    """
+    Connection key and asyncssh options for an ssh:// URL
+    """
+
+    options = {
+        'known_hosts': None,  # we should be able to turn this on via the URL
+        'keepalive_interval': KEEPALIVE_INTERVAL,
+        'keepalive_count_max': KEEPALIVE_COUNT_MAX,
+    }
+    if url.password:
+        options.update(password=url.password, client_keys=[])
+    return (url.host, url.port or 22, url.username), options
+
+
+def ssh_transport(url, verify: bool | ssl.SSLContext = True, limits: httpx.Limits = httpx.Limits(),
+                  retries: int = 0) -> Tuple["AsyncSshHTTPTransport", str]:
+    """
+    httpx transport and base URL for an ssh://user@host/path/to/docker.sock or an
+    ssh+http(s)://user@host/daemon-host:port URL
+    """
+
+    key, options = ssh_options(url)
+    scheme = TUNNEL_SCHEMES.get(url.scheme)
+    if scheme is None:
+        remote_path = url.path if url.path not in (None, '', '/') else DEFAULT_REMOTE_PATH
+        return AsyncSshHTTPTransport(SshNetworkBackend(key, options, remote_path), verify, limits, retries), "http://docker"
+
+    target = (url.path or '').strip('/')
+    host, separator, port = target.rpartition(':')
+    if not separator:
+        host, port = target, ''
+    base_url = f"{scheme}://{host or 'localhost'}:{port or TUNNEL_PORTS[scheme]}"
+    return AsyncSshHTTPTransport(SshNetworkBackend(key, options), verify, limits, retries), base_url
+
+
+class AsyncSshHTTPTransport(AsyncTlsTransport):
+    """
+    httpx transport sending its requests through an SshNetworkBackend
+    """
+
+    def __init__(self, backend: SshNetworkBackend, verify: bool | ssl.SSLContext = True, limits: httpx.Limits = httpx.Limits(),
+                 retries: int = 0):
+        super().__init__(verify=verify, limits=limits, retries=retries)
+        self.backend = backend
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(verify=verify),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            retries=retries,
+            network_backend=backend,
+        )
+
+    async def aclose(self):
+        await super().aclose()
+        await self.backend.aclose()
@@ -0,0 +1,128 @@
+"""
+Runs the async API synchronously for the Docker client.
+
+The synchronous transports hand the API code a SyncClientAdapter whose coroutines
+block on a pooled httpx.Client instead of suspending, so a coroutine of the API runs
+to completion on its first step and can be driven without an event loop.
+"""
+
+import inspect
+from collections.abc import AsyncIterator
+from typing import Any, Awaitable, Iterator, TypeVar
+from pydantic import BaseModel
+from .errors import DockerException
+
+T = TypeVar('T')
+
+
+def run_sync(awaitable: Awaitable[T]) -> T:
+    """
+    Runs a coroutine that never suspends and returns its result
+    """
+
+    try:
+        awaitable.send(None)
+    except StopIteration as e:
+        return e.value
+
+    awaitable.close()
+    raise DockerException(
+        "The call tried to wait on an event loop, which the synchronous client doesn't run. Use AsyncDocker for it"
+    )
+
+
+class SyncIterator:
+    """
+    Iterates an async iterator of the API synchronously. Other attributes are read from
+    the async iterator, e.g. the exit_code of an exec's output stream.
+    """
+
+    def __init__(self, iterator: AsyncIterator):
+        self.iterator = iterator
+
+    def __iter__(self) -> Iterator:
+        return self
+
+    def __next__(self) -> Any:
+        try:
+            return wrap(run_sync(self.iterator.__anext__()))
+        except StopAsyncIteration:
+            raise StopIteration
+
+    def __getattr__(self, name: str) -> Any:
+        return blocking(getattr(self.iterator, name), name, owner=self)
+
+    def close(self):
+        if hasattr(self.iterator, 'aclose'):
+            run_sync(self.iterator.aclose())
+
+    def __del__(self):
+        self.close()
+
+
+def wrap(value: Any) -> Any:
+    """
+    Wraps API objects (anything with a transport) in a SyncProxy and turns async iterators
+    into iterators. Everything else, such as plain models and bytes, is returned as is.
+    """
+
+    if isinstance(value, BaseModel) and 'transport' in type(value).model_fields:
+        return SyncProxy(value)
+    if isinstance(value, list):
+        return [wrap(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(wrap(item) for item in value)
+    if isinstance(value, AsyncIterator):
+        return SyncIterator(value)
+    return value
+
+
+def blocking(value: Any, name: str, owner: Any = None) -> Any:
+    """
+    Turns an attribute of an API object into its synchronous counterpart: coroutine and
+    async generator methods become blocking methods, other values are wrapped. The
+    methods keep owner alive, so e.g. container.export().save(path) doesn't close the
+    stream it was called on before it runs.
+    """
+
+    if inspect.iscoroutinefunction(value):
+        def method(*args, **kwargs):
+            return wrap(run_sync(value(*args, **kwargs)))
+    elif inspect.isasyncgenfunction(value):
+        def method(*args, **kwargs):
+            return SyncIterator(value(*args, **kwargs))
+    else:
+        return wrap(value)
+
+    method.__name__ = name
+    method.__doc__ = value.__doc__
+    method.__owner__ = owner
+    return method
+
+
+class SyncProxy:
+    """
+    Synchronous view of an object of the async API (a collection, container, image...):
+    its coroutine methods block and return their results, async iterators are iterated
+    synchronously and attributes are read and set on the wrapped object.
+    """
+
+    __slots__ = ('_target',)
+
+    def __init__(self, target: Any):
+        object.__setattr__(self, '_target', target)
+
+    def __getattr__(self, name: str) -> Any:
+        return blocking(getattr(self._target, name), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._target, name, value)
+
+    def __eq__(self, other: Any) -> bool:
+        return self._target == (other._target if isinstance(other, SyncProxy) else other)
+
+    def __repr__(self) -> str:
+        return repr(self._target)
+
+    def __dir__(self):
+        return dir(self._target)
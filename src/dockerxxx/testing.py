@@ -0,0 +1,1318 @@
+"""
+In-process fake Docker Engine for tests and benchmarks.
+
+FakeEngine speaks just enough HTTP/1.1 over a Unix socket for AsyncUnixSocketTransport
+to talk to it: container list/inspect, multiplexed logs, exec hijacking, stats, events
+and image/network/volume listings. Objects are generated deterministically so runs are
+comparable, and an artificial per-request latency can be added to mimic a remote daemon.
+
+    async with FakeEngine(containers=5000, latency=0.001) as engine:
+        docker = AsyncDocker(base_url=engine.url)
+
+It can also be run standalone, e.g. to benchmark against it from another process:
+
+    python -m dockerxxx.testing --socket /tmp/fake-docker.sock --containers 5000
+"""
+
+import re
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import io
+import base64
+import tarfile
+import posixpath
+import tempfile
+import threading
+import os
+import zlib
+from contextlib import contextmanager
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+from email.utils import formatdate
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
+from .utils import STREAM_HEADER
+from .api.archive import MODE_DIR, MODE_SYMLINK, TarParser
+
+API_VERSION = "1.43"
+
+_VERSION_PREFIX = re.compile(r'^/v[\d.]+(?=/)')
+
+
+def fake_id(kind: str, n: int) -> str:
+    return hashlib.sha256(f"{kind}{n}".encode()).hexdigest()
+
+
+def frame(stream: int, data: bytes) -> bytes:
+    """
+    Encodes data the way the daemon multiplexes stdout/stderr on non-tty streams
+    """
+
+    return STREAM_HEADER.pack(stream, len(data)) + data
+
+
+class Request(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    method: str
+    path: str
+    query: Dict[str, List[str]]
+    headers: Dict[str, str]
+    reader: asyncio.StreamReader
+
+    _done: bool = PrivateAttr(False)
+
+    def param(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.query.get(name, [default])[-1]
+
+    def flag(self, name: str, default: bool = False) -> bool:
+        value = self.param(name)
+        return default if value is None else value.lower() in ('1', 'true')
+
+    def filters(self) -> Dict[str, Any]:
+        return json.loads(self.param('filters') or '{}')
+
+    async def iter_body(self) -> AsyncIterator[bytes]:
+        """
+        Yields the request body as it arrives, handling both Content-Length and chunked bodies
+        """
+
+        if self._done:
+            return
+
+        if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readuntil(b'\r\n')
+                    break
+                yield await self.reader.readexactly(size)
+                await self.reader.readexactly(2)
+        else:
+            remaining = int(self.headers.get('content-length', 0))
+            while remaining:
+                chunk = await self.reader.read(min(remaining, 64 * 1024))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b'', remaining)
+                remaining -= len(chunk)
+                yield chunk
+
+        self._done = True
+
+    async def body(self) -> bytes:
+        return b''.join([chunk async for chunk in self.iter_body()])
+
+    async def read_json(self) -> Any:
+        body = await self.body()
+        return json.loads(body) if body else None
+
+
+class Reply:
+    """
+    Writes HTTP/1.1 responses to a connection: whole bodies, chunked streams or upgrades
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.keep_alive = True
+
+    def _head(self, status: int, headers: Dict[str, str]):
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                 f"Date: {formatdate(usegmt=True)}",
+                 f"Api-Version: {API_VERSION}",
+                 "Server: Docker/24.0.7 (linux)"]
+        lines.extend(f"{k}: {v}" for k, v in headers.items())
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+
+    async def send(self, status: int = 200, body: bytes = b'',
+                   content_type: str = 'text/plain; charset=utf-8', headers: Dict[str, str] = None):
+        self._head(status, {'Content-Type': content_type, 'Content-Length': str(len(body)), **(headers or {})})
+        self.writer.write(body)
+        await self.writer.drain()
+
+    async def send_json(self, obj: Any, status: int = 200, headers: Dict[str, str] = None):
+        await self.send(status, json.dumps(obj).encode(), 'application/json', headers)
+
+    async def error(self, status: int, message: str):
+        await self.send_json({'message': message}, status)
+
+    async def start_stream(self, status: int = 200, content_type: str = 'application/json',
+                           headers: Dict[str, str] = None):
+        self._head(status, {'Content-Type': content_type, 'Transfer-Encoding': 'chunked', **(headers or {})})
+        await self.writer.drain()
+
+    async def write(self, data: bytes):
+        if data:
+            self.writer.write(b'%x\r\n%b\r\n' % (len(data), data))
+            await self.writer.drain()
+
+    async def end_stream(self):
+        self.writer.write(b'0\r\n\r\n')
+        await self.writer.drain()
+
+    async def upgrade(self, content_type: str = 'application/vnd.docker.raw-stream'):
+        """
+        Switches the connection to a raw stream, it won't be reused for requests afterwards
+        """
+
+        self.keep_alive = False
+        self._head(101, {'Content-Type': content_type, 'Connection': 'Upgrade', 'Upgrade': 'tcp'})
+        await self.writer.drain()
+
+
+Handler = Callable[..., Awaitable[None]]
+
+
+class FakeEngine(BaseModel):
+    """
+    Fake Docker Engine listening on a Unix socket.
+
+    Object counts, log/exec output sizes and stream lengths are configurable, as is
+    a latency added before every response.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    socket_path: Optional[str] = None
+    containers: int = Field(10, ge=0)
+    images: int = Field(5, ge=0)
+    networks: int = Field(3, ge=0)
+    volumes: int = Field(3, ge=0)
+    latency: float = Field(0.0, ge=0)
+    tty: bool = False
+    log_lines: int = Field(100, ge=0)
+    exec_output: int = Field(12, ge=0)
+    exit_code: int = 0
+    stats_samples: int = Field(5, ge=0)
+    stats_interval: float = Field(0.0, ge=0)
+    event_burst: int = Field(0, ge=0)
+    wait_delay: float = Field(0.0, ge=0)
+    archive_size: int = Field(1024 * 1024, ge=0)
+    archive_buffer_limit: int = Field(64 * 1024 * 1024, ge=0)
+    pull_layers: int = Field(3, ge=0)
+    pull_layer_size: int = Field(1024 * 1024, ge=0)
+    pull_steps: int = Field(4, gt=0)
+    pull_delay: float = Field(0.0, ge=0)
+
+    requests: int = 0
+    pulls: int = 0
+    build_contexts: List[Dict[str, Any]] = Field(default_factory=list)
+
+    _containers: Dict[str, Dict[str, Any]] = PrivateAttr(default_factory=dict)
+    _images: Dict[str, Dict[str, Any]] = PrivateAttr(default_factory=dict)
+    _networks: Dict[str, Dict[str, Any]] = PrivateAttr(default_factory=dict)
+    _volumes: Dict[str, Dict[str, Any]] = PrivateAttr(default_factory=dict)
+    _execs: Dict[str, Dict[str, Any]] = PrivateAttr(default_factory=dict)
+    _filesystems: Dict[str, Dict[str, Dict[str, Any]]] = PrivateAttr(default_factory=dict)
+    _refs: Dict[Tuple[str, str], str] = PrivateAttr(default_factory=dict)
+    _subscribers: List[asyncio.Queue] = PrivateAttr(default_factory=list)
+    _routes: List[Tuple[str, re.Pattern, Handler]] = PrivateAttr(default_factory=list)
+    _server: Optional[asyncio.AbstractServer] = PrivateAttr(None)
+    _tmpdir: Optional[tempfile.TemporaryDirectory] = PrivateAttr(None)
+    _connections: set = PrivateAttr(default_factory=set)
+    _counter: int = PrivateAttr(0)
+
+    def model_post_init(self, __context: Any) -> None:
+        for n in range(self.images):
+            self.add_image(f"fake/image{n}:latest")
+        for n in range(self.networks):
+            self.add_network(f"network{n}")
+        for n in range(self.volumes):
+            self.add_volume(f"volume{n}")
+        for n in range(self.containers):
+            self.add_container(f"container{n}")
+
+        self.route('GET', r'/_ping', self.ping)
+        self.route('HEAD', r'/_ping', self.ping)
+        self.route('GET', r'/version', self.version)
+        self.route('GET', r'/info', self.info)
+        self.route('GET', r'/events', self.events)
+        self.route('GET', r'/containers/json', self.container_list)
+        self.route('POST', r'/containers/create', self.container_create)
+        self.route('GET', r'/containers/(?P<ref>[^/]+)/json', self.container_inspect)
+        self.route('GET', r'/containers/(?P<ref>[^/]+)/logs', self.container_logs)
+        self.route('GET', r'/containers/(?P<ref>[^/]+)/stats', self.container_stats)
+        self.route('POST', r'/containers/(?P<ref>[^/]+)/wait', self.container_wait)
+        self.route('POST', r'/containers/(?P<ref>[^/]+)/(?P<action>start|stop|restart|kill|pause|unpause)',
+                   self.container_action)
+        self.route('DELETE', r'/containers/(?P<ref>[^/]+)', self.container_remove)
+        self.route('GET', r'/containers/(?P<ref>[^/]+)/archive', self.archive_get)
+        self.route('HEAD', r'/containers/(?P<ref>[^/]+)/archive', self.archive_get)
+        self.route('PUT', r'/containers/(?P<ref>[^/]+)/archive', self.archive_put)
+        self.route('GET', r'/containers/(?P<ref>[^/]+)/export', self.container_export)
+        self.route('POST', r'/containers/(?P<ref>[^/]+)/exec', self.exec_create)
+        self.route('POST', r'/exec/(?P<ref>[^/]+)/start', self.exec_start)
+        self.route('GET', r'/exec/(?P<ref>[^/]+)/json', self.exec_inspect)
+        self.route('GET', r'/images/json', self.image_list)
+        self.route('POST', r'/images/create', self.image_pull)
+        self.route('POST', r'/build', self.image_build)
+        self.route('GET', r'/images/get', self.image_save)
+        self.route('GET', r'/images/(?P<ref>.+)/get', self.image_save)
+        self.route('POST', r'/images/load', self.image_load)
+        self.route('GET', r'/images/(?P<ref>.+)/json', self.image_inspect)
+        self.route('GET', r'/networks', self.network_list)
+        self.route('GET', r'/networks/(?P<ref>[^/]+)', self.network_inspect)
+        self.route('GET', r'/volumes', self.volume_list)
+        self.route('GET', r'/volumes/(?P<ref>[^/]+)', self.volume_inspect)
+
+    def route(self, method: str, pattern: str, handler: Handler):
+        """
+        Registers handler(request, reply, **groups) for requests matching method and pattern.
+        Routes added later take precedence, so tests can override the built-in ones.
+        """
+
+        self._routes.insert(0, (method, re.compile(f"^{pattern}$"), handler))
+
+    @property
+    def url(self) -> str:
+        return f"unix://{self.socket_path}"
+
+    @property
+    def subscribers(self) -> int:
+        """
+        Number of open /events streams
+        """
+
+        return len(self._subscribers)
+
+    async def start(self):
+        if self.socket_path is None:
+            self._tmpdir = tempfile.TemporaryDirectory(prefix='dockerxxx-')
+            self.socket_path = os.path.join(self._tmpdir.name, 'docker.sock')
+
+        self._server = await asyncio.start_unix_server(self._serve, path=self.socket_path)
+        return self
+
+    async def stop(self):
+        for queue in self._subscribers:
+            queue.put_nowait(None)
+
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+        if self._tmpdir is not None:
+            self._tmpdir.cleanup()
+            self._tmpdir = None
+            self.socket_path = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    @contextmanager
+    def threaded(self):
+        """
+        Serves from an event loop in a background thread, for synchronous clients
+        """
+
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(self.start(), loop).result()
+            yield self
+        finally:
+            asyncio.run_coroutine_threadsafe(self.stop(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    # Object registry
+
+    def _register(self, kind: str, registry: Dict[str, Dict[str, Any]], obj_id: str, name: str, obj: Dict[str, Any]):
+        registry[obj_id] = obj
+        self._refs[(kind, obj_id)] = obj_id
+        self._refs[(kind, obj_id[:12])] = obj_id
+        self._refs[(kind, name)] = obj_id
+
+    def _lookup(self, kind: str, registry: Dict[str, Dict[str, Any]], ref: str) -> Optional[Dict[str, Any]]:
+        ref = ref.removeprefix('sha256:')
+        obj_id = self._refs.get((kind, ref))
+        if obj_id is None:
+            obj_id = next((i for i in registry if i.startswith(ref)), None) if len(ref) >= 4 else None
+        return registry.get(obj_id)
+
+    def add_image(self, tag: str) -> Dict[str, Any]:
+        image_id = fake_id('image', len(self._images))
+        image = {
+            'Id': f"sha256:{image_id}",
+            'RepoTags': [tag],
+            'RepoDigests': [f"{tag.split(':')[0]}@sha256:{fake_id('digest', len(self._images))}"],
+            'Parent': '',
+            'Comment': '',
+            'Created': '2023-12-01T10:00:00.000000000Z',
+            'Container': '',
+            'DockerVersion': '24.0.7',
+            'Author': '',
+            'Architecture': 'amd64',
+            'Os': 'linux',
+            'Size': 7_800_000,
+            'VirtualSize': 7_800_000,
+            'GraphDriver': {'Name': 'overlay2', 'Data': {'MergedDir': f"/var/lib/docker/overlay2/{image_id}/merged"}},
+            # every image is on the same base layer, like images sharing a distribution
+            'RootFS': {'Type': 'layers', 'Layers': [
+                f"sha256:{fake_id('base layer', 0)}", f"sha256:{fake_id('layer', len(self._images))}"
+            ]},
+            'Config': {
+                'Env': ['PATH=/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'],
+                'Cmd': ['/bin/sh'],
+                'Labels': None,
+            },
+            'Metadata': {'LastTagTime': '0001-01-01T00:00:00Z'},
+        }
+        self._register('image', self._images, image_id, tag, image)
+        return image
+
+    def add_network(self, name: str) -> Dict[str, Any]:
+        network_id = fake_id('network', len(self._networks))
+        network = {
+            'Name': name,
+            'Id': network_id,
+            'Created': '2023-12-01T10:00:00.000000000Z',
+            'Scope': 'local',
+            'Driver': 'bridge',
+            'EnableIPv6': False,
+            'IPAM': {'Driver': 'default', 'Options': None,
+                     'Config': [{'Subnet': f"172.{18 + len(self._networks)}.0.0/16"}]},
+            'Internal': False,
+            'Attachable': False,
+            'Ingress': False,
+            'Containers': {},
+            'Options': {},
+            'Labels': {},
+        }
+        self._register('network', self._networks, network_id, name, network)
+        return network
+
+    def add_volume(self, name: str) -> Dict[str, Any]:
+        volume = {
+            'Name': name,
+            'Driver': 'local',
+            'Mountpoint': f"/var/lib/docker/volumes/{name}/_data",
+            'CreatedAt': '2023-12-01T10:00:00Z',
+            'Labels': {},
+            'Scope': 'local',
+            'Options': {},
+        }
+        self._register('volume', self._volumes, name, name, volume)
+        return volume
+
+    def add_container(self, name: str, image: Optional[str] = None, running: bool = True,
+                      tty: Optional[bool] = None, cmd: Optional[List[str]] = None) -> Dict[str, Any]:
+        self._counter += 1
+        container_id = fake_id('container', self._counter)
+        image = image or (next(iter(self._images.values()))['RepoTags'][0] if self._images else 'busybox:latest')
+        image_obj = self._lookup('image', self._images, image)
+        image_id = image_obj['Id'] if image_obj else f"sha256:{fake_id('image', -1)}"
+        cmd = cmd or ['sleep', 'infinity']
+        tty = self.tty if tty is None else tty
+
+        container = {
+            'Id': container_id,
+            'Created': '2023-12-01T10:00:00.000000000Z',
+            'Path': cmd[0],
+            'Args': cmd[1:],
+            'State': {
+                'Status': 'running' if running else 'created',
+                'Running': running,
+                'Paused': False,
+                'Restarting': False,
+                'OOMKilled': False,
+                'Dead': False,
+                'Pid': 1000 + self._counter if running else 0,
+                'ExitCode': 0,
+                'Error': '',
+                'StartedAt': '2023-12-01T10:00:01.000000000Z' if running else '0001-01-01T00:00:00Z',
+                'FinishedAt': '0001-01-01T00:00:00Z',
+            },
+            'Image': image_id,
+            'ResolvConfPath': f"/var/lib/docker/containers/{container_id}/resolv.conf",
+            'HostnamePath': f"/var/lib/docker/containers/{container_id}/hostname",
+            'HostsPath': f"/var/lib/docker/containers/{container_id}/hosts",
+            'LogPath': f"/var/lib/docker/containers/{container_id}/{container_id}-json.log",
+            'Name': f"/{name}",
+            'RestartCount': 0,
+            'Driver': 'overlay2',
+            'Platform': 'linux',
+            'MountLabel': '',
+            'ProcessLabel': '',
+            'AppArmorProfile': 'docker-default',
+            'ExecIDs': None,
+            'HostConfig': {
+                'Binds': None,
+                'ContainerIDFile': '',
+                'LogConfig': {'Type': 'json-file', 'Config': {}},
+                'NetworkMode': 'default',
+                'PortBindings': {},
+                'RestartPolicy': {'Name': 'no', 'MaximumRetryCount': 0},
+                'AutoRemove': False,
+                'VolumeDriver': '',
+                'VolumesFrom': None,
+                'CapAdd': None,
+                'CapDrop': None,
+                'CgroupnsMode': 'private',
+                'Dns': [],
+                'DnsOptions': [],
+                'DnsSearch': [],
+                'ExtraHosts': None,
+                'GroupAdd': None,
+                'IpcMode': 'private',
+                'Cgroup': '',
+                'Links': None,
+                'OomScoreAdj': 0,
+                'PidMode': '',
+                'Privileged': False,
+                'PublishAllPorts': False,
+                'ReadonlyRootfs': False,
+                'SecurityOpt': None,
+                'UTSMode': '',
+                'UsernsMode': '',
+                'ShmSize': 67108864,
+                'Runtime': 'runc',
+                'Isolation': '',
+                'CpuShares': 0,
+                'Memory': 0,
+                'NanoCpus': 0,
+                'CgroupParent': '',
+                'BlkioWeight': 0,
+                'BlkioWeightDevice': [],
+                'BlkioDeviceReadBps': [],
+                'BlkioDeviceWriteBps': [],
+                'BlkioDeviceReadIOps': [],
+                'BlkioDeviceWriteIOps': [],
+                'CpuPeriod': 0,
+                'CpuQuota': 0,
+                'CpuRealtimePeriod': 0,
+                'CpuRealtimeRuntime': 0,
+                'CpusetCpus': '',
+                'CpusetMems': '',
+                'Devices': [],
+                'DeviceCgroupRules': None,
+                'DeviceRequests': None,
+                'MemoryReservation': 0,
+                'MemorySwap': 0,
+                'MemorySwappiness': None,
+                'OomKillDisable': None,
+                'PidsLimit': None,
+                'Ulimits': None,
+                'CpuCount': 0,
+                'CpuPercent': 0,
+                'IOMaximumIOps': 0,
+                'IOMaximumBandwidth': 0,
+                'MaskedPaths': ['/proc/asound', '/proc/acpi', '/proc/kcore', '/proc/keys',
+                                '/proc/latency_stats', '/proc/timer_list', '/proc/timer_stats',
+                                '/proc/sched_debug', '/proc/scsi', '/sys/firmware'],
+                'ReadonlyPaths': ['/proc/bus', '/proc/fs', '/proc/irq', '/proc/sys', '/proc/sysrq-trigger'],
+            },
+            'GraphDriver': {
+                'Name': 'overlay2',
+                'Data': {
+                    'LowerDir': f"/var/lib/docker/overlay2/{container_id}-init/diff",
+                    'MergedDir': f"/var/lib/docker/overlay2/{container_id}/merged",
+                    'UpperDir': f"/var/lib/docker/overlay2/{container_id}/diff",
+                    'WorkDir': f"/var/lib/docker/overlay2/{container_id}/work",
+                },
+            },
+            'Mounts': [],
+            'Config': {
+                'Hostname': container_id[:12],
+                'Domainname': '',
+                'User': '',
+                'AttachStdin': False,
+                'AttachStdout': True,
+                'AttachStderr': True,
+                'Tty': tty,
+                'OpenStdin': False,
+                'StdinOnce': False,
+                'Env': ['PATH=/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin'],
+                'Cmd': cmd,
+                'Image': image,
+                'Volumes': None,
+                'WorkingDir': '',
+                'Entrypoint': None,
+                'OnBuild': None,
+                'Labels': {'com.example.index': str(self._counter)},
+            },
+            'NetworkSettings': {
+                'Bridge': '',
+                'SandboxID': fake_id('sandbox', self._counter),
+                'HairpinMode': False,
+                'LinkLocalIPv6Address': '',
+                'LinkLocalIPv6PrefixLen': 0,
+                'Ports': {},
+                'SandboxKey': f"/var/run/docker/netns/{container_id[:12]}",
+                'SecondaryIPAddresses': None,
+                'SecondaryIPv6Addresses': None,
+                'EndpointID': fake_id('endpoint', self._counter),
+                'Gateway': '172.17.0.1',
+                'GlobalIPv6Address': '',
+                'GlobalIPv6PrefixLen': 0,
+                'IPAddress': f"172.17.{self._counter // 250}.{self._counter % 250 + 2}",
+                'IPPrefixLen': 16,
+                'IPv6Gateway': '',
+                'MacAddress': '02:42:ac:11:00:02',
+                'Networks': {
+                    'bridge': {
+                        'IPAMConfig': None,
+                        'Links': None,
+                        'Aliases': None,
+                        'NetworkID': fake_id('network', 0),
+                        'EndpointID': fake_id('endpoint', self._counter),
+                        'Gateway': '172.17.0.1',
+                        'IPAddress': f"172.17.{self._counter // 250}.{self._counter % 250 + 2}",
+                        'IPPrefixLen': 16,
+                        'IPv6Gateway': '',
+                        'GlobalIPv6Address': '',
+                        'GlobalIPv6PrefixLen': 0,
+                        'MacAddress': '02:42:ac:11:00:02',
+                        'DriverOpts': None,
+                    }
+                },
+            },
+        }
+        self._register('container', self._containers, container_id, name, container)
+        return container
+
+    def container(self, ref: str) -> Optional[Dict[str, Any]]:
+        return self._lookup('container', self._containers, ref)
+
+    def emit(self, type: str, action: str, actor_id: str, **attributes):
+        """
+        Publishes an event to every open /events stream
+        """
+
+        now = time.time_ns()
+        event = {
+            'Type': type,
+            'Action': action,
+            'Actor': {'ID': actor_id, 'Attributes': attributes},
+            'scope': 'local',
+            'time': now // 10**9,
+            'timeNano': now,
+        }
+
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    # HTTP plumbing
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError:
+            return None
+
+        request_line, *header_lines = head.decode('latin-1').split('\r\n')
+        method, target, _ = request_line.split(' ', 2)
+        headers = {}
+        for line in header_lines:
+            if line:
+                key, _, value = line.partition(':')
+                headers[key.strip().lower()] = value.strip()
+
+        url = urlsplit(target)
+        return Request(
+            method=method,
+            path=_VERSION_PREFIX.sub('', url.path),
+            query=parse_qs(url.query, keep_blank_values=True),
+            headers=headers,
+            reader=reader
+        )
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                reply = Reply(writer)
+                await self._dispatch(request, reply)
+
+                # drain whatever the handler didn't consume so the next request parses
+                async for _ in request.iter_body():
+                    pass
+
+                if not reply.keep_alive or request.headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, request: Request, reply: Reply):
+        path_matched = False
+        for method, pattern, handler in self._routes:
+            match = pattern.match(request.path)
+            if match is None:
+                continue
+            path_matched = True
+            if method == request.method:
+                return await handler(request, reply, **match.groupdict())
+
+        if path_matched:
+            return await reply.error(405, f"method {request.method} not allowed")
+        await reply.error(404, f"page not found: {request.path}")
+
+    # System
+
+    async def ping(self, request: Request, reply: Reply):
+        await reply.send(body=b'' if request.method == 'HEAD' else b'OK')
+
+    async def version(self, request: Request, reply: Reply):
+        await reply.send_json({
+            'Platform': {'Name': 'Docker Engine - Community'},
+            'Version': '24.0.7',
+            'ApiVersion': API_VERSION,
+            'MinAPIVersion': '1.12',
+            'GitCommit': '311b9ff',
+            'GoVersion': 'go1.20.10',
+            'Os': 'linux',
+            'Arch': 'amd64',
+            'KernelVersion': '6.1.0',
+            'BuildTime': '2023-10-26T09:07:41.000000000+00:00',
+        })
+
+    async def info(self, request: Request, reply: Reply):
+        running = sum(1 for c in self._containers.values() if c['State']['Running'])
+        await reply.send_json({
+            'ID': fake_id('engine', 0),
+            'Containers': len(self._containers),
+            'ContainersRunning': running,
+            'ContainersPaused': 0,
+            'ContainersStopped': len(self._containers) - running,
+            'Images': len(self._images),
+            'Driver': 'overlay2',
+            'OSType': 'linux',
+            'Architecture': 'x86_64',
+            'NCPU': 4,
+            'MemTotal': 8 * 1024**3,
+            'Name': 'fake-engine',
+            'ServerVersion': '24.0.7',
+        })
+
+    async def events(self, request: Request, reply: Reply):
+        """
+        Sends event_burst container events, then live events from emit() until the client
+        disconnects. Streams with an until parameter end after the burst.
+        """
+
+        await reply.start_stream()
+        for n in range(self.event_burst):
+            container_id = fake_id('container', n % max(self._counter, 1) + 1)
+            now = time.time_ns()
+            await reply.write(json.dumps({
+                'Type': 'container',
+                'Action': 'exec_start: sh',
+                'Actor': {'ID': container_id, 'Attributes': {'name': f"container{n}", 'image': 'fake/image0:latest'}},
+                'scope': 'local',
+                'time': now // 10**9,
+                'timeNano': now,
+            }).encode() + b'\n')
+
+        if not request.param('until'):
+            queue = asyncio.Queue()
+            self._subscribers.append(queue)
+            try:
+                while (event := await queue.get()) is not None:
+                    await reply.write(json.dumps(event).encode() + b'\n')
+            finally:
+                self._subscribers.remove(queue)
+
+        await reply.end_stream()
+
+    # Containers
+
+    def _summary(self, container: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'Id': container['Id'],
+            'Names': [container['Name']],
+            'Image': container['Config']['Image'],
+            'ImageID': container['Image'],
+            'Command': ' '.join([container['Path'], *container['Args']]),
+            'Created': 1701424800,
+            'Ports': [],
+            'Labels': container['Config']['Labels'],
+            'State': container['State']['Status'],
+            'Status': 'Up 2 hours' if container['State']['Running'] else 'Created',
+            'HostConfig': {'NetworkMode': 'default'},
+            'NetworkSettings': {'Networks': container['NetworkSettings']['Networks']},
+            'Mounts': container['Mounts'],
+        }
+
+    async def container_list(self, request: Request, reply: Reply):
+        filters = request.filters()
+        show_all = request.flag('all')
+        limit = int(request.param('limit') or -1)
+
+        containers = []
+        for container in self._containers.values():
+            if not show_all and not container['State']['Running']:
+                continue
+            if 'id' in filters and not any(container['Id'].startswith(i) for i in filters['id']):
+                continue
+            if 'name' in filters and not any(n in container['Name'] for n in filters['name']):
+                continue
+            if 'status' in filters and container['State']['Status'] not in filters['status']:
+                continue
+            containers.append(self._summary(container))
+
+        await reply.send_json(containers[:limit] if limit > 0 else containers)
+
+    async def container_create(self, request: Request, reply: Reply):
+        config = await request.read_json() or {}
+        name = request.param('name') or f"fake_{self._counter + 1}"
+        container = self.add_container(
+            name, image=config.get('Image'), running=False,
+            tty=config.get('Tty', False), cmd=config.get('Cmd')
+        )
+        self.emit('container', 'create', container['Id'], name=name)
+        await reply.send_json({'Id': container['Id'], 'Warnings': []}, 201)
+
+    async def container_inspect(self, request: Request, reply: Reply, ref: str):
+        container = self.container(ref)
+        if container is None:
+            return await reply.error(404, f"No such container: {ref}")
+        await reply.send_json(container)
+
+    async def container_action(self, request: Request, reply: Reply, ref: str, action: str):
+        container = self.container(ref)
+        if container is None:
+            return await reply.error(404, f"No such container: {ref}")
+
+        state = container['State']
+        state['Running'] = action in ('start', 'restart', 'unpause')
+        state['Paused'] = action == 'pause'
+        state['Status'] = {'pause': 'paused', 'stop': 'exited', 'kill': 'exited'}.get(action, 'running')
+        self.emit('container', action, container['Id'], name=container['Name'].strip('/'))
+        await reply.send(204)
+
+    async def container_wait(self, request: Request, reply: Reply, ref: str):
+        container = self.container(ref)
+        if container is None:
+            return await reply.error(404, f"No such container: {ref}")
+
+        await asyncio.sleep(self.wait_delay)
+        await reply.send_json({'StatusCode': container['State']['ExitCode'], 'Error': None})
+
+    async def container_remove(self, request: Request, reply: Reply, ref: str):
+        container = self.container(ref)
+        if container is None:
+            return await reply.error(404, f"No such container: {ref}")
+
+        del self._containers[container['Id']]
+        for key in [k for k, v in self._refs.items() if v == container['Id']]:
+            del self._refs[key]
+        self.emit('container', 'destroy', container['Id'], name=container['Name'].strip('/'))
+        await reply.send(204)
+
+    async def container_logs(self, request: Request, reply: Reply, ref: str):
+        container = self.container(ref)
+        if container is None:
+            return await reply.error(404, f"No such container: {ref}")
+
+        tty = container['Config']['Tty']
+        streams = [s for s, name in ((1, 'stdout'), (2, 'stderr')) if request.flag(name)]
+        content_type = 'application/vnd.docker.raw-stream' if tty else 'application/vnd.docker.multiplexed-stream'
+
+        await reply.start_stream(content_type=content_type)
+        batch = []
+        for n in range(self.log_lines):
+            if not streams:
+                break
+            line = f"log line {n} from {container['Name'].strip('/')}\n".encode()
+            batch.append(line if tty else frame(streams[n % len(streams)], line))
+            if len(batch) == 256:
+                await reply.write(b''.join(batch))
+                batch.clear()
+        await reply.write(b''.join(batch))
+        await reply.end_stream()
+
+    def _stats(self, container: Dict[str, Any], n: int) -> Dict[str, Any]:
+        return {
+            'read': f"2023-12-01T10:00:{n % 60:02d}.000000000Z",
+            'preread': f"2023-12-01T10:00:{(n - 1) % 60:02d}.000000000Z",
+            'pids_stats': {'current': 4},
+            'num_procs': 0,
+            'cpu_stats': {
+                'cpu_usage': {'total_usage': 10_000_000 * n, 'usage_in_kernelmode': 1_000_000 * n,
+                              'usage_in_usermode': 9_000_000 * n},
+                'system_cpu_usage': 1_000_000_000 * n,
+                'online_cpus': 4,
+                'throttling_data': {'periods': 0, 'throttled_periods': 0, 'throttled_time': 0},
+            },
+            'precpu_stats': {
+                'cpu_usage': {'total_usage': 10_000_000 * max(n - 1, 0)},
+                'system_cpu_usage': 1_000_000_000 * max(n - 1, 0),
+                'online_cpus': 4,
+            },
+            'memory_stats': {'usage': 50 * 1024**2, 'limit': 8 * 1024**3,
+                             'stats': {'inactive_file': 1024**2}},
+            'networks': {'eth0': {'rx_bytes': 1000 * n, 'tx_bytes': 500 * n, 'rx_packets': n, 'tx_packets': n,
+                                  'rx_errors': 0, 'tx_errors': 0, 'rx_dropped': 0, 'tx_dropped': 0}},
+            'blkio_stats': {'io_service_bytes_recursive': [
+                {'major': 8, 'minor': 0, 'op': 'read', 'value': 4096 * n},
+                {'major': 8, 'minor': 0, 'op': 'write', 'value': 8192 * n},
+            ]},
+            'name': container['Name'],
+            'id': container['Id'],
+        }
+
+    async def container_stats(self, request: Request, reply: Reply, ref: str):
+        container = self.container(ref)
+        if container is None:
+            return await reply.error(404, f"No such container: {ref}")
+
+        if not request.flag('stream', True):
+            return await reply.send_json(self._stats(container, 1))
+
+        await reply.start_stream()
+        for n in range(1, self.stats_samples + 1):
+            await reply.write(json.dumps(self._stats(container, n)).encode() + b'\n')
+            if self.stats_interval:
+                await asyncio.sleep(self.stats_interval)
+        await reply.end_stream()
+
+    # Archives
+
+    def filesystem(self, container: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        The container's files by absolute path, created on first use. Files hold their data,
+        or None for synthetic content (archive_size bytes of a repeating pattern) that is
+        generated while streaming instead of being kept in memory.
+        """
+
+        fs = self._filesystems.get(container['Id'])
+        if fs is None:
+            directory = {'type': 'dir', 'mode': 0o755, 'mtime': 1701424800}
+            fs = self._filesystems[container['Id']] = {
+                '/': dict(directory),
+                '/etc': dict(directory),
+                '/etc/hostname': self._file(container['Id'][:12].encode() + b'\n'),
+                '/etc/os-release': {'type': 'symlink', 'mode': 0o777, 'mtime': 1701424800, 'target': '../usr/lib/os-release'},
+                '/usr': dict(directory),
+                '/usr/lib': dict(directory),
+                '/usr/lib/os-release': self._file(b'NAME="Fake Linux"\nID=fake\nVERSION_ID=1.0\n'),
+                '/data': dict(directory),
+                '/data/blob': {'type': 'file', 'mode': 0o644, 'mtime': 1701424800, 'data': None, 'size': self.archive_size},
+            }
+        return fs
+
+    @staticmethod
+    def _file(data: bytes, mode: int = 0o644, mtime: int = 1701424800) -> Dict[str, Any]:
+        return {'type': 'file', 'mode': mode, 'mtime': mtime, 'data': data, 'size': len(data)}
+
+    @staticmethod
+    def _file_chunks(entry: Dict[str, Any], chunk_size: int = 1024 * 1024):
+        if entry['data'] is not None:
+            yield entry['data']
+            return
+
+        pattern = bytes(range(256)) * (chunk_size // 256)
+        for offset in range(0, entry['size'], chunk_size):
+            yield pattern[:min(chunk_size, entry['size'] - offset)]
+
+    async def stream_tar(self, reply: Reply, entries: List[Tuple[str, Dict[str, Any]]]):
+        """
+        Streams a tar archive of (name, entry) pairs without building it in memory
+        """
+
+        for name, entry in entries:
+            info = tarfile.TarInfo(name)
+            info.mode = entry['mode']
+            info.mtime = entry['mtime']
+            if entry['type'] == 'dir':
+                info.type = tarfile.DIRTYPE
+            elif entry['type'] == 'symlink':
+                info.type = tarfile.SYMTYPE
+                info.linkname = entry['target']
+            else:
+                info.size = entry['size']
+            await reply.write(info.tobuf(tarfile.PAX_FORMAT))
+
+            if entry['type'] == 'file':
+                for chunk in self._file_chunks(entry):
+                    await reply.write(chunk)
+                await reply.write(b'\0' * (-entry['size'] % tarfile.BLOCKSIZE))
+
+        await reply.write(b'\0' * tarfile.BLOCKSIZE * 2)
+
+    def _path_stat(self, path: str, entry: Dict[str, Any]) -> str:
+        return base64.b64encode(json.dumps({
+            'name': posixpath.basename(path) or '/',
+            'size': entry.get('size', 4096),
+            'mode': entry['mode'] | {'dir': MODE_DIR, 'symlink': MODE_SYMLINK}.get(entry['type'], 0),
+            'mtime': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(entry['mtime'])),
+            # like the daemon, the target is resolved to an absolute path
+            'linkTarget': posixpath.normpath(posixpath.join(posixpath.dirname(path), entry['target']))
+            if entry['type'] == 'symlink' else '',
+        }).encode()).decode()
+
+    async def archive_get(self, request: Request, reply: Reply, ref: str):
+        container = self.container(ref)
+        if container is None:
+            return await reply.error(404, f"No such container: {ref}")
+
+        fs = self.filesystem(container)
+        path = posixpath.normpath(request.param('path') or '/')
+        entry = fs.get(path)
+        if entry is None:
+            return await reply.error(404, f"Could not find the file {path} in container {ref}")
+
+        headers = {'X-Docker-Container-Path-Stat': self._path_stat(path, entry)}
+        if request.method == 'HEAD':
+            return await reply.send(200, content_type='application/x-tar', headers=headers)
+
+        base = posixpath.basename(path)
+        prefix = path.rstrip('/') + '/'
+        entries = [(base or '.', entry)] + [
+            (posixpath.join(base, p[len(prefix):]), e) for p, e in sorted(fs.items()) if p.startswith(prefix)
+        ]
+        await reply.start_stream(content_type='application/x-tar', headers=headers)
+        await self.stream_tar(reply, entries)
+        await reply.end_stream()
+
+    async def archive_put(self, request: Request, reply: Reply, ref: str):
+        container = self.container(ref)
+        if container is None:
+            return await reply.error(404, f"No such container: {ref}")
+
+        fs = self.filesystem(container)
+        path = posixpath.normpath(request.param('path') or '/')
+        if fs.get(path, {}).get('type') != 'dir':
+            return await reply.error(404, f"Could not find the file {path} in container {ref}")
+
+        # archives over archive_buffer_limit are only drained, to benchmark large uploads
+        body, size = io.BytesIO(), 0
+        async for chunk in request.iter_body():
+            size += len(chunk)
+            if size <= self.archive_buffer_limit:
+                body.write(chunk)
+
+        if size <= self.archive_buffer_limit:
+            body.seek(0)
+            with tarfile.open(fileobj=body, mode='r:') as tar:
+                for member in tar:
+                    target = posixpath.normpath(posixpath.join(path, member.name))
+                    if member.isdir():
+                        fs[target] = {'type': 'dir', 'mode': member.mode, 'mtime': int(member.mtime)}
+                    elif member.issym():
+                        fs[target] = {'type': 'symlink', 'mode': 0o777, 'mtime': int(member.mtime), 'target': member.linkname}
+                    elif member.isfile():
+                        fs[target] = self._file(tar.extractfile(member).read(), member.mode, int(member.mtime))
+
+        await reply.send(200)
+
+    async def container_export(self, request: Request, reply: Reply, ref: str):
+        container = self.container(ref)
+        if container is None:
+            return await reply.error(404, f"No such container: {ref}")
+
+        entries = [(path.lstrip('/'), entry) for path, entry in sorted(self.filesystem(container).items()) if path != '/']
+        await reply.start_stream(content_type='application/x-tar')
+        await self.stream_tar(reply, entries)
+        await reply.end_stream()
+
+    # Exec
+
+    async def exec_create(self, request: Request, reply: Reply, ref: str):
+        container = self.container(ref)
+        if container is None:
+            return await reply.error(404, f"No such container: {ref}")
+
+        config = await request.read_json() or {}
+        exec_id = fake_id('exec', len(self._execs))
+        self._execs[exec_id] = {
+            'ID': exec_id,
+            'Running': False,
+            'ExitCode': None,
+            'ProcessConfig': {'tty': config.get('Tty', False), 'entrypoint': (config.get('Cmd') or [''])[0],
+                              'arguments': (config.get('Cmd') or [''])[1:], 'privileged': False},
+            'OpenStdin': config.get('AttachStdin', False),
+            'OpenStderr': config.get('AttachStderr', True),
+            'OpenStdout': config.get('AttachStdout', True),
+            'CanRemove': False,
+            'ContainerID': container['Id'],
+            'DetachKeys': '',
+            'Pid': 0,
+        }
+        await reply.send_json({'Id': exec_id}, 201)
+
+    def exec_frames(self, exec_obj: Dict[str, Any]) -> List[bytes]:
+        """
+        Output of an exec: exec_output bytes split in frames of at most 32KiB, on stdout
+        (and a short line on stderr when it is attached)
+        """
+
+        tty = exec_obj['ProcessConfig']['tty']
+        payload = (b'hello world\n' * (self.exec_output // 12 + 1))[:self.exec_output]
+        chunks = [payload[i:i + 32 * 1024] for i in range(0, len(payload), 32 * 1024)]
+        if tty:
+            return chunks
+
+        frames = [frame(1, chunk) for chunk in chunks] if exec_obj['OpenStdout'] else []
+        if exec_obj['OpenStderr']:
+            frames.append(frame(2, b'done\n'))
+        return frames
+
+    async def exec_start(self, request: Request, reply: Reply, ref: str):
+        exec_obj = self._execs.get(ref)
+        if exec_obj is None:
+            return await reply.error(404, f"No such exec instance: {ref}")
+
+        config = await request.read_json() or {}
+        if config.get('Detach'):
+            exec_obj['ExitCode'] = self.exit_code
+            return await reply.send(200)
+
+        tty = exec_obj['ProcessConfig']['tty']
+        await reply.upgrade('application/vnd.docker.raw-stream' if tty else 'application/vnd.docker.multiplexed-stream')
+        if exec_obj['OpenStdin']:
+            # behaves like cat: stdin is echoed to stdout until it is closed
+            while chunk := await request.reader.read(64 * 1024):
+                reply.writer.write(chunk if tty else frame(1, chunk))
+                await reply.writer.drain()
+        else:
+            for data in self.exec_frames(exec_obj):
+                reply.writer.write(data)
+                await reply.writer.drain()
+
+        exec_obj['ExitCode'] = self.exit_code
+        reply.writer.write_eof()
+
+    async def exec_inspect(self, request: Request, reply: Reply, ref: str):
+        exec_obj = self._execs.get(ref)
+        if exec_obj is None:
+            return await reply.error(404, f"No such exec instance: {ref}")
+        await reply.send_json(exec_obj)
+
+    # Images, networks, volumes
+
+    async def image_list(self, request: Request, reply: Reply):
+        await reply.send_json([{
+            'Id': image['Id'],
+            'ParentId': '',
+            'RepoTags': image['RepoTags'],
+            'RepoDigests': image['RepoDigests'],
+            'Created': 1701424800,
+            'Size': image['Size'],
+            'SharedSize': -1,
+            'VirtualSize': image['VirtualSize'],
+            'Labels': {},
+            'Containers': -1,
+        } for image in self._images.values()])
+
+    async def image_pull(self, request: Request, reply: Reply):
+        """
+        Streams the progress of pulling pull_layers layers of pull_layer_size bytes, in
+        pull_steps steps pull_delay seconds apart, then adds the image. Repositories named
+        broken fail halfway through, like a pull whose registry goes away.
+        """
+
+        self.pulls += 1
+        repository, tag = request.param('fromImage'), request.param('tag') or 'latest'
+        reference = f"{repository}{'@' if tag.startswith('sha256:') else ':'}{tag}"
+        layers = [fake_id(f"layer {reference}", n)[:12] for n in range(self.pull_layers)]
+        size = self.pull_layer_size
+
+        async def send(**message):
+            await reply.write(json.dumps(message).encode() + b'\r\n')
+
+        await reply.start_stream()
+        await send(status=f"Pulling from {repository}", id=tag)
+        for layer in layers:
+            await send(status='Pulling fs layer', progressDetail={}, id=layer)
+
+        for step in range(1, self.pull_steps + 1):
+            await asyncio.sleep(self.pull_delay)
+            if repository.endswith('broken') and step > self.pull_steps // 2:
+                message = f"Get \"https://registry.fake/v2/{repository}/blobs/{layers[0]}\": connection reset by peer"
+                await send(errorDetail={'message': message}, error=message)
+                return await reply.end_stream()
+            for layer in layers:
+                current = size * step // self.pull_steps
+                await send(status='Downloading', progressDetail={'current': current, 'total': size},
+                           progress=f"{current}B/{size}B", id=layer)
+
+        for layer in layers:
+            await send(status='Download complete', progressDetail={}, id=layer)
+            await send(status='Extracting', progressDetail={'current': size, 'total': size}, id=layer)
+            await send(status='Pull complete', progressDetail={}, id=layer)
+
+        if self._lookup('image', self._images, reference) is None:
+            self.add_image(reference)
+        await send(status=f"Digest: sha256:{fake_id('digest ' + reference, 0)}")
+        await send(status=f"Status: Downloaded newer image for {reference}")
+        await reply.end_stream()
+
+    async def image_build(self, request: Request, reply: Reply):
+        """
+        Reads the build context as it arrives (recording its file names and size in
+        build_contexts), echoes the steps of its Dockerfile and adds the image
+        """
+
+        dockerfile_name = request.param('dockerfile') or 'Dockerfile'
+        decompressor = zlib.decompressobj(wbits=31) if request.headers.get('content-encoding') == 'gzip' else None
+        parser, names, dockerfile, size = TarParser(), [], [], 0
+        async for chunk in request.iter_body():
+            size += len(chunk)
+            for info, data in parser.feed(decompressor.decompress(chunk) if decompressor else chunk):
+                if not data:
+                    names.append(info.name)
+                elif info.name == dockerfile_name:
+                    dockerfile.append(bytes(data))
+        self.build_contexts.append({'names': names, 'size': size, 'encoding': request.headers.get('content-encoding')})
+
+        await reply.start_stream()
+        if dockerfile_name not in names:
+            message = f"Cannot locate specified Dockerfile: {dockerfile_name}"
+            await reply.write(json.dumps({'errorDetail': {'message': message}, 'error': message}).encode() + b'\r\n')
+            return await reply.end_stream()
+
+        steps = [line.strip() for line in b''.join(dockerfile).decode().splitlines()
+                 if line.strip() and not line.strip().startswith('#')]
+        for n, step in enumerate(steps):
+            await reply.write(json.dumps({'stream': f"Step {n + 1}/{len(steps)} : {step}\n"}).encode() + b'\r\n')
+            await reply.write(json.dumps({'stream': f" ---> {fake_id('step', n)[:12]}\n"}).encode() + b'\r\n')
+
+        image = self.add_image(request.param('t') or f"fake/build{len(self.build_contexts)}:latest")
+        await reply.write(json.dumps({'aux': {'ID': image['Id']}}).encode() + b'\r\n')
+        await reply.write(json.dumps({'stream': f"Successfully built {image['Id'][7:19]}\n"}).encode() + b'\r\n')
+        await reply.end_stream()
+
+    async def image_save(self, request: Request, reply: Reply, ref: str = None):
+        """
+        Streams a docker save tarball of the images, each layer (of archive_size bytes) once
+        """
+
+        images = []
+        for name in [ref] if ref else request.query.get('names', []):
+            image = self._lookup('image', self._images, name)
+            if image is None:
+                return await reply.error(404, f"reference does not exist: {name}")
+            images.append((name, image))
+
+        manifest, layers = [], {}
+        for name, image in images:
+            image_layers = [f"{layer[7:]}/layer.tar" for layer in image['RootFS']['Layers']]
+            layers.update(dict.fromkeys(image_layers))
+            manifest.append({'Config': f"{image['Id'][7:]}.json", 'Layers': image_layers,
+                             'RepoTags': [name] if name in image['RepoTags'] else None})
+
+        mtime = {'mode': 0o644, 'mtime': 1701424800}
+        entries = [(layer, {'type': 'file', 'data': None, 'size': self.archive_size, **mtime}) for layer in layers]
+        entries += [(f"{image['Id'][7:]}.json", self._file(json.dumps(image).encode())) for _, image in images]
+        entries.append(('manifest.json', self._file(json.dumps(manifest).encode())))
+        await reply.start_stream(content_type='application/x-tar')
+        await self.stream_tar(reply, entries)
+        await reply.end_stream()
+
+    async def image_load(self, request: Request, reply: Reply):
+        """
+        Reads a docker save tarball as it arrives, reporting a progress message per layer,
+        and adds the images of its manifest
+        """
+
+        parser, manifest, layers = TarParser(), [], {}
+        async for chunk in request.iter_body():
+            for info, data in parser.feed(chunk):
+                if info.name == 'manifest.json':
+                    manifest.append(bytes(data))
+                elif info.name.endswith('/layer.tar'):
+                    layers[info.name] = layers.get(info.name, 0) + len(data)
+
+        await reply.start_stream()
+        try:
+            manifest = json.loads(b''.join(manifest))
+        except ValueError:
+            message = "open /var/lib/docker/tmp/docker-import/manifest.json: no such file or directory"
+            await reply.write(json.dumps({'errorDetail': {'message': message}, 'error': message}).encode() + b'\r\n')
+            return await reply.end_stream()
+
+        quiet = request.flag('quiet')
+        for layer, size in layers.items():
+            if not quiet:
+                await reply.write(json.dumps({
+                    'status': 'Loading layer', 'id': layer.split('/')[0][:12],
+                    'progressDetail': {'current': size, 'total': size}
+                }).encode() + b'\r\n')
+
+        for entry in manifest:
+            for tag in entry.get('RepoTags') or []:
+                if self._lookup('image', self._images, tag) is None:
+                    self.add_image(tag)
+                await reply.write(json.dumps({'stream': f"Loaded image: {tag}\n"}).encode() + b'\r\n')
+            if not entry.get('RepoTags'):
+                image = self._lookup('image', self._images, entry['Config'].removesuffix('.json')) \
+                    or self.add_image(f"fake/loaded{len(self._images)}:latest")
+                await reply.write(json.dumps({'stream': f"Loaded image ID: {image['Id']}\n"}).encode() + b'\r\n')
+        await reply.end_stream()
+
+    async def image_inspect(self, request: Request, reply: Reply, ref: str):
+        image = self._lookup('image', self._images, ref)
+        if image is None:
+            return await reply.error(404, f"No such image: {ref}")
+        await reply.send_json(image)
+
+    async def network_list(self, request: Request, reply: Reply):
+        await reply.send_json(list(self._networks.values()))
+
+    async def network_inspect(self, request: Request, reply: Reply, ref: str):
+        network = self._lookup('network', self._networks, ref)
+        if network is None:
+            return await reply.error(404, f"network {ref} not found")
+        await reply.send_json(network)
+
+    async def volume_list(self, request: Request, reply: Reply):
+        await reply.send_json({'Volumes': list(self._volumes.values()), 'Warnings': []})
+
+    async def volume_inspect(self, request: Request, reply: Reply, ref: str):
+        volume = self._volumes.get(ref)
+        if volume is None:
+            return await reply.error(404, f"get {ref}: no such volume")
+        await reply.send_json(volume)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Docker Engine API on a Unix socket")
+    parser.add_argument('--socket', required=True, help="path of the Unix socket to listen on")
+    for field in ('containers', 'images', 'networks', 'volumes', 'log_lines', 'exec_output',
+                  'stats_samples', 'event_burst', 'archive_size', 'archive_buffer_limit', 'pull_layers',
+                  'pull_layer_size', 'pull_steps'):
+        parser.add_argument(f"--{field.replace('_', '-')}", type=int, default=FakeEngine.model_fields[field].default)
+    for field in ('latency', 'stats_interval', 'wait_delay', 'pull_delay'):
+        parser.add_argument(f"--{field.replace('_', '-')}", type=float, default=FakeEngine.model_fields[field].default)
+    parser.add_argument('--tty', action='store_true')
+    args = vars(parser.parse_args())
+
+    engine = FakeEngine(socket_path=args.pop('socket'), **args)
+    try:
+        asyncio.run(engine.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+TLS for tcp:// daemons, with the client certificates of DOCKER_CERT_PATH.
+
+Contexts are built once per (cert path, verify) and shared by every client and
+connection using them, so certificates are loaded and parsed once. They also keep the
+last TLS session of each daemon (host and port) and offer it on the next connection to
+that daemon: a resumed handshake skips the certificate exchange and verification that
+dominate the cost of a connection to a daemon.
+
+https://docs.docker.com/engine/security/protect-access/#use-tls-https-to-protect-the-docker-daemon-socket
+"""
+
+import ssl
+import httpx
+import certifi
+from collections import OrderedDict
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Tuple
+
+# daemons whose last session is kept by a context, least recently used ones are dropped
+TLS_SESSION_CACHE_SIZE = 1024
+
+# port of the daemon connections are being opened to, set by the TLS transports around
+# each request: SSLContext.wrap_bio and wrap_socket are only given the host name
+_daemon_port: ContextVar[Optional[int]] = ContextVar('daemon_port', default=None)
+
+
+class _SessionRecorder:
+    # records the session of a connection once it can be resumed: right after the handshake
+    # for TLS 1.2, after the session tickets sent following a TLS 1.3 handshake were read
+    _recorded = False
+    _session_key: Optional[Tuple[str, Optional[int]]] = None
+
+    def do_handshake(self, *args):
+        # the port is only known while the connection is opened, not once tickets are read
+        if self.server_hostname:
+            self._session_key = (self.server_hostname, _daemon_port.get())
+        super().do_handshake(*args)
+        self.context.handshake_done(self)
+
+    def read(self, *args):
+        data = super().read(*args)
+        if not self._recorded:
+            self.context.record_session(self)
+        return data
+
+
+class _SSLObject(_SessionRecorder, ssl.SSLObject):
+    pass
+
+
+class _SSLSocket(_SessionRecorder, ssl.SSLSocket):
+    pass
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """
+    Client SSLContext resuming the last session of a daemon on new connections to it. Works
+    for asyncio and anyio streams (wrap_bio) as well as for blocking sockets (wrap_socket).
+    Sessions are keyed by (host name, port), the port being the one of the request sent
+    through AsyncTlsTransport or TlsTransport (None when it is the scheme's default).
+    """
+
+    sslobject_class = _SSLObject
+    sslsocket_class = _SSLSocket
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.sessions: "OrderedDict[Tuple[str, Optional[int]], ssl.SSLSession]" = OrderedDict()
+        self.handshakes = 0
+        self.resumed = 0
+
+    def _session(self, server_side: bool, server_hostname: Optional[str | bytes],
+                 session: Optional[ssl.SSLSession]) -> Optional[ssl.SSLSession]:
+        if session is not None or server_side or not server_hostname:
+            return session
+        # anyio passes IDNA encoded host names
+        if isinstance(server_hostname, bytes):
+            server_hostname = server_hostname.decode('ascii')
+        return self.sessions.get((server_hostname, _daemon_port.get()))
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        return super().wrap_bio(incoming, outgoing, server_side=server_side, server_hostname=server_hostname,
+                                session=self._session(server_side, server_hostname, session))
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True, suppress_ragged_eofs=True,
+                    server_hostname=None, session=None):
+        return super().wrap_socket(sock, server_side=server_side, do_handshake_on_connect=do_handshake_on_connect,
+                                   suppress_ragged_eofs=suppress_ragged_eofs, server_hostname=server_hostname,
+                                   session=self._session(server_side, server_hostname, session))
+
+    def handshake_done(self, connection: _SessionRecorder):
+        self.handshakes += 1
+        if connection.session_reused:
+            self.resumed += 1
+        self.record_session(connection)
+
+    def record_session(self, connection: _SessionRecorder):
+        if connection.server_side or connection._session_key is None:
+            connection._recorded = True
+            return
+
+        session = connection.session
+        if session is None or (connection.version() == 'TLSv1.3' and not session.has_ticket):
+            return
+
+        connection._recorded = True
+        self.sessions[connection._session_key] = session
+        self.sessions.move_to_end(connection._session_key)
+        if len(self.sessions) > TLS_SESSION_CACHE_SIZE:
+            self.sessions.popitem(last=False)
+
+
+class AsyncTlsTransport(httpx.AsyncHTTPTransport):
+    """
+    httpx transport letting the ResumingSSLContext of the connections it opens know the
+    port of the daemon they go to
+    """
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        token = _daemon_port.set(request.url.port)
+        try:
+            return await super().handle_async_request(request)
+        finally:
+            _daemon_port.reset(token)
+
+
+class TlsTransport(httpx.HTTPTransport):
+    """
+    AsyncTlsTransport for the synchronous client
+    """
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        token = _daemon_port.set(request.url.port)
+        try:
+            return super().handle_request(request)
+        finally:
+            _daemon_port.reset(token)
+
+
+@lru_cache(maxsize=None)
+def tls_context(cert_path: Optional[Path] = None, verify: bool = True) -> ResumingSSLContext:
+    """
+    The shared client context for a DOCKER_CERT_PATH directory: its cert.pem and key.pem
+    as the client certificate when present, and its ca.pem (else the certifi bundle) to
+    verify daemons when verify is set
+    """
+
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    if verify:
+        ca = cert_path / 'ca.pem' if cert_path else None
+        context.load_verify_locations(ca if ca is not None and ca.exists() else certifi.where())
+    else:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+
+    if cert_path and (cert_path / 'cert.pem').exists() and (cert_path / 'key.pem').exists():
+        context.load_cert_chain(cert_path / 'cert.pem', cert_path / 'key.pem')
+    return context
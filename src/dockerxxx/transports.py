@@ -1,10 +1,16 @@
 import httpx
+import httpcore
 import structlog
-import asyncssh
-import secrets
-from typing import Optional
-from pydantic import ConfigDict, BaseModel, field_validator, model_validator, AnyUrl, Field
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterable, Literal, Optional, Tuple, Type, TypeVar
+from pydantic import ConfigDict, BaseModel, TypeAdapter, ValidationError, field_validator, model_validator, AnyUrl, Field
 from pydantic_core.core_schema import ValidationInfo
+from .tls import AsyncTlsTransport, TlsTransport, tls_context
+from .pool import Lane, PoolSettings, PoolStats, MeteredTransport, MeteredSyncTransport
+from .uds import UdsClient
+from .sync import SyncIterator
 
 def no_op_processor(logger, method_name, event_dict):
     raise structlog.DropEvent
@@ -13,56 +19,362 @@ def no_op_processor(logger, method_name, event_dict):
 structlog.configure(processors=[no_op_processor])
 log = structlog.get_logger()
 
-async def raise_on_4xx_5xx(response):
+def check_status(response):
     if response.status_code != 101:
         response.raise_for_status()
 
+async def raise_on_4xx_5xx(response):
+    check_status(response)
+
+def request_body(request) -> bytes | str:
+    try:
+        return request.content
+    except httpx.RequestNotRead:
+        return "<streamed>"
+
+def log_request_sync(request):
+    log.debug(f"-> {request.url}", method=request.method, body=request_body(request))
+
+def log_response_sync(response):
+    log.debug(f"<- {response.url}", status=response.status_code, headers=dict(response.headers))
+
 async def log_request(request):
-    await log.adebug(f"-> {request.url}", method=request.method, body=request.content)
+    await log.adebug(f"-> {request.url}", method=request.method, body=request_body(request))
 
 async def log_response(response):
     await log.adebug(f"<- {response.url}", status=response.status_code, headers=dict(response.headers))
 
+def event_hooks(sync: bool = False):
+    if sync:
+        return {
+            'request': [log_request_sync],
+            'response': [check_status, log_response_sync]
+        }
+
+    return {
+        'request': [log_request],
+        'response': [raise_on_4xx_5xx, log_response]
+    }
+
+# 'json' parses response bodies straight into models with pydantic-core, 'validate'
+# decodes them with json first and validates the result (slower, logs failing payloads)
+DecodeMode = Literal['json', 'validate']
+
+# 'httpx' sends requests through httpx, 'lean' through dockerxxx.uds' HTTP/1.1 client on
+# asyncio streams (unix:// URLs of AsyncDocker only)
+HttpMode = Literal['httpx', 'lean']
+
+T = TypeVar('T')
+
+def _lane_stats(info: ValidationInfo, lane: Lane) -> Optional[PoolStats]:
+    return {'api': info.data['stats'], 'stream': info.data['stream_stats']}.get(lane)
+
+
+def async_client(transport: httpx.AsyncBaseTransport, base_url: str, info: ValidationInfo,
+                 lane: Lane = 'api') -> httpx.AsyncClient:
+    """
+    The httpx client of a lane of a transport model being validated, with the lane's
+    timeouts, and its requests counted in the lane's pool stats (but for hijacks)
+    """
+
+    stats = _lane_stats(info, lane)
+    return httpx.AsyncClient(transport=MeteredTransport(transport, stats) if stats is not None else transport,
+                             base_url=base_url,
+                             timeout=info.data['pool'].timeout(info.data['timeout'], lane),
+                             event_hooks=event_hooks())
+
+
+def sync_client(transport: httpx.BaseTransport, base_url: str, info: ValidationInfo,
+                lane: Lane = 'api') -> "SyncClientAdapter":
+    stats = _lane_stats(info, lane)
+    return SyncClientAdapter(httpx.Client(transport=MeteredSyncTransport(transport, stats) if stats is not None else transport,
+                                          base_url=base_url,
+                                          timeout=info.data['pool'].timeout(info.data['timeout'], lane),
+                                          event_hooks=event_hooks(sync=True)))
+
+
+def uds_client(info: ValidationInfo, lane: Lane = 'api') -> UdsClient:
+    """
+    async_client for AsyncLeanUnixSocketTransport
+    """
+
+    pool = info.data['pool']
+    return UdsClient(info.data['url'].path,
+                     limits=HIJACK_LIMITS if lane == 'hijack' else pool.limits(lane),
+                     timeout=pool.timeout(info.data['timeout'], lane),
+                     retries=0 if lane == 'hijack' else pool.retries,
+                     stats=_lane_stats(info, lane))
+
+
+@lru_cache(maxsize=None)
+def type_adapter(tp) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+class SyncNetworkStream:
+    """
+    Async interface over the blocking network stream of a hijacked sync connection
+    """
+
+    def __init__(self, stream: httpcore.NetworkStream):
+        self.stream = stream
+
+    async def read(self, max_bytes: int, timeout: Optional[float] = None) -> bytes:
+        return self.stream.read(max_bytes, timeout)
+
+    async def write(self, buffer: bytes, timeout: Optional[float] = None):
+        self.stream.write(buffer, timeout)
+
+    async def aclose(self):
+        self.stream.close()
+
+    def get_extra_info(self, info: str) -> Any:
+        return self.stream.get_extra_info(info)
+
+
+class SyncResponse:
+    """
+    Streamed httpx.Response of a SyncClientAdapter, readable with the async methods
+    """
+
+    def __init__(self, response: httpx.Response):
+        self.response = response
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.response, name)
+
+    @property
+    def extensions(self):
+        extensions = dict(self.response.extensions)
+        if 'network_stream' in extensions:
+            extensions['network_stream'] = SyncNetworkStream(extensions['network_stream'])
+        return extensions
+
+    async def aread(self) -> bytes:
+        return self.response.read()
+
+    async def aiter_raw(self, chunk_size: Optional[int] = None):
+        for chunk in self.response.iter_raw(chunk_size):
+            yield chunk
+
+    async def aiter_bytes(self, chunk_size: Optional[int] = None):
+        for chunk in self.response.iter_bytes(chunk_size):
+            yield chunk
+
+    async def aiter_text(self, chunk_size: Optional[int] = None):
+        for chunk in self.response.iter_text(chunk_size):
+            yield chunk
+
+    async def aiter_lines(self):
+        for line in self.response.iter_lines():
+            yield line
+
+    async def aclose(self):
+        self.response.close()
+
+
+class SyncClientAdapter:
+    """
+    Exposes a pooled httpx.Client through the part of the httpx.AsyncClient interface
+    the API code uses. Its coroutines block instead of suspending, so the synchronous
+    client can run the same API code without an event loop (see dockerxxx.sync).
+    """
+
+    def __init__(self, client: httpx.Client):
+        self.client = client
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    def build_request(self, method: str, url: str, **kwargs) -> httpx.Request:
+        return self.client.build_request(method, url, **self._sync_content(kwargs))
+
+    async def send(self, request: httpx.Request, stream: bool = False, **kwargs) -> httpx.Response | SyncResponse:
+        response = self.client.send(request, stream=stream, **kwargs)
+        return SyncResponse(response) if stream else response
+
+    @staticmethod
+    def _sync_content(kwargs: dict) -> dict:
+        # streamed request bodies are async iterators that never suspend, iterate them blocking
+        if isinstance(kwargs.get('content'), AsyncIterable):
+            kwargs['content'] = SyncIterator(kwargs['content'])
+        return kwargs
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        return self.client.request(method, url, **self._sync_content(kwargs))
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def head(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("HEAD", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PUT", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs):
+        with self.client.stream(method, url, **self._sync_content(kwargs)) as response:
+            yield SyncResponse(response)
+
+    async def aclose(self):
+        self.client.close()
+
+
+# Hijacked connections are never handed back to a pool, so don't cap or keep them
+HIJACK_LIMITS = httpx.Limits(max_connections=None, max_keepalive_connections=0)
+
 
 class BaseTransport(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
     url: AnyUrl
     tls_verify: Optional[bool] = Field(True)
-    client: Optional[httpx.Client | httpx.AsyncClient] = Field(None, validate_default=True)
+    cert_path: Optional[Path] = None
+    decode_mode: DecodeMode = 'json'
+    timeout: Optional[float] = 5
+    pool: PoolSettings = Field(default_factory=PoolSettings)
+    stats: PoolStats = Field(default_factory=PoolStats)
+    stream_stats: PoolStats = Field(default_factory=PoolStats)
+    client: Optional[httpx.AsyncClient | SyncClientAdapter | UdsClient] = Field(None, validate_default=True)
+    stream_client: Optional[httpx.AsyncClient | SyncClientAdapter | UdsClient] = Field(None, validate_default=True)
+    hijack_client: Optional[httpx.AsyncClient | SyncClientAdapter | UdsClient] = Field(None, validate_default=True)
+
+    @property
+    def blocking(self) -> bool:
+        """
+        Whether requests block instead of suspending, as for the synchronous client
+        """
+
+        return isinstance(self.client, SyncClientAdapter)
+
+    @property
+    def pool_stats(self) -> PoolStats:
+        """
+        Snapshot of the stats of the API calls' pool, with its open and idle connections
+        """
+
+        return self.client._transport.snapshot()
+
+    @property
+    def stream_pool_stats(self) -> PoolStats:
+        """
+        pool_stats of the lane of long-lived calls
+        """
+
+        return self.stream_client._transport.snapshot()
+
+    def decode(self, tp: Type[T], response: httpx.Response) -> T:
+        """
+        Builds tp (a model, or any type pydantic can validate such as List[ContainerSummary])
+        from a response body according to decode_mode
+        """
+
+        validator = tp if isinstance(tp, type) and issubclass(tp, BaseModel) else type_adapter(tp)
+        if self.decode_mode == 'json':
+            return (validator.model_validate_json if validator is tp else validator.validate_json)(response.content)
+
+        data = response.json()
+        try:
+            return (validator.model_validate if validator is tp else validator.validate_python)(data)
+        except ValidationError as e:
+            log.debug("response failed validation", url=str(response.url), errors=e.errors(), data=data)
+            raise
+
+    async def hijack(self, method: str, url: str, **kwargs) -> Tuple[httpx.Response, httpcore.AsyncNetworkStream]:
+        """
+        Sends a request asking the daemon to upgrade the connection to a raw stream
+        (attach, exec start) and returns the response with the stream of the connection
+        that served it. Every hijack gets a connection of its own, outside of the pool
+        used for regular API calls. Close the response to release it.
+        """
+
+        headers = {'Connection': 'Upgrade', 'Upgrade': 'tcp', **kwargs.pop('headers', {})}
+        request = self.hijack_client.build_request(method, url, headers=headers, **kwargs)
+        response = await self.hijack_client.send(request, stream=True)
+        return response, response.extensions['network_stream']
 
 
 class AsyncUnixSocketTransport(BaseTransport):
     @field_validator('client')
     def set_client(cls, v, info: ValidationInfo):
         log.debug("creating uds client", url=str(info.data['url'].path))
-        transport = httpx.AsyncHTTPTransport(uds=info.data['url'].path, retries=3)
-        return httpx.AsyncClient(transport=transport,
-                                 base_url="http://docker",
-                                 event_hooks={
-                                    'request': [log_request],
-                                    'response': [raise_on_4xx_5xx, log_response]
-                                })
+        pool = info.data['pool']
+        transport = httpx.AsyncHTTPTransport(uds=info.data['url'].path, limits=pool.limits(), retries=pool.retries)
+        return async_client(transport, "http://docker", info)
+
+    @field_validator('hijack_client')
+    def set_hijack_client(cls, v, info: ValidationInfo):
+        transport = httpx.AsyncHTTPTransport(uds=info.data['url'].path, limits=HIJACK_LIMITS)
+        return async_client(transport, "http://docker", info, lane='hijack')
+
+    @field_validator('stream_client')
+    def set_stream_client(cls, v, info: ValidationInfo):
+        pool = info.data['pool']
+        transport = httpx.AsyncHTTPTransport(uds=info.data['url'].path, limits=pool.limits('stream'), retries=pool.retries)
+        return async_client(transport, "http://docker", info, lane='stream')
+
+
+class AsyncLeanUnixSocketTransport(BaseTransport):
+    """
+    AsyncUnixSocketTransport on the lean HTTP/1.1 client of dockerxxx.uds instead of httpx,
+    for lower latency on small API calls. Requests aren't logged.
+    """
+
+    @field_validator('client')
+    def set_client(cls, v, info: ValidationInfo):
+        log.debug("creating lean uds client", url=str(info.data['url'].path))
+        return uds_client(info)
+
+    @field_validator('stream_client')
+    def set_stream_client(cls, v, info: ValidationInfo):
+        return uds_client(info, lane='stream')
+
+    @field_validator('hijack_client')
+    def set_hijack_client(cls, v, info: ValidationInfo):
+        return uds_client(info, lane='hijack')
 
 
 class AsyncSshTransport(BaseTransport):
-    uds_url: AnyUrl = AnyUrl(f"unix:///tmp/dockerxxx-{secrets.token_hex(nbytes=6)}.sock")
-
-    async def forward_socket(self, remote_uds_path: str = "/var/run/docker.sock") -> str:
-        options = asyncssh.SSHClientConnectionOptions(
-            username=self.url.username,
-            password=self.url.password,
-            known_hosts=None, # we should be able to turn this on via the URL
-            client_keys=[]
-        )
+    """
+    Talks to a remote daemon through channels of an SSH connection shared by every client
+    of the host (see dockerxxx.ssh). ssh:// URLs reach the daemon's socket, /var/run/docker.sock
+    unless the URL has a path (ssh://user@host/run/user/1000/docker.sock). ssh+http:// and
+    ssh+https:// URLs reach a daemon listening on a port, host:port in the path as seen
+    from the SSH host (ssh+https://user@bastion/10.0.0.5:2376), localhost by default.
+    """
 
-        await log.adebug("setting up ssh uds forwarding", local_path=self.uds_url.path, remote_path=remote_uds_path, url=str(self.url))
+    @field_validator('client')
+    def set_client(cls, v, info: ValidationInfo):
+        from .ssh import ssh_transport
 
-        conn = await asyncssh.connect(host=self.url.host, port=self.url.port, options=options)
-        listener = await conn.forward_local_path(
-            listen_path=self.uds_url.path,
-            dest_path=remote_uds_path
-        )
+        log.debug("creating ssh client", url=str(info.data['url']))
+        pool = info.data['pool']
+        transport, base_url = ssh_transport(info.data['url'], limits=pool.limits(), retries=pool.retries,
+                                            verify=tls_context(info.data['cert_path'], info.data['tls_verify']))
+        return async_client(transport, base_url, info)
+
+    @field_validator('hijack_client')
+    def set_hijack_client(cls, v, info: ValidationInfo):
+        from .ssh import ssh_transport
+
+        transport, base_url = ssh_transport(info.data['url'], limits=HIJACK_LIMITS,
+                                            verify=tls_context(info.data['cert_path'], info.data['tls_verify']))
+        return async_client(transport, base_url, info, lane='hijack')
+
+    @field_validator('stream_client')
+    def set_stream_client(cls, v, info: ValidationInfo):
+        from .ssh import ssh_transport
+
+        pool = info.data['pool']
+        transport, base_url = ssh_transport(info.data['url'], limits=pool.limits('stream'), retries=pool.retries,
+                                            verify=tls_context(info.data['cert_path'], info.data['tls_verify']))
+        return async_client(transport, base_url, info, lane='stream')
 
 
 class AsyncHttpTransport(BaseTransport):
@@ -76,13 +388,23 @@ class AsyncHttpTransport(BaseTransport):
         )
 
         log.debug(f"creating {scheme} client", url=str(info.data['url']))
-        transport = httpx.AsyncHTTPTransport(retries=3, verify=info.data['tls_verify'])
-        return httpx.AsyncClient(transport=transport,
-                                 base_url=f"{scheme}://{netloc}",
-                                 event_hooks={
-                                    'request': [log_request],
-                                    'response': [raise_on_4xx_5xx, log_response]
-                                })
+        pool = info.data['pool']
+        transport = AsyncTlsTransport(verify=tls_context(info.data['cert_path'], info.data['tls_verify']),
+                                   limits=pool.limits(), retries=pool.retries)
+        return async_client(transport, f"{scheme}://{netloc}", info)
+
+    @field_validator('hijack_client')
+    def set_hijack_client(cls, v, info: ValidationInfo):
+        transport = AsyncTlsTransport(verify=tls_context(info.data['cert_path'], info.data['tls_verify']),
+                                   limits=HIJACK_LIMITS)
+        return async_client(transport, str(info.data['client'].base_url), info, lane='hijack')
+
+    @field_validator('stream_client')
+    def set_stream_client(cls, v, info: ValidationInfo):
+        pool = info.data['pool']
+        transport = AsyncTlsTransport(verify=tls_context(info.data['cert_path'], info.data['tls_verify']),
+                                   limits=pool.limits('stream'), retries=pool.retries)
+        return async_client(transport, str(info.data['client'].base_url), info, lane='stream')
 
 
 class SshTransport(BaseTransport):
@@ -90,8 +412,51 @@ class SshTransport(BaseTransport):
 
 
 class UnixSocketTransport(BaseTransport):
-    pass
+    @field_validator('client')
+    def set_client(cls, v, info: ValidationInfo):
+        log.debug("creating sync uds client", url=str(info.data['url'].path))
+        pool = info.data['pool']
+        transport = httpx.HTTPTransport(uds=info.data['url'].path, limits=pool.limits(), retries=pool.retries)
+        return sync_client(transport, "http://docker", info)
+
+    @field_validator('hijack_client')
+    def set_hijack_client(cls, v, info: ValidationInfo):
+        transport = httpx.HTTPTransport(uds=info.data['url'].path, limits=HIJACK_LIMITS)
+        return sync_client(transport, "http://docker", info, lane='hijack')
+
+    @field_validator('stream_client')
+    def set_stream_client(cls, v, info: ValidationInfo):
+        pool = info.data['pool']
+        transport = httpx.HTTPTransport(uds=info.data['url'].path, limits=pool.limits('stream'), retries=pool.retries)
+        return sync_client(transport, "http://docker", info, lane='stream')
 
 
 class HttpTransport(BaseTransport):
-    pass
+    @field_validator('client')
+    def set_client(cls, v, info: ValidationInfo):
+        scheme = info.data['url'].scheme
+        netloc = (
+            info.data['url'].host
+            if not info.data['url'].port
+            else f"{info.data['url'].host}:{info.data['url'].port}"
+        )
+
+        log.debug(f"creating sync {scheme} client", url=str(info.data['url']))
+        pool = info.data['pool']
+        transport = TlsTransport(verify=tls_context(info.data['cert_path'], info.data['tls_verify']),
+                              limits=pool.limits(), retries=pool.retries)
+        return sync_client(transport, f"{scheme}://{netloc}", info)
+
+    @field_validator('hijack_client')
+    def set_hijack_client(cls, v, info: ValidationInfo):
+        transport = TlsTransport(verify=tls_context(info.data['cert_path'], info.data['tls_verify']),
+                              limits=HIJACK_LIMITS)
+        return sync_client(transport, str(info.data['client'].base_url), info, lane='hijack')
+
+    @field_validator('stream_client')
+    def set_stream_client(cls, v, info: ValidationInfo):
+        pool = info.data['pool']
+        transport = TlsTransport(verify=tls_context(info.data['cert_path'], info.data['tls_verify']),
+                              limits=pool.limits('stream'), retries=pool.retries)
+        return sync_client(transport, str(info.data['client'].base_url), info, lane='stream')
+
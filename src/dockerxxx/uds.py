@@ -0,0 +1,642 @@
+"""
+Lean HTTP/1.1 client for the daemon's Unix socket, written directly on asyncio streams.
+
+Small API calls (inspect, start, stop, ping) are dominated by client overhead rather than
+by the daemon: httpx builds and parses URLs, runs every request through httpcore's
+connection state machines and the event hooks, and log_response copies the headers for
+an event structlog then drops. UdsClient only does what the Docker API needs from
+HTTP/1.1: keep-alive connection pooling, Content-Length, chunked and close-delimited
+bodies, and connections upgraded to raw streams (attach, exec). Requests aren't logged.
+
+It exposes the part of the httpx.AsyncClient interface the API code uses and raises
+httpx's exceptions, so AsyncLeanUnixSocketTransport can stand in for
+AsyncUnixSocketTransport:
+
+    docker = AsyncDocker(base_url="unix:///var/run/docker.sock", http='lean')
+"""
+
+import json as jsonlib
+import codecs
+import asyncio
+import httpx
+from collections import deque
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+from typing import Any, AsyncIterable, AsyncIterator, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+from .pool import PoolStats, RequestMeter
+
+# bytes asked from the socket at a time when a body isn't read in chunks of a given size
+READ_SIZE = 64 * 1024
+# longest response head accepted
+MAX_HEAD_SIZE = 256 * 1024
+
+# the timeout argument wasn't given, use the client's
+_CLIENT_TIMEOUT = object()
+
+_NO_BODY_STATUS = (204, 304)
+
+
+if hasattr(asyncio, 'timeout'):
+    async def _timed(aw, timeout: Optional[float]):
+        async with asyncio.timeout(timeout):
+            return await aw
+else:
+    _timed = asyncio.wait_for
+
+
+def _query_value(value: Any) -> str:
+    # the way httpx renders query parameters
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    return '' if value is None else str(value)
+
+
+def _query(params: Dict[str, Any]) -> str:
+    items = []
+    for key, value in params.items():
+        if isinstance(value, (list, tuple)):
+            items.extend((key, _query_value(v)) for v in value)
+        else:
+            items.append((key, _query_value(value)))
+    return urlencode(items)
+
+
+class UdsRequest:
+    """
+    A request of a UdsClient, with the attributes of httpx.Request the API code and the
+    response hooks use
+    """
+
+    __slots__ = ('method', 'target', 'headers', 'content', 'timeout', 'extensions', 'base_url', '_url')
+
+    def __init__(self, method: str, target: str, headers: Dict[str, str], content: Any,
+                 timeout: httpx.Timeout, base_url: str):
+        self.method = method
+        self.target = target
+        self.headers = headers
+        self.content = content
+        self.timeout = timeout
+        self.extensions = {}
+        self.base_url = base_url
+        self._url = None
+
+    @property
+    def url(self) -> httpx.URL:
+        if self._url is None:
+            self._url = httpx.URL(self.base_url + self.target)
+        return self._url
+
+    def encode_head(self) -> bytes:
+        lines = [f"{self.method} {self.target} HTTP/1.1\r\nHost: docker\r\n"]
+        lines.extend(f"{k}: {v}\r\n" for k, v in self.headers.items())
+        if self.content is None or isinstance(self.content, bytes):
+            if self.content or self.method in ('POST', 'PUT', 'PATCH'):
+                lines.append(f"Content-Length: {len(self.content or b'')}\r\n")
+        else:
+            lines.append("Transfer-Encoding: chunked\r\n")
+        lines.append("\r\n")
+        return ''.join(lines).encode('latin-1')
+
+    def __repr__(self) -> str:
+        return f"<UdsRequest({self.method!r}, {self.target!r})>"
+
+
+class UdsConnection:
+    """
+    A connection to the daemon's socket, idle in its pool or serving one request
+    """
+
+    __slots__ = ('reader', 'writer', 'idle_until', 'reused')
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.idle_until = None
+        self.reused = False
+
+    def is_usable(self) -> bool:
+        # the daemon closes idle connections, which the loop has seen by the time we look
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    def close(self):
+        self.writer.close()
+
+
+class UdsNetworkStream:
+    """
+    The raw stream of a connection upgraded by the daemon, with the interface of httpcore's
+    network streams
+    """
+
+    def __init__(self, connection: UdsConnection):
+        self.connection = connection
+
+    async def read(self, max_bytes: int, timeout: Optional[float] = None) -> bytes:
+        try:
+            return await _timed(self.connection.reader.read(max_bytes), timeout)
+        except asyncio.TimeoutError:
+            raise httpx.ReadTimeout("Timed out reading from the upgraded connection")
+        except OSError as e:
+            raise httpx.ReadError(str(e)) from e
+
+    async def write(self, buffer: bytes, timeout: Optional[float] = None):
+        try:
+            self.connection.writer.write(buffer)
+            await _timed(self.connection.writer.drain(), timeout)
+        except asyncio.TimeoutError:
+            raise httpx.WriteTimeout("Timed out writing to the upgraded connection")
+        except OSError as e:
+            raise httpx.WriteError(str(e)) from e
+
+    async def aclose(self):
+        self.connection.close()
+
+    def get_extra_info(self, info: str) -> Any:
+        if info == 'stream_writer':
+            return self.connection.writer
+        return self.connection.writer.get_extra_info(info)
+
+
+class UdsPool:
+    """
+    Keep-alive connections to a Unix socket. At most max_connections of them serve
+    requests at once, others wait up to the pool timeout for one to be released; at most
+    max_keepalive_connections stay open between requests, for keepalive_expiry seconds.
+    """
+
+    def __init__(self, path: str, limits: httpx.Limits, retries: int = 0, stats: Optional[PoolStats] = None):
+        self.path = path
+        self.max_keepalive_connections = limits.max_keepalive_connections
+        self.keepalive_expiry = limits.keepalive_expiry
+        self.retries = retries
+        self.stats = stats
+        self.slots = asyncio.Semaphore(limits.max_connections) if limits.max_connections else None
+        self.idle: Deque[UdsConnection] = deque()
+        self.active = 0
+
+    async def _connect(self, timeout: Optional[float]) -> UdsConnection:
+        for attempt in range(self.retries + 1):
+            try:
+                reader, writer = await _timed(asyncio.open_unix_connection(self.path, limit=MAX_HEAD_SIZE), timeout)
+                return UdsConnection(reader, writer)
+            except asyncio.TimeoutError:
+                raise httpx.ConnectTimeout(f"Timed out connecting to {self.path}")
+            except OSError as e:
+                if attempt == self.retries:
+                    raise httpx.ConnectError(str(e)) from e
+                # httpx's backoff between connection attempts: 0, 0.5, 1, 2... seconds
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1) if attempt else 0)
+
+    async def acquire(self, timeout: httpx.Timeout, meter: Optional[RequestMeter]) -> UdsConnection:
+        if self.slots is not None:
+            if self.slots.locked():
+                try:
+                    await _timed(self.slots.acquire(), timeout.pool)
+                except asyncio.TimeoutError:
+                    raise httpx.PoolTimeout("Timed out waiting for a connection")
+            else:
+                await self.slots.acquire()
+        self.active += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+            while self.idle:
+                connection = self.idle.pop()
+                if connection.is_usable() and (connection.idle_until is None or connection.idle_until > loop.time()):
+                    connection.reused = True
+                    if meter is not None:
+                        meter.event('http11.send_request_headers.started')
+                    return connection
+                connection.close()
+
+            if meter is not None:
+                meter.event('connection.connect_unix_socket.started')
+            return await self._connect(timeout.connect)
+        except BaseException:
+            self._free_slot()
+            raise
+
+    def _free_slot(self):
+        self.active -= 1
+        if self.slots is not None:
+            self.slots.release()
+
+    def release(self, connection: UdsConnection, reusable: bool):
+        """
+        Hands back a connection once its response was read (reusable) or abandoned
+        """
+
+        self._free_slot()
+        if (reusable and connection.is_usable() and
+                (self.max_keepalive_connections is None or len(self.idle) < self.max_keepalive_connections)):
+            if self.keepalive_expiry is not None:
+                connection.idle_until = asyncio.get_running_loop().time() + self.keepalive_expiry
+            self.idle.append(connection)
+        else:
+            connection.close()
+
+    def detach(self, connection: UdsConnection):
+        """
+        Takes an upgraded connection out of the pool, it's closed with its response
+        """
+
+        self._free_slot()
+
+    def snapshot(self) -> PoolStats:
+        stats = self.stats or PoolStats()
+        return stats.model_copy(update={
+            'connections': self.active + len(self.idle),
+            'idle_connections': len(self.idle)
+        })
+
+    async def aclose(self):
+        while self.idle:
+            self.idle.pop().close()
+
+
+class UdsResponse:
+    """
+    A response of a UdsClient, with the attributes and methods of httpx.Response the API
+    code uses. Its body is read from the connection as it is iterated, and the connection
+    goes back to the pool once the body was read to the end.
+    """
+
+    def __init__(self, status_code: int, reason: str, raw_headers: List[Tuple[bytes, bytes]], request: UdsRequest,
+                 connection: UdsConnection, pool: UdsPool, meter: Optional[RequestMeter],
+                 length: Optional[int], chunked: bool, keep_alive: bool):
+        self.status_code = status_code
+        self.reason_phrase = reason
+        self.raw_headers = raw_headers
+        self.request = request
+        self.http_version = 'HTTP/1.1'
+        self.extensions = {}
+        self.is_closed = False
+        self._connection = connection
+        self._pool = pool
+        self._meter = meter
+        self._length = length
+        self._chunked = chunked
+        self._keep_alive = keep_alive
+        self._headers = None
+        self._content = None
+        self._consumed = False
+
+    @property
+    def headers(self) -> httpx.Headers:
+        if self._headers is None:
+            self._headers = httpx.Headers(self.raw_headers)
+        return self._headers
+
+    @property
+    def url(self) -> httpx.URL:
+        return self.request.url
+
+    @property
+    def is_success(self) -> bool:
+        return 200 <= self.status_code < 300
+
+    @property
+    def is_error(self) -> bool:
+        return self.status_code >= 400
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            raise httpx.ResponseNotRead()
+        return self._content
+
+    @property
+    def encoding(self) -> str:
+        _, _, charset = self.headers.get('content-type', '').partition('charset=')
+        return charset.split(';', 1)[0].strip().strip('"') or 'utf-8'
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self, **kwargs) -> Any:
+        return jsonlib.loads(self.content, **kwargs)
+
+    def raise_for_status(self) -> "UdsResponse":
+        if self.status_code < 400:
+            return self
+        kind = 'Client error' if self.status_code < 500 else 'Server error'
+        raise httpx.HTTPStatusError(f"{kind} '{self.status_code} {self.reason_phrase}' for url '{self.url}'",
+                                    request=self.request, response=self)
+
+    def _finish(self, reusable: bool):
+        if self.is_closed:
+            return
+        self.is_closed = True
+        if 'network_stream' in self.extensions:
+            self._connection.close()
+        else:
+            self._pool.release(self._connection, reusable and self._keep_alive)
+        if self._meter is not None:
+            self._meter.release()
+
+    async def _read_timed(self, aw):
+        try:
+            return await _timed(aw, self.request.timeout.read)
+        except asyncio.TimeoutError:
+            raise httpx.ReadTimeout(f"Timed out reading the response of {self.request.target}")
+        except asyncio.IncompleteReadError as e:
+            raise httpx.RemoteProtocolError("peer closed connection without sending complete message body") from e
+        except OSError as e:
+            raise httpx.ReadError(str(e)) from e
+
+    async def _iter_body(self, read_size: int) -> AsyncIterator[bytes]:
+        reader = self._connection.reader
+        if self._chunked:
+            while True:
+                size = int((await self._read_timed(reader.readuntil(b'\r\n'))).split(b';', 1)[0], 16)
+                if size == 0:
+                    # trailers, up to the empty line ending the body
+                    while await self._read_timed(reader.readuntil(b'\r\n')) != b'\r\n':
+                        pass
+                    return
+                while size:
+                    chunk = await self._read_timed(reader.read(min(size, read_size)))
+                    if not chunk:
+                        raise httpx.RemoteProtocolError("peer closed connection without sending complete message body")
+                    size -= len(chunk)
+                    yield chunk
+                await self._read_timed(reader.readexactly(2))
+        elif self._length is not None:
+            remaining = self._length
+            while remaining:
+                chunk = await self._read_timed(reader.read(min(remaining, read_size)))
+                if not chunk:
+                    raise httpx.RemoteProtocolError("peer closed connection without sending complete message body")
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            # delimited by the daemon closing the connection
+            while chunk := await self._read_timed(reader.read(read_size)):
+                yield chunk
+
+    async def aiter_raw(self, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Yields the body as it arrives, in chunk_size pieces (but the last) when given
+        """
+
+        if self._content is not None:
+            for pos in range(0, len(self._content), chunk_size or len(self._content) or 1):
+                yield self._content[pos:pos + chunk_size] if chunk_size else self._content
+            return
+        if self._consumed:
+            raise httpx.StreamConsumed()
+        self._consumed = True
+
+        try:
+            if chunk_size is None:
+                async for chunk in self._iter_body(READ_SIZE):
+                    yield chunk
+            else:
+                buffer = bytearray()
+                async for chunk in self._iter_body(max(chunk_size, READ_SIZE)):
+                    buffer += chunk
+                    while len(buffer) >= chunk_size:
+                        yield bytes(buffer[:chunk_size])
+                        del buffer[:chunk_size]
+                if buffer:
+                    yield bytes(buffer)
+        except BaseException:
+            self._finish(reusable=False)
+            raise
+        self._finish(reusable=True)
+
+    # the daemon doesn't compress responses
+    aiter_bytes = aiter_raw
+
+    async def aiter_text(self, chunk_size: Optional[int] = None) -> AsyncIterator[str]:
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+        async for chunk in self.aiter_raw(chunk_size):
+            if text := decoder.decode(chunk):
+                yield text
+        if text := decoder.decode(b'', final=True):
+            yield text
+
+    async def aiter_lines(self) -> AsyncIterator[str]:
+        pending = ''
+        async for text in self.aiter_text():
+            *lines, pending = (pending + text).split('\n')
+            for line in lines:
+                yield line.rstrip('\r')
+        if pending:
+            yield pending
+
+    async def aread(self) -> bytes:
+        if self._content is None:
+            if self._length == 0 and not self._chunked:
+                self._content = b''
+                self._consumed = True
+                self._finish(reusable=True)
+            elif self._length is not None and not self._chunked:
+                try:
+                    self._content = await self._read_timed(self._connection.reader.readexactly(self._length))
+                except BaseException:
+                    self._consumed = True
+                    self._finish(reusable=False)
+                    raise
+                self._consumed = True
+                self._finish(reusable=True)
+            else:
+                self._content = b''.join([chunk async for chunk in self.aiter_raw()])
+        return self._content
+
+    async def aclose(self):
+        # a body that wasn't read to the end leaves the connection in the middle of a response
+        self._finish(reusable=False)
+
+    def __repr__(self) -> str:
+        return f"<UdsResponse [{self.status_code} {self.reason_phrase}]>"
+
+
+class UdsClient:
+    """
+    Pooled HTTP/1.1 client of a Unix socket, exposing the part of the httpx.AsyncClient
+    interface the API code uses (see the module's docstring). Responses with an error
+    status raise httpx.HTTPStatusError like the httpx clients' hooks, with their body read.
+    Functions added to event_hooks['response'] are awaited with the other responses.
+    """
+
+    def __init__(self, path: str, limits: httpx.Limits, timeout: httpx.Timeout, retries: int = 0,
+                 stats: Optional[PoolStats] = None, base_url: str = "http://docker"):
+        self.base_url = httpx.URL(base_url)
+        self.timeout = timeout
+        self.event_hooks = {'request': [], 'response': []}
+        self._base_url = base_url
+        self._transport = UdsPool(path, limits, retries, stats)
+
+    def build_request(self, method: str, url: str, *, params: Optional[Dict[str, Any]] = None,
+                      headers: Optional[Dict[str, str]] = None, content: Any = None, json: Any = None,
+                      timeout: Any = _CLIENT_TIMEOUT) -> UdsRequest:
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{_query(params)}"
+
+        headers = dict(headers) if headers else {}
+        if json is not None:
+            content = jsonlib.dumps(json).encode()
+            headers['Content-Type'] = 'application/json'
+        elif isinstance(content, str):
+            content = content.encode()
+        elif isinstance(content, (bytearray, memoryview)):
+            content = bytes(content)
+
+        if timeout is _CLIENT_TIMEOUT:
+            timeout = self.timeout
+        elif not isinstance(timeout, httpx.Timeout):
+            timeout = httpx.Timeout(timeout)
+        return UdsRequest(method, url, headers, content, timeout, self._base_url)
+
+    @staticmethod
+    async def _flush(writer: asyncio.StreamWriter, data: bytes, request: UdsRequest):
+        # like httpx, the write timeout applies to each write rather than to the whole body
+        try:
+            writer.write(data)
+            await _timed(writer.drain(), request.timeout.write)
+        except asyncio.TimeoutError:
+            raise httpx.WriteTimeout(f"Timed out sending {request.target}")
+        except OSError as e:
+            raise httpx.WriteError(str(e)) from e
+
+    async def _write(self, connection: UdsConnection, request: UdsRequest):
+        writer = connection.writer
+        head = request.encode_head()
+        if request.content is None or isinstance(request.content, bytes):
+            await self._flush(writer, head + request.content if request.content else head, request)
+            return
+
+        await self._flush(writer, head, request)
+        if isinstance(request.content, AsyncIterable):
+            async for chunk in request.content:
+                if chunk:
+                    await self._flush(writer, b'%x\r\n%b\r\n' % (len(chunk), chunk), request)
+        else:
+            for chunk in request.content:
+                if chunk:
+                    await self._flush(writer, b'%x\r\n%b\r\n' % (len(chunk), chunk), request)
+        await self._flush(writer, b'0\r\n\r\n', request)
+
+    async def _read_head(self, connection: UdsConnection, request: UdsRequest) -> Tuple[int, str, List[Tuple[bytes, bytes]]]:
+        while True:
+            head = await connection.reader.readuntil(b'\r\n\r\n')
+            status_line, *lines = head[:-4].split(b'\r\n')
+            version, _, status = status_line.partition(b' ')
+            code, _, reason = status.partition(b' ')
+            if not version.startswith(b'HTTP/1.') or not code.isdigit():
+                raise httpx.RemoteProtocolError(f"Invalid response status line {status_line!r}")
+
+            status_code = int(code)
+            # interim responses (100 Continue) come before the actual one, but for upgrades
+            if 100 <= status_code < 200 and status_code != 101:
+                continue
+
+            headers = []
+            for line in lines:
+                name, _, value = line.partition(b':')
+                headers.append((name.strip(), value.strip()))
+            return status_code, reason.decode('latin-1') or HTTPStatus(status_code).phrase, headers
+
+    async def _exchange(self, connection: UdsConnection, request: UdsRequest):
+        await self._write(connection, request)
+        try:
+            return await _timed(self._read_head(connection, request), request.timeout.read)
+        except asyncio.TimeoutError:
+            raise httpx.ReadTimeout(f"Timed out waiting for the response of {request.target}")
+        except asyncio.IncompleteReadError as e:
+            raise httpx.RemoteProtocolError("Server disconnected without sending a response.") from e
+        except asyncio.LimitOverrunError as e:
+            raise httpx.RemoteProtocolError("Response head too large") from e
+        except OSError as e:
+            raise httpx.ReadError(str(e)) from e
+
+    async def send(self, request: UdsRequest, stream: bool = False) -> UdsResponse:
+        for hook in self.event_hooks['request']:
+            await hook(request)
+
+        pool = self._transport
+        meter = RequestMeter(pool.stats, request) if pool.stats is not None else None
+        try:
+            while True:
+                connection = await pool.acquire(request.timeout, meter)
+                try:
+                    status_code, reason, headers = await self._exchange(connection, request)
+                    break
+                except (httpx.RemoteProtocolError, httpx.WriteError, httpx.ReadError):
+                    pool.release(connection, reusable=False)
+                    # the daemon closed the kept-alive connection as we sent on it, retry on a new one
+                    # unless the body was a stream, consumed by the first attempt
+                    if not connection.reused or not (request.content is None or isinstance(request.content, bytes)):
+                        raise
+                except BaseException:
+                    pool.release(connection, reusable=False)
+                    raise
+        except BaseException:
+            if meter is not None:
+                meter.release(failed=True)
+            raise
+
+        if meter is not None:
+            meter.responded()
+
+        length, chunked, keep_alive = None, False, True
+        for name, value in headers:
+            name = name.lower()
+            if name == b'content-length':
+                length = int(value)
+            elif name == b'transfer-encoding':
+                chunked = value.lower() == b'chunked'
+            elif name == b'connection':
+                keep_alive = value.lower() != b'close'
+        if request.method == 'HEAD' or status_code in _NO_BODY_STATUS:
+            length, chunked = 0, False
+
+        response = UdsResponse(status_code, reason, headers, request, connection, pool, meter,
+                               length, chunked, keep_alive and (chunked or length is not None))
+        if status_code == 101:
+            pool.detach(connection)
+            response.extensions['network_stream'] = UdsNetworkStream(connection)
+        elif status_code >= 400:
+            # read the error's message before raising like the httpx clients' hooks
+            await response.aread()
+            response.raise_for_status()
+        elif not stream:
+            await response.aread()
+
+        for hook in self.event_hooks['response']:
+            await hook(response)
+        return response
+
+    async def request(self, method: str, url: str, **kwargs) -> UdsResponse:
+        return await self.send(self.build_request(method, url, **kwargs))
+
+    async def get(self, url: str, **kwargs) -> UdsResponse:
+        return await self.request("GET", url, **kwargs)
+
+    async def head(self, url: str, **kwargs) -> UdsResponse:
+        return await self.request("HEAD", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> UdsResponse:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> UdsResponse:
+        return await self.request("PUT", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> UdsResponse:
+        return await self.request("DELETE", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs):
+        response = await self.send(self.build_request(method, url, **kwargs), stream=True)
+        try:
+            yield response
+        finally:
+            await response.aclose()
+
+    async def aclose(self):
+        await self._transport.aclose()
@@ -2,17 +2,15 @@ import shlex
 import struct
 import httpx
 import json
-import warnings
+from datetime import datetime, timezone
+from typing import Iterator, Tuple
 from .errors import DockerException
 
-try:
-    from ptpython import embed
-except ImportError:
-    warnings.warn("ptpython was not found, debug shell won't work")
-
 STDOUT = 1
 STDERR = 2
 STREAM_HEADER_SIZE_BYTES = 8
+STREAM_HEADER = struct.Struct('>BxxxL')
+STREAM_CHUNK_SIZE = 64 * 1024
 BYTE_UNITS = {
     'b': 1,
     'k': 1024,
@@ -21,6 +19,7 @@ BYTE_UNITS = {
 }
 
 async def debug_shell():
+    from ptpython import embed
     await embed(locals=locals(), globals=globals(), return_asyncio_coroutine=True, patch_stdout=True)
 
 def parse_repository_tag(repo_name):
@@ -35,11 +34,18 @@ def parse_repository_tag(repo_name):
 def split_command(command):
     return shlex.split(command)
 
-def get_raw_response_socket(client):
-    if isinstance(client, httpx.AsyncClient):
-        return client._transport._pool.connections[0]._connection._network_stream
+def parse_timestamp(value: str) -> float:
+    """
+    Converts the daemon's RFC 3339 UTC timestamps (with up to nanosecond precision)
+    to epoch seconds
+    """
 
-    raise NotImplementedError
+    date, _, fraction = value.rstrip('Z').partition('.')
+    seconds = datetime.strptime(date, '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+    return seconds + float(f'0.{fraction}') if fraction else seconds
+
+def is_not_found(e: Exception) -> bool:
+    return isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 404
 
 def convert_filters(f):
     if isinstance(f, dict):
@@ -56,6 +62,52 @@ def convert_filters(f):
 
         return json.dumps(result)
 
+class JSONStreamDecoder:
+    """
+    Incremental decoder for the newline delimited JSON streams the daemon sends
+    (events, stats, pull/build/load progress).
+
+    Each chunk is scanned once. Complete documents are sliced straight out of the
+    chunk and only an unterminated tail is kept in the buffer, so memory stays
+    bounded by the largest single document.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        start = 0
+
+        if self._buffer:
+            end = chunk.find(b'\n')
+            if end == -1:
+                self._buffer += chunk
+                return
+
+            self._buffer += chunk[:end]
+            document = bytes(self._buffer)
+            self._buffer.clear()
+            start = end + 1
+            if document.strip():
+                yield document
+
+        while (end := chunk.find(b'\n', start)) != -1:
+            if end > start:
+                yield chunk[start:end]
+            start = end + 1
+
+        if start < len(chunk):
+            self._buffer += chunk[start:]
+
+    def flush(self) -> Iterator[bytes]:
+        """
+        Returns the last document if the stream didn't end with a newline
+        """
+
+        if self._buffer.strip():
+            yield bytes(self._buffer)
+        self._buffer.clear()
+
 def parse_bytes(s):
     """
     https://github.com/docker/docker-py/blob/6ceb08273c157cbab7b5c77bd71e7389f1a6acc5/docker/utils/utils.py#L402
@@ -99,91 +151,72 @@ def parse_bytes(s):
 
     return s
 
-'''
-https://github.com/docker/docker-py/blob/6ceb08273c157cbab7b5c77bd71e7389f1a6acc5/docker/utils/socket.py#L92
-'''
-
-async def next_frame_header(socket):
+class FrameDemuxer:
     """
-    Returns the stream and size of the next frame of data waiting to be read
-    from socket, according to the protocol defined here:
+    Incremental demuxer for the stdout/stderr multiplexed streams returned by logs,
+    attach and exec when the container has no tty, according to the protocol defined here:
 
     https://docs.docker.com/engine/api/v1.24/#attach-to-a-container
+
+    Frames are yielded as (stream, memoryview) slices of the chunk they arrived in.
+    A frame whose payload spans several chunks is yielded piece by piece, so the only
+    bytes ever copied are headers split across a chunk boundary.
     """
 
-    data = await socket.read(STREAM_HEADER_SIZE_BYTES)
-    if not data:
-        return (-1, -1)
+    def __init__(self, tty: bool = False):
+        self.tty = tty
+        self._header = bytearray()
+        self._stream = STDOUT
+        self._remaining = 0
+
+    def feed(self, chunk: bytes) -> Iterator[Tuple[int, memoryview]]:
+        view = memoryview(chunk)
+        if self.tty:
+            if view:
+                yield STDOUT, view
+            return
+
+        pos, size = 0, len(view)
+        while pos < size:
+            if not self._remaining:
+                if not self._header and size - pos >= STREAM_HEADER_SIZE_BYTES:
+                    self._stream, self._remaining = STREAM_HEADER.unpack_from(view, pos)
+                    pos += STREAM_HEADER_SIZE_BYTES
+                    continue
+
+                needed = min(STREAM_HEADER_SIZE_BYTES - len(self._header), size - pos)
+                self._header += view[pos:pos + needed]
+                pos += needed
+                if len(self._header) == STREAM_HEADER_SIZE_BYTES:
+                    self._stream, self._remaining = STREAM_HEADER.unpack_from(self._header)
+                    self._header.clear()
+                continue
 
-    stream, actual = struct.unpack('>BxxxL', data)
-    return (stream, actual)
+            n = min(self._remaining, size - pos)
+            yield self._stream, view[pos:pos + n]
+            pos += n
+            self._remaining -= n
 
-async def frames_iter_no_tty(socket):
+def demux_buffer(buf: bytes, tty: bool) -> bytes:
     """
-    Returns a generator of data read from the socket when the tty setting is
-    not enabled.
+    Returns the payload of a fully buffered logs/attach response
     """
 
-    while True:
-        (stream, n) = await next_frame_header(socket)
-        if n < 0:
-            break
-        while n > 0:
-            result = await socket.read(n)
-            if result is None:
-                continue
-            data_length = len(result)
-            if data_length == 0:
-                # We have reached EOF
-                return
-            n -= data_length
-            yield (stream, result)
+    if tty:
+        return buf
 
-async def frames_iter_tty(socket):
-    """
-    Return a generator of data read from the socket when the tty setting is
-    enabled.
-    """
-    while True:
-        result = await socket.read()
-        if not result:
-            # We have reached EOF
-            return
-        yield result
+    return b''.join(data for _, data in FrameDemuxer().feed(buf))
 
-async def frames_iter(socket, tty):
+async def frames_iter(socket, tty: bool, chunk_size: int = STREAM_CHUNK_SIZE):
     """
-    Return a generator of frames read from socket. A frame is a tuple where
+    Returns a generator of frames read from socket. A frame is a tuple where
     the first item is the stream number and the second item is a chunk of data.
 
     If the tty setting is enabled, the streams are multiplexed into the stdout
     stream.
     """
-    if tty:
-        return ((STDOUT, frame) async for frame in frames_iter_tty(socket))
-    else:
-        return frames_iter_no_tty(socket)
-
-async def multiplexed_buffer_helper(buf):
-    """A generator of multiplexed data blocks read from a buffered
-    response."""
-
-    buf_length = len(buf)
-    walker = 0
-    while True:
-        if buf_length - walker < STREAM_HEADER_SIZE_BYTES:
-            break
-        header = buf[walker:walker + STREAM_HEADER_SIZE_BYTES]
-        _, length = struct.unpack_from('>BxxxL', header)
-        start = walker + STREAM_HEADER_SIZE_BYTES
-        end = start + length
-        walker = end
-        yield buf[start:end]
-
-async def get_results(res, is_tty):
-    if is_tty:
-        return res
-
-    return b''.join([
-        data async for data in multiplexed_buffer_helper(res)
-    ])
+
+    demuxer = FrameDemuxer(tty)
+    while chunk := await socket.read(chunk_size):
+        for frame in demuxer.feed(chunk):
+            yield frame
@@ -1,16 +1,70 @@
 #import pytest
+import asyncio
 import pytest_asyncio
 from dockerxxx import AsyncDocker
+from dockerxxx.testing import FakeEngine
 #from .test_containers import TestContainer
 
 @pytest_asyncio.fixture(scope="session")
 async def docker():
-    return await AsyncDocker.from_env()
+    docker = await AsyncDocker.from_env()
+    yield docker
+    await docker.aclose()
 
 @pytest_asyncio.fixture(scope="session")
 async def client(docker):
     yield docker
 
+@pytest_asyncio.fixture
+async def fake_engine():
+    async with FakeEngine() as engine:
+        yield engine
+
+@pytest_asyncio.fixture(params=['httpx', 'lean'])
+async def fake_docker(request, fake_engine):
+    docker = AsyncDocker(base_url=fake_engine.url, http=request.param)
+    yield docker
+    await docker.aclose()
+
+@pytest_asyncio.fixture
+async def serve_tcp(fake_engine):
+    """
+    Starts a TCP listener on 127.0.0.1 relaying to the fake engine, with TLS when given an
+    SSL context, and returns its port
+    """
+
+    servers, relays = [], set()
+
+    async def relay(reader, writer):
+        relays.add(asyncio.current_task())
+        engine_reader, engine_writer = await asyncio.open_unix_connection(fake_engine.socket_path)
+
+        async def pipe(source, destination):
+            while data := await source.read(64 * 1024):
+                destination.write(data)
+                await destination.drain()
+            if destination.can_write_eof():
+                destination.write_eof()
+            else:
+                # TLS can't be half closed
+                destination.close()
+
+        await asyncio.gather(pipe(reader, engine_writer), pipe(engine_reader, writer), return_exceptions=True)
+        writer.close()
+        engine_writer.close()
+
+    async def serve(ssl=None) -> int:
+        server = await asyncio.start_server(relay, '127.0.0.1', 0, ssl=ssl)
+        servers.append(server)
+        return server.sockets[0].getsockname()[1]
+
+    yield serve
+    for server in servers:
+        server.close()
+    for task in relays:
+        task.cancel()
+    await asyncio.gather(*relays, return_exceptions=True)
+
 '''
 @pytest_asyncio.fixture(scope="session", autouse=True)
 async def teardown(docker: AsyncDocker):
@@ -2,3 +2,55 @@ import random
 
 def random_name():
     return f'dockerpytest_{random.getrandbits(64):x}'
+
+def write_tls_files(directory, hostname='localhost'):
+    """
+    Writes a CA (ca.pem), a server certificate it signed for hostname and 127.0.0.1
+    (server-cert.pem, server-key.pem) and a client certificate (cert.pem, key.pem) into
+    directory, laid out like a DOCKER_CERT_PATH
+    """
+
+    import datetime
+    import ipaddress
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    def issue(name, key, issuer=None, issuer_key=None, ca=False, names=()):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        builder = (x509.CertificateBuilder()
+                   .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)]))
+                   .issuer_name(issuer.subject if issuer else x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)]))
+                   .public_key(key.public_key())
+                   .serial_number(x509.random_serial_number())
+                   .not_valid_before(now - datetime.timedelta(minutes=1))
+                   .not_valid_after(now + datetime.timedelta(days=1))
+                   .add_extension(x509.BasicConstraints(ca=ca, path_length=None), critical=True))
+        if names:
+            builder = builder.add_extension(x509.SubjectAlternativeName(list(names)), critical=False)
+        return builder.sign(issuer_key or key, hashes.SHA256())
+
+    def write(name, data):
+        with open(f'{directory}/{name}', 'wb') as f:
+            f.write(data)
+
+    ca_key = ec.generate_private_key(ec.SECP256R1())
+    ca = issue('dockerxxx test ca', ca_key, ca=True)
+    server_key = ec.generate_private_key(ec.SECP256R1())
+    server = issue(hostname, server_key, ca, ca_key, names=[
+        x509.DNSName(hostname), x509.IPAddress(ipaddress.ip_address('127.0.0.1'))
+    ])
+
+    client_key = ec.generate_private_key(ec.SECP256R1())
+    client = issue('client', client_key, ca, ca_key)
+
+    def write_key(name, key):
+        write(name, key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                      serialization.NoEncryption()))
+
+    write('ca.pem', ca.public_bytes(serialization.Encoding.PEM))
+    write('server-cert.pem', server.public_bytes(serialization.Encoding.PEM))
+    write_key('server-key.pem', server_key)
+    write('cert.pem', client.public_bytes(serialization.Encoding.PEM))
+    write_key('key.pem', client_key)
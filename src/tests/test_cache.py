@@ -0,0 +1,79 @@
+from dockerxxx.cache import InspectCache
+from dockerxxx.models import Volume, EventMessage
+
+FULL_ID = 'f' * 64
+
+def volume(name):
+    return Volume.model_validate({
+        'Name': name, 'Driver': 'local', 'Mountpoint': f'/var/lib/docker/volumes/{name}',
+        'Labels': {}, 'Scope': 'local', 'Options': {}
+    })
+
+class TestInspectCache:
+    def test_get_put(self):
+        cache = InspectCache()
+        assert cache.get('volume', 'foo') is None
+        cache.put('volume', 'foo', volume('foo'), 'foo', cache.token())
+        assert cache.get('volume', 'foo').name == 'foo'
+        assert cache.stats.hits == 1 and cache.stats.misses == 1
+
+    def test_returns_copies(self):
+        cache = InspectCache()
+        cache.put('volume', 'foo', volume('foo'), 'foo', cache.token())
+        cache.get('volume', 'foo').driver = 'changed'
+        assert cache.get('volume', 'foo').driver == 'local'
+
+    def test_returns_deep_copies(self):
+        cache = InspectCache()
+        stored = volume('foo')
+        cache.put('volume', 'foo', stored, 'foo', cache.token())
+        stored.labels['put'] = 'yes'
+
+        first = cache.get('volume', 'foo')
+        first.labels['mutated'] = 'yes'
+        first.options['size'] = '1g'
+
+        second = cache.get('volume', 'foo')
+        assert second.labels == {} and second.options == {}
+        assert second.labels is not first.labels
+
+    def test_aliases_and_ids(self):
+        cache = InspectCache()
+        cache.put('container', 'web', volume('web'), FULL_ID, cache.token())
+        assert cache.get('container', 'web') is not None
+        assert cache.get('container', FULL_ID[:12]) is not None
+        assert cache.get('container', f'sha256:{FULL_ID}') is not None
+
+        cache.handle_event(EventMessage.model_validate(
+            {'Type': 'container', 'Action': 'die', 'Actor': {'ID': FULL_ID}}
+        ))
+        assert cache.get('container', 'web') is None
+        assert cache.get('container', FULL_ID) is None
+
+    def test_lru_eviction(self):
+        cache = InspectCache(max_size=2)
+        for name in ('a', 'b'):
+            cache.put('volume', name, volume(name), name, cache.token())
+        cache.get('volume', 'a')
+        cache.put('volume', 'c', volume('c'), 'c', cache.token())
+        assert cache.get('volume', 'b') is None
+        assert cache.get('volume', 'a') is not None
+        assert cache.stats.evictions == 1
+
+    def test_stale_put_is_dropped(self):
+        cache = InspectCache()
+        token = cache.token()
+        cache.handle_event(EventMessage.model_validate(
+            {'Type': 'volume', 'Action': 'destroy', 'Actor': {'ID': 'foo'}}
+        ))
+        cache.put('volume', 'foo', volume('foo'), 'foo', token)
+        assert cache.get('volume', 'foo') is None
+
+    def test_network_event_invalidates_container(self):
+        cache = InspectCache()
+        cache.put('container', FULL_ID, volume('web'), FULL_ID, cache.token())
+        cache.handle_event(EventMessage.model_validate({
+            'Type': 'network', 'Action': 'connect',
+            'Actor': {'ID': 'e' * 64, 'Attributes': {'container': FULL_ID}}
+        }))
+        assert cache.get('container', FULL_ID) is None
@@ -20,3 +20,19 @@ class TestClient:
     async def test_ping(self, docker: AsyncDocker):
         pong = await docker.ping()
         assert pong == 'OK'
+
+    async def test_inspect_cache(self, docker: AsyncDocker):
+        cache = await docker.enable_cache()
+        try:
+            container = await docker.containers.run("alpine", "sleep 300", detach=True)
+            await docker.containers.get(container.id)
+            hits = cache.stats.hits
+            assert (await docker.containers.get(container.id)).status == 'running'
+            assert cache.stats.hits == hits + 1
+
+            await container.kill()
+            await container.wait()
+            assert (await docker.containers.get(container.id)).status == 'exited'
+            await container.remove()
+        finally:
+            await docker.disable_cache()
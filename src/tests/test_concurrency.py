@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+from dockerxxx.concurrency import FanOut
+
+async def inspect(i):
+    await asyncio.sleep(0.01)
+    if i == 3:
+        raise KeyError(i)
+    return i
+
+@pytest.mark.asyncio
+class TestFanOut:
+    async def test_map_bounded(self):
+        fanout = FanOut(max_concurrency=2)
+        assert await fanout.map(inspect, [0, 1, 2, 4]) == [0, 1, 2, 4]
+        assert fanout.stats.calls == 4
+        assert fanout.stats.max_in_flight == 2
+
+    async def test_map_limit(self):
+        fanout = FanOut(max_concurrency=4)
+        # each map is bounded by its own limit, both together by the shared one
+        results = await asyncio.gather(
+            fanout.map(inspect, [0, 1, 2], max_concurrency=1),
+            fanout.map(inspect, [0, 1, 2, 4, 5, 6], max_concurrency=3),
+        )
+        assert results == [[0, 1, 2], [0, 1, 2, 4, 5, 6]]
+        assert fanout.stats.calls == 9
+        assert fanout.stats.max_in_flight == 4
+
+    async def test_map_skip(self):
+        fanout = FanOut(max_concurrency=4)
+        results = await fanout.map(inspect, range(6), skip=lambda e: isinstance(e, KeyError))
+        assert results == [0, 1, 2, 4, 5]
+        assert fanout.stats.skipped == 1
+
+    async def test_map_on_error_skip(self):
+        fanout = FanOut(on_error='skip')
+        assert await fanout.map(inspect, range(5)) == [0, 1, 2, 4]
+
+    async def test_map_raise(self):
+        fanout = FanOut(max_concurrency=4)
+        with pytest.raises(KeyError):
+            await fanout.map(inspect, range(6))
+        assert fanout.stats.failed == 1
@@ -1,7 +1,7 @@
 import pytest
 import dockerxxx
 from typing import List
-from dockerxxx.api.containers import Container
+from dockerxxx.api.containers import Container, ContainerStatsSample
 from dockerxxx import AsyncDocker
 
 @pytest.mark.asyncio(scope="session")
@@ -42,13 +42,29 @@ class TestContainer:
         assert container.config.image == 'alpine'
         assert container.status == 'running'
         assert container.image == await docker.images.get('alpine')
+        assert container.config.labels == {}
         with pytest.raises(dockerxxx.errors.DockerException):
-            _ = container.config.labels
+            _ = container.config.env
 
         await container.kill()
         await container.remove()
         assert container_id not in [c.id for c in await docker.containers.list()]
 
+    async def test_list_sparse_reload(self, docker: AsyncDocker):
+        container_id = (await docker.containers.run(
+            "alpine", "sleep 300", detach=True, labels={'foo': 'bar'})).id
+        containers = await docker.containers.list(sparse=True, filters={'id': container_id})
+        assert len(containers) == 1
+
+        container = containers[0]
+        assert container.sparse
+        await container.reload()
+        assert not container.sparse
+        assert container.config.labels == {'foo': 'bar'}
+
+        await container.kill()
+        await container.remove()
+
     async def test_run_detach(self, docker: AsyncDocker):
         container = await docker.containers.run('alpine', 'sleep 300', detach=True)
         assert isinstance(container, Container)
@@ -149,6 +165,22 @@ class TestContainer:
                     'memory_stats', 'blkio_stats']:
             assert key in stats
 
+    async def test_stats_stream(self, docker: AsyncDocker):
+        container = await docker.containers.run("alpine", "sleep 100", detach=True)
+        try:
+            samples = []
+            async for sample in await container.stats(stream=True):
+                samples.append(sample)
+                if len(samples) == 2:
+                    break
+            assert isinstance(samples[0], ContainerStatsSample)
+            assert samples[1].read > samples[0].read
+            assert 0 < samples[1].memory_usage <= samples[1].memory_limit
+            assert samples[1].pids == 1
+        finally:
+            await container.kill()
+            await container.remove()
+
     async def test_remove(self, docker: AsyncDocker):
         container = await docker.containers.run("alpine", "echo hello", detach=True)
         #self.tmp_containers.append(container.id)
@@ -0,0 +1,497 @@
+import io
+import json
+import time
+import asyncio
+import tarfile
+import httpx
+import pytest
+from pydantic import ValidationError
+from dockerxxx import AsyncDocker
+from dockerxxx.errors import BuildError, DockerException, ImageLoadError
+from dockerxxx.api.archive import TarParser, tar_member
+from dockerxxx.api.build import DockerIgnore
+from dockerxxx.pool import PoolSettings
+from dockerxxx.testing import FakeEngine
+
+
+def test_tar_parser():
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w', format=tarfile.GNU_FORMAT) as tar:
+        for name, data in [('a' * 150, b'x' * 1000), ('empty', b''), ('b/' + 'c' * 200, b'y' * 513)]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    archive = buffer.getvalue() + tar_member('é' * 120, b'pax', mtime=0)
+
+    for chunk_size in (1, 100, 512, len(archive)):
+        parser, members = TarParser(), {}
+        for pos in range(0, len(archive), chunk_size):
+            for info, piece in parser.feed(archive[pos:pos + chunk_size]):
+                members[info.name] = members.get(info.name, b'') + bytes(piece)
+        assert parser.done
+        assert members == {'a' * 150: b'x' * 1000, 'empty': b'', 'b/' + 'c' * 200: b'y' * 513}
+
+
+def test_dockerignore():
+    ignore = DockerIgnore(['# comment', '', 'node_modules', '*.log', '!keep.log', '**/*.tmp', '/build/', 'docs/**/*.md'])
+    assert ignore.excluded('node_modules')
+    assert ignore.excluded('node_modules/left-pad/index.js')
+    assert not ignore.excluded('src/node_modules')
+    assert ignore.excluded('debug.log')
+    assert not ignore.excluded('keep.log')
+    assert not ignore.excluded('src/debug.log')
+    assert ignore.excluded('a.tmp') and ignore.excluded('src/deep/b.tmp')
+    assert ignore.excluded('build/out.o')
+    assert ignore.excluded('docs/README.md') and ignore.excluded('docs/api/v1/index.md')
+    assert not ignore.excluded('docs/logo.png')
+    assert ignore.has_exclusions and not DockerIgnore(['*.log']).has_exclusions
+
+
+@pytest.mark.asyncio
+class TestFakeEngine:
+    async def test_system(self, fake_docker: AsyncDocker):
+        assert await fake_docker.ping() == 'OK'
+        assert (await fake_docker.daemon_version()).api_version == '1.43'
+
+    async def test_list_and_inspect(self, fake_docker: AsyncDocker, fake_engine: FakeEngine):
+        containers = await fake_docker.containers.list()
+        assert len(containers) == fake_engine.containers
+        assert not containers[0].sparse
+
+        container = await fake_docker.containers.get('container3')
+        assert container.name == 'container3'
+        assert container == await fake_docker.containers.get(container.id)
+
+        assert len(await fake_docker.images.list()) == fake_engine.images
+        assert len(await fake_docker.networks.list()) == fake_engine.networks
+        assert len(await fake_docker.volumes.list()) == fake_engine.volumes
+
+    async def test_list_sparse_labels(self, fake_docker: AsyncDocker):
+        container = (await fake_docker.containers.list(sparse=True))[0]
+        assert container.sparse and container.config.sparse
+
+        # labels come with the summary, the rest of the config needs a reload
+        labels = container.config.labels
+        assert 'com.example.index' in labels
+        with pytest.raises(DockerException):
+            _ = container.config.env
+
+        await container.reload()
+        assert container.config.labels == labels
+
+    async def test_missing(self, fake_docker: AsyncDocker):
+        containers = await fake_docker.containers.list(sparse=True)
+        await containers[0].remove()
+
+        assert len(await fake_docker.containers.list(ignore_removed=True)) == len(containers) - 1
+        with pytest.raises(Exception):
+            await containers[0].reload()
+
+        # the reload's error reaches the caller of attach, not an unbound stream
+        with pytest.raises(httpx.HTTPStatusError):
+            await containers[0].attach()
+
+    async def test_cache_copies(self, fake_docker: AsyncDocker):
+        await fake_docker.enable_cache()
+        first = await fake_docker.containers.get('container0')
+        first.config.labels['mutated'] = 'yes'
+        first.config.env.append('MUTATED=yes')
+
+        second = await fake_docker.containers.get('container0')
+        assert 'mutated' not in second.config.labels and 'MUTATED=yes' not in second.config.env
+        assert second.config is not first.config
+        assert second.transport is first.transport
+        await fake_docker.disable_cache()
+
+    async def test_pool(self, fake_engine: FakeEngine):
+        fake_engine.latency = 0.02
+        docker = AsyncDocker(base_url=fake_engine.url, pool=PoolSettings(max_connections=2, max_keepalive_connections=2))
+
+        await asyncio.gather(*[docker.ping() for _ in range(10)])
+        stats = docker.pool_stats
+        assert (stats.requests, stats.failed, stats.waiting, stats.in_flight) == (10, 0, 0, 0)
+        assert stats.max_in_flight == 2 and stats.connects == 2
+        # every request waits for a connection, the last ones for the 2 connections to serve 4 others first
+        assert stats.max_waiting == 10
+        assert 0.08 < stats.max_wait < stats.total_time
+        assert (stats.connections, stats.idle_connections) == (2, 2)
+
+        # streams hold their connection until read or closed
+        async with docker.transport.client.stream('GET', '/_ping'):
+            assert docker.pool_stats.in_flight == 1
+        assert docker.pool_stats.in_flight == 0
+        await docker.aclose()
+
+    async def test_pool_timeouts(self, fake_engine: FakeEngine):
+        fake_engine.latency = 0.2
+        docker = AsyncDocker(base_url=fake_engine.url, timeout=5, pool=PoolSettings(read_timeout=0.05))
+        assert docker.transport.client.timeout == httpx.Timeout(5, read=0.05)
+        with pytest.raises(httpx.ReadTimeout):
+            await docker.ping()
+        assert docker.pool_stats.failed == 1
+        await docker.aclose()
+
+        docker = AsyncDocker(base_url=fake_engine.url, pool=PoolSettings(max_connections=1, pool_timeout=0.05))
+        pings = [asyncio.create_task(docker.ping()) for _ in range(2)]
+        with pytest.raises(httpx.PoolTimeout):
+            await asyncio.gather(*pings)
+        assert docker.pool_stats.failed == 1
+
+        # gather doesn't cancel the ping still holding the connection
+        for ping in pings:
+            ping.cancel()
+        await asyncio.gather(*pings, return_exceptions=True)
+        await docker.aclose()
+
+    async def test_stream_lane(self, fake_engine: FakeEngine):
+        fake_engine.wait_delay = 1
+        docker = AsyncDocker(base_url=fake_engine.url, pool=PoolSettings(max_connections=2, pool_timeout=0.5))
+        assert docker.transport.stream_client.timeout.read is None
+
+        containers = await docker.containers.list()
+        waits = [asyncio.create_task(container.wait()) for container in containers * 10]
+        await asyncio.sleep(0.2)
+        assert docker.stream_pool_stats.in_flight == len(waits)
+
+        # waits hold their connections in the stream lane, API calls don't queue behind them
+        started = time.perf_counter()
+        assert await asyncio.gather(*[docker.ping() for _ in range(10)]) == ['OK'] * 10
+        assert time.perf_counter() - started < 0.5
+        assert docker.pool_stats.max_in_flight == 2 and docker.pool_stats.failed == 0
+
+        assert all(r.status_code == 0 for r in await asyncio.gather(*waits))
+        assert docker.stream_pool_stats.requests == len(waits)
+        await docker.aclose()
+
+    @pytest.mark.parametrize('decode_mode', ['json', 'validate'])
+    async def test_decode_modes(self, fake_engine: FakeEngine, decode_mode: str):
+        docker = AsyncDocker(base_url=fake_engine.url, decode_mode=decode_mode)
+        assert docker.transport.decode_mode == decode_mode
+
+        container = await docker.containers.get('container0')
+        assert container.config.image == 'fake/image0:latest'
+        assert container.state.status.value == 'running'
+        assert container.network_settings.networks['bridge'].gateway == '172.17.0.1'
+        assert (await docker.info()).containers == fake_engine.containers
+
+        async def bad_inspect(request, reply, ref):
+            await reply.send_json({'Id': 1234})
+
+        fake_engine.route('GET', r'/containers/(?P<ref>[^/]+)/json', bad_inspect)
+        with pytest.raises(ValidationError):
+            await docker.containers.get('container0')
+        await docker.aclose()
+
+    async def test_logs(self, fake_docker: AsyncDocker, fake_engine: FakeEngine):
+        container = await fake_docker.containers.get('container0')
+
+        lines = [line async for line in await container.logs(stream=True)]
+        assert len(lines) == fake_engine.log_lines
+        assert lines[0] == b'log line 0 from container0\n'
+        assert b''.join(lines) == await container.logs()
+
+        assert len([line async for line in await container.logs(stream=True, stderr=False)]) == fake_engine.log_lines
+
+    async def test_exec(self, fake_docker: AsyncDocker, fake_engine: FakeEngine):
+        fake_engine.exec_output = 100_000
+        fake_engine.exit_code = 3
+        container = await fake_docker.containers.get('container0')
+
+        result = await container.exec_run('cat big.txt', stderr=False)
+        assert result.exit_code == 3
+        assert len(result.output) == 100_000
+
+    async def test_exec_stream(self, fake_docker: AsyncDocker, fake_engine: FakeEngine):
+        fake_engine.exec_output = 200_000
+        fake_engine.exit_code = 1
+        container = await fake_docker.containers.get('container0')
+
+        output = await container.exec_run('cat big.txt', stream=True)
+        assert output.exit_code is None
+        chunks = [chunk async for chunk in output]
+        assert len(chunks) > 1
+        assert b''.join(chunks) == b'hello world\n' * 16666 + b'hello world\n'[:8] + b'done\n'
+        assert output.exit_code == 1
+
+        output = await container.exec_run('cat big.txt', stream=True, demux=True)
+        chunks = [chunk async for chunk in output]
+        assert sum(len(out) for out, _ in chunks if out) == 200_000
+        assert [err for _, err in chunks if err] == [b'done\n']
+
+        output = await container.exec_run('cat big.txt', stream=True)
+        assert len(await anext(output)) > 0
+        await output.aclose()
+
+    async def test_exec_demux(self, fake_docker: AsyncDocker, fake_engine: FakeEngine):
+        container = await fake_docker.containers.get('container0')
+
+        result = await container.exec_run('echo hello world', demux=True)
+        assert result.output == (b'hello world\n', b'done\n')
+
+        result = await container.exec_run('echo hello world', demux=True, stderr=False)
+        assert result.output == (b'hello world\n', None)
+
+    async def test_exec_socket(self, fake_docker: AsyncDocker):
+        container = await fake_docker.containers.get('container0')
+        payload = bytes(range(256)) * 40_000
+
+        sock = await container.exec_run('cat', stdin=True, socket=True)
+        assert await sock.communicate(payload) == payload
+        assert sock.exit_code == 0
+
+        async def chunks():
+            for n in range(10):
+                yield b'%d\n' % n
+
+        sock = await container.exec_run('cat', stdin=True, socket=True, demux=True)
+        reader = asyncio.ensure_future(sock.read())
+        await sock.send(chunks())
+        await sock.write_eof()
+        assert await reader == (b''.join([b'%d\n' % n for n in range(10)]), None)
+
+    async def test_archive(self, fake_docker: AsyncDocker, fake_engine: FakeEngine):
+        container = await fake_docker.containers.get('container0')
+
+        stat = await container.stat_archive('/data/blob')
+        assert stat.name == 'blob'
+        assert stat.size == fake_engine.archive_size
+        assert not stat.is_dir
+        assert (await container.stat_archive('/etc')).is_dir
+
+        archive, stat = await container.get_archive('/data/blob', chunk_size=4096)
+        assert stat.size == fake_engine.archive_size
+        sizes = [len(chunk) async for chunk in archive]
+        assert max(sizes) <= 4096
+        assert sum(sizes) > fake_engine.archive_size
+
+        archive, _ = await container.get_archive('/etc')
+        buffer = io.BytesIO()
+        await archive.write_to(buffer)
+        buffer.seek(0)
+        with tarfile.open(fileobj=buffer) as tar:
+            assert sorted(tar.getnames()) == ['etc', 'etc/hostname', 'etc/os-release']
+            assert tar.getmember('etc/os-release').issym()
+
+        with pytest.raises(Exception):
+            await container.get_archive('/nope')
+
+    async def test_put_archive(self, fake_docker: AsyncDocker):
+        container = await fake_docker.containers.get('container0')
+
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w') as tar:
+            info = tarfile.TarInfo('app.conf')
+            info.size = 6
+            tar.addfile(info, io.BytesIO(b'debug\n'))
+
+        async def chunks():
+            data = buffer.getvalue()
+            for pos in range(0, len(data), 1000):
+                yield data[pos:pos + 1000]
+
+        assert await container.put_archive('/etc', chunks())
+        assert (await container.stat_archive('/etc/app.conf')).size == 6
+
+        buffer.seek(0)
+        assert await container.put_archive('/data', buffer)
+        assert (await container.stat_archive('/data/app.conf')).size == 6
+
+    async def test_cache_invalidation(self, fake_docker: AsyncDocker):
+        cache = await fake_docker.enable_cache()
+        # leave invalidation to the response hooks, not to the /events watcher
+        cache._watcher.cancel()
+
+        container = await fake_docker.containers.get('container0')
+        assert cache.get('container', container.id) is not None
+
+        # api lane
+        await container.stop()
+        assert cache.get('container', container.id) is None
+
+        # stream lane
+        await fake_docker.containers.get('container0')
+        await container.restart()
+        assert cache.get('container', container.id) is None
+
+        await fake_docker.containers.get('container0')
+        assert await container.put_archive('/data', b'\0' * 1024)
+        assert cache.get('container', container.id) is None
+        await fake_docker.disable_cache()
+
+    @pytest.mark.parametrize('http', ['httpx', 'lean'])
+    async def test_slow_upload(self, fake_engine: FakeEngine, http: str):
+        docker = AsyncDocker(base_url=fake_engine.url, timeout=1, http=http)
+        container = await docker.containers.get('container0')
+
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w') as tar:
+            info = tarfile.TarInfo('app.conf')
+            info.size = 6
+            tar.addfile(info, io.BytesIO(b'debug\n'))
+
+        async def chunks():
+            # each write is quick, the whole upload outlasts the write timeout
+            data = buffer.getvalue()
+            for pos in range(0, len(data), len(data) // 3):
+                await asyncio.sleep(0.5)
+                yield data[pos:pos + len(data) // 3]
+
+        assert await container.put_archive('/etc', chunks())
+        assert (await container.stat_archive('/etc/app.conf')).size == 6
+        await docker.aclose()
+
+    async def test_read_write_file(self, fake_docker: AsyncDocker, fake_engine: FakeEngine):
+        container = await fake_docker.containers.get('container0')
+
+        requests = fake_engine.requests
+        assert await container.read_file('/data/blob') == (bytes(range(256)) * 4096)[:fake_engine.archive_size]
+        assert fake_engine.requests == requests + 1
+        assert await container.read_file('/etc/os-release') == b'NAME="Fake Linux"\nID=fake\nVERSION_ID=1.0\n'
+
+        assert await container.write_file('/data/app.conf', 'debug\n', mode=0o600)
+        assert await container.read_file('/data/app.conf') == b'debug\n'
+        assert (await container.stat_archive('/data/app.conf')).permissions == 0o600
+        assert await container.write_file('/data/' + 'long' * 50, b'')
+        assert await container.read_file('/data/' + 'long' * 50) == b''
+
+        with pytest.raises(DockerException):
+            await container.read_file('/etc')
+        with pytest.raises(httpx.HTTPStatusError):
+            await container.read_file('/nope')
+
+    async def test_export(self, fake_docker: AsyncDocker, fake_engine: FakeEngine, tmp_path):
+        container = await fake_docker.containers.get('container0')
+
+        written = await (await container.export(chunk_size=8192)).save(tmp_path / 'rootfs.tar')
+        assert written == (tmp_path / 'rootfs.tar').stat().st_size
+        with tarfile.open(tmp_path / 'rootfs.tar') as tar:
+            assert tar.getmember('data/blob').size == fake_engine.archive_size
+            assert 'etc/hostname' in tar.getnames()
+
+        with open(tmp_path / 'fd.tar', 'wb') as f:
+            assert await (await container.export()).save(f.fileno()) == written
+
+    async def test_pull(self, fake_docker: AsyncDocker, fake_engine: FakeEngine):
+        fake_engine.pull_delay = 0.01
+
+        images = await asyncio.gather(*[fake_docker.images.pull('fake/nginx:latest') for _ in range(10)])
+        assert fake_engine.pulls == 1
+        assert fake_docker.pulls.coalesced == 9
+        assert len(fake_docker.pulls) == 0
+        assert all(image == images[0] for image in images)
+        assert images[0].repo_tags == ['fake/nginx:latest']
+
+        watcher = fake_docker.images.pull_progress('fake/redis')
+        first = await watcher.__anext__()
+        image = await fake_docker.images.pull('fake/redis', tag='latest')
+        updates = [first] + [progress async for progress in watcher]
+        assert fake_engine.pulls == 2
+        assert image.repo_tags == ['fake/redis:latest']
+        assert updates[-1].done
+        assert updates[-1].current == updates[-1].total == fake_engine.pull_layers * fake_engine.pull_layer_size
+        assert updates[-1].digest.startswith('sha256:')
+
+        with pytest.raises(DockerException, match='connection reset'):
+            await fake_docker.images.pull('fake/broken')
+
+        calls = fake_docker.fanout.stats.calls
+        images = await fake_docker.images.pull_many(
+            [f"fake/app{n}" for n in range(6)] + ['fake/app0'], concurrency=2
+        )
+        assert fake_docker.fanout.stats.calls == calls + 7
+        assert [image.repo_tags[0] for image in images] == [f"fake/app{n}:latest" for n in range(6)] + ['fake/app0:latest']
+        assert fake_engine.pulls == 3 + 6 + 1
+
+    @pytest.mark.parametrize('gzip', [False, True])
+    async def test_build(self, fake_docker: AsyncDocker, fake_engine: FakeEngine, tmp_path, gzip: bool):
+        (tmp_path / 'Dockerfile').write_text("FROM fake/image0\n# comment\nCOPY . /app\n")
+        (tmp_path / '.dockerignore').write_text("node_modules\n*.log\n!keep.log\nDockerfile\n")
+        (tmp_path / 'node_modules' / 'dep').mkdir(parents=True)
+        (tmp_path / 'node_modules' / 'dep' / 'index.js').write_text('')
+        (tmp_path / 'src').mkdir()
+        (tmp_path / 'src' / 'app.py').write_bytes(b'x' * 3_000_000)
+        (tmp_path / 'debug.log').write_text('')
+        (tmp_path / 'keep.log').write_text('')
+
+        image, build_log = await fake_docker.images.build(path=str(tmp_path), tag='fake/app:1', gzip=gzip)
+        assert image.repo_tags == ['fake/app:1']
+        assert [message.stream for message in build_log[:3:2]] == ["Step 1/2 : FROM fake/image0\n", "Step 2/2 : COPY . /app\n"]
+        context = fake_engine.build_contexts[-1]
+        assert context['names'] == ['.dockerignore', 'Dockerfile', 'keep.log', 'src', 'src/app.py']
+        assert context['encoding'] == ('gzip' if gzip else None)
+        assert (context['size'] < 100_000) == gzip
+
+        messages = [message async for message in await fake_docker.images.build(path=str(tmp_path), stream=True)]
+        assert messages[-1].stream.startswith('Successfully built')
+
+        image, _ = await fake_docker.images.build(fileobj=io.BytesIO(b'FROM scratch\n'))
+        assert fake_engine.build_contexts[-1]['names'] == ['Dockerfile']
+
+        with pytest.raises(BuildError, match='Cannot locate'):
+            await fake_docker.images.build(path=str(tmp_path), dockerfile='Containerfile')
+
+    async def test_save_load(self, fake_docker: AsyncDocker, fake_engine: FakeEngine, tmp_path):
+        image = await fake_docker.images.get('fake/image0:latest')
+        size = await (await image.save(named=True)).save(tmp_path / 'image0.tar')
+        with tarfile.open(tmp_path / 'image0.tar') as tar:
+            manifest = json.load(tar.extractfile('manifest.json'))
+            assert manifest[0]['RepoTags'] == ['fake/image0:latest']
+            assert len([name for name in tar.getnames() if name.endswith('layer.tar')]) == 2
+
+        # the base layer shared by both images is in the tarball once
+        archive = await fake_docker.images.save(['fake/image0:latest', await fake_docker.images.get('fake/image1:latest')])
+        both = io.BytesIO()
+        await archive.write_to(both)
+        assert len(both.getvalue()) < 2 * size
+        with tarfile.open(fileobj=io.BytesIO(both.getvalue())) as tar:
+            assert len([name for name in tar.getnames() if name.endswith('layer.tar')]) == 3
+
+        images = await fake_docker.images.load(tmp_path / 'image0.tar')
+        assert images == [image]
+
+        async def chunks():
+            for pos in range(0, len(both.getvalue()), 100_000):
+                yield both.getvalue()[pos:pos + 100_000]
+
+        messages = [message async for message in await fake_docker.images.load(chunks(), stream=True)]
+        assert [message.progress_detail.total for message in messages if message.status == 'Loading layer'] == \
+            [fake_engine.archive_size] * 3
+        assert messages[-1].stream.startswith('Loaded image ID: sha256:')
+
+        with open(tmp_path / 'image0.tar', 'rb') as f:
+            assert await fake_docker.images.load(f, quiet=True) == [image]
+
+        with pytest.raises(ImageLoadError):
+            await fake_docker.images.load(b'\0' * 1024)
+
+    async def test_stats(self, fake_docker: AsyncDocker, fake_engine: FakeEngine):
+        container = await fake_docker.containers.get('container0')
+
+        samples = [sample async for sample in await container.stats(stream=True)]
+        assert len(samples) == fake_engine.stats_samples
+        assert samples[-1].cpu_percent == 4.0
+
+    async def test_events(self, fake_docker: AsyncDocker, fake_engine: FakeEngine):
+        fake_engine.event_burst = 10
+        events = [event async for event in fake_docker.events(until='0')]
+        assert len(events) == 10
+
+        fake_engine.event_burst = 0
+        container = await fake_docker.containers.get('container1')
+        stream = fake_docker.events()
+        next_event = asyncio.ensure_future(anext(stream))
+        while not fake_engine.subscribers:
+            await asyncio.sleep(0.01)
+
+        await container.stop()
+        event = await next_event
+        assert event.action == 'stop'
+        assert event.actor.id.startswith(container.id)
+        await stream.aclose()
+
+    async def test_latency(self):
+        async with FakeEngine(containers=0, latency=0.05) as engine:
+            async with AsyncDocker(base_url=engine.url) as docker:
+                start = time.perf_counter()
+                await docker.ping()
+                assert time.perf_counter() - start >= 0.05
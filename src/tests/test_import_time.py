@@ -0,0 +1,30 @@
+import os
+import sys
+import subprocess
+
+# Wall clock budget for a cold "import dockerxxx", override on slow CI runners
+IMPORT_BUDGET = float(os.environ.get("DOCKERXXX_IMPORT_BUDGET", 0.75))
+
+def run_python(code: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+def test_import_time_budget():
+    elapsed = min(
+        float(run_python(
+            "import time; start = time.perf_counter(); import dockerxxx; "
+            "print(time.perf_counter() - start)"
+        ))
+        for _ in range(3)
+    )
+    assert elapsed < IMPORT_BUDGET, f"import dockerxxx took {elapsed:.3f}s (budget {IMPORT_BUDGET}s)"
+
+def test_import_defers_models():
+    built = run_python(
+        "import sys, dockerxxx; from dockerxxx import models; "
+        "print(sum(getattr(m, '__pydantic_complete__', False) for m in vars(models).values()), "
+        "'asyncssh' in sys.modules)"
+    )
+    assert built == "0 False"
@@ -0,0 +1,124 @@
+import pytest
+from dockerxxx import Docker
+from dockerxxx.errors import DockerException
+from dockerxxx.sync import SyncProxy, run_sync
+from dockerxxx.testing import FakeEngine
+
+
+@pytest.fixture
+def engine():
+    with FakeEngine(exec_output=100_000, event_burst=5).threaded() as engine:
+        yield engine
+
+
+@pytest.fixture
+def docker(engine: FakeEngine):
+    docker = Docker(base_url=engine.url)
+    yield docker
+    docker.close()
+
+
+class TestSyncDocker:
+    def test_system(self, docker: Docker):
+        assert docker.ping() == 'OK'
+        assert docker.daemon_version().api_version == '1.43'
+        assert docker.fanout.max_concurrency == 1
+        assert docker.pool_stats.requests == 2 and docker.pool_stats.connections == 1
+
+    def test_containers(self, docker: Docker, engine: FakeEngine):
+        containers = docker.containers.list()
+        assert len(containers) == engine.containers
+        assert isinstance(containers[0], SyncProxy)
+
+        container = docker.containers.get('container2')
+        assert container.name == 'container2'
+        assert container == containers[2]
+
+        container.stop()
+        container.reload()
+        assert container.status == 'exited'
+
+        sparse = docker.containers.list(all=True, sparse=True)
+        assert sparse[0].sparse
+
+    def test_logs_exec_stats(self, docker: Docker, engine: FakeEngine):
+        container = docker.containers.get('container0')
+
+        lines = list(container.logs(stream=True))
+        assert len(lines) == engine.log_lines
+        assert b''.join(lines) == container.logs()
+
+        result = container.exec_run('cat big.txt', stderr=False)
+        assert result.exit_code == 0
+        assert len(result.output) == 100_000
+
+        output = container.exec_run('cat big.txt', stream=True, demux=True)
+        assert sum(len(out) for out, _ in output if out) == 100_000
+        assert output.exit_code == 0
+
+        sock = container.exec_run('cat', stdin=True, socket=True)
+        sock.send(b'hello')
+        sock.write_eof()
+        assert b''.join(sock) == b'hello'
+        assert sock.exit_code == 0
+
+        assert len(list(container.stats(stream=True))) == engine.stats_samples
+
+    def test_archive(self, docker: Docker, engine: FakeEngine, tmp_path):
+        container = docker.containers.get('container0')
+
+        archive, stat = container.get_archive('/data/blob')
+        assert stat.size == engine.archive_size
+        data = b''.join(archive)
+        assert container.put_archive('/etc', data)
+        assert container.stat_archive('/etc/blob').size == engine.archive_size
+
+        assert container.write_file('/etc/app.conf', b'debug\n')
+        assert container.read_file('/etc/app.conf') == b'debug\n'
+
+        written = container.export().save(str(tmp_path / 'rootfs.tar'))
+        assert written == (tmp_path / 'rootfs.tar').stat().st_size > engine.archive_size
+
+    def test_build(self, docker: Docker, engine: FakeEngine, tmp_path):
+        (tmp_path / 'Dockerfile').write_text("FROM fake/image0\n")
+        image, build_log = docker.images.build(path=str(tmp_path), tag='fake/app', gzip=True)
+        assert image.repo_tags == ['fake/app']
+        assert engine.build_contexts[-1]['names'] == ['Dockerfile']
+        assert [message.stream for message in docker.images.build(path=str(tmp_path), stream=True)][0] == \
+            "Step 1/1 : FROM fake/image0\n"
+
+    def test_save_load(self, docker: Docker, tmp_path):
+        image = docker.images.get('fake/image0:latest')
+        image.save(named=True).save(str(tmp_path / 'image0.tar'))
+        assert docker.images.load(str(tmp_path / 'image0.tar')) == [image]
+
+    def test_collections(self, docker: Docker, engine: FakeEngine):
+        assert len(docker.images.list()) == engine.images
+        assert len(docker.networks.list()) == engine.networks
+        assert len(docker.volumes.list()) == engine.volumes
+        assert len(list(docker.events(until='1'))) == 5
+
+        assert docker.images.pull('fake/nginx').repo_tags == ['fake/nginx:latest']
+        assert [image.repo_tags[0] for image in docker.images.pull_many(['fake/a', 'fake/b'])] == \
+            ['fake/a:latest', 'fake/b:latest']
+        progress = list(docker.images.pull_progress('fake/c'))
+        assert progress[-1].done and progress[-1].current == engine.pull_layers * engine.pull_layer_size
+
+    def test_suspending_coroutine(self):
+        class Suspend:
+            def __await__(self):
+                yield
+
+        async def suspends():
+            await Suspend()
+
+        with pytest.raises(DockerException):
+            run_sync(suspends())
+
+    @pytest.mark.parametrize('options', [
+        {'base_url': 'unix:///var/run/docker.sock', 'http': 'lean'},
+        {'base_url': 'ssh://user@host'},
+    ])
+    def test_unsupported_transport(self, options):
+        with pytest.raises(DockerException, match="synchronous client does not support"):
+            Docker(**options)
@@ -0,0 +1,79 @@
+import ssl
+import httpx
+import pytest
+import pytest_asyncio
+from dockerxxx import AsyncDocker
+from dockerxxx.testing import FakeEngine
+from dockerxxx.tls import tls_context
+from .helpers import write_tls_files
+
+
+@pytest_asyncio.fixture
+async def mtls_engine(serve_tcp, tmp_path):
+    """
+    The fake engine behind TLS requiring a client certificate signed by the test CA, and
+    the DOCKER_CERT_PATH to reach it
+    """
+
+    write_tls_files(tmp_path)
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH, cafile=tmp_path / 'ca.pem')
+    context.load_cert_chain(tmp_path / 'server-cert.pem', tmp_path / 'server-key.pem')
+    context.verify_mode = ssl.CERT_REQUIRED
+    return await serve_tcp(context), tmp_path
+
+
+@pytest.mark.asyncio
+class TestTls:
+    async def test_client_certificate(self, mtls_engine, fake_engine: FakeEngine):
+        port, cert_path = mtls_engine
+        docker = AsyncDocker(base_url=f"https://127.0.0.1:{port}", cert_path=cert_path)
+        assert len(await docker.containers.list()) == fake_engine.containers
+
+        container = await docker.containers.get('container0')
+        result = await container.exec_run('echo hello')
+        assert result.exit_code == 0
+        await docker.aclose()
+
+    async def test_no_client_certificate(self, mtls_engine, tmp_path_factory):
+        port, cert_path = mtls_engine
+        ca_only = tmp_path_factory.mktemp('ca-only')
+        (ca_only / 'ca.pem').write_bytes((cert_path / 'ca.pem').read_bytes())
+
+        docker = AsyncDocker(base_url=f"https://127.0.0.1:{port}", cert_path=ca_only)
+        with pytest.raises(httpx.HTTPError):
+            await docker.ping()
+        await docker.aclose()
+
+    async def test_session_resumption(self, mtls_engine):
+        port, cert_path = mtls_engine
+        context = tls_context(cert_path, True)
+
+        first = AsyncDocker(base_url=f"https://127.0.0.1:{port}", cert_path=cert_path)
+        assert await first.ping() == 'OK'
+        assert (context.handshakes, context.resumed) == (1, 0)
+        assert ('127.0.0.1', port) in context.sessions
+        await first.aclose()
+
+        # another client, and connection, for the same daemon shares the context and resumes
+        second = AsyncDocker(base_url=f"https://127.0.0.1:{port}", cert_path=cert_path)
+        assert await second.ping() == 'OK'
+        assert (context.handshakes, context.resumed) == (2, 1)
+        await second.aclose()
+
+    async def test_session_per_port(self, serve_tcp, tmp_path):
+        write_tls_files(tmp_path)
+        server = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server.load_cert_chain(tmp_path / 'server-cert.pem', tmp_path / 'server-key.pem')
+        ports = [await serve_tcp(server), await serve_tcp(server)]
+        context = tls_context(tmp_path, True)
+
+        # daemons on the same host but different ports don't offer each other's sessions
+        for port in ports:
+            async with AsyncDocker(base_url=f"https://127.0.0.1:{port}", cert_path=tmp_path) as docker:
+                assert await docker.ping() == 'OK'
+        assert (context.handshakes, context.resumed) == (2, 0)
+        assert set(context.sessions) == {('127.0.0.1', port) for port in ports}
+
+        async with AsyncDocker(base_url=f"https://127.0.0.1:{ports[1]}", cert_path=tmp_path) as docker:
+            assert await docker.ping() == 'OK'
+        assert (context.handshakes, context.resumed) == (3, 1)
@@ -0,0 +1,104 @@
+import httpx
+import asyncio
+import pytest
+import pytest_asyncio
+from dockerxxx import AsyncDocker
+from dockerxxx.errors import DockerException
+from dockerxxx.pool import PoolSettings
+from dockerxxx.testing import FakeEngine
+from dockerxxx.uds import UdsClient
+
+
+@pytest_asyncio.fixture
+async def lean_docker(fake_engine: FakeEngine):
+    docker = AsyncDocker(base_url=fake_engine.url, http='lean')
+    yield docker
+    await docker.aclose()
+
+
+@pytest.mark.asyncio
+class TestUds:
+    async def test_keep_alive(self, lean_docker: AsyncDocker, fake_engine: FakeEngine):
+        assert isinstance(lean_docker.transport.client, UdsClient)
+        for _ in range(5):
+            assert await lean_docker.ping() == 'OK'
+        await lean_docker.containers.get('container0')
+
+        stats = lean_docker.pool_stats
+        assert (stats.requests, stats.connects, stats.in_flight) == (6, 1, 0)
+        assert (stats.connections, stats.idle_connections) == (1, 1)
+
+    async def test_daemon_closed_connection(self, lean_docker: AsyncDocker, fake_engine: FakeEngine):
+        assert await lean_docker.ping() == 'OK'
+        for writer in list(fake_engine._connections):
+            writer.close()
+        await asyncio.sleep(0.05)
+
+        # the idle connection is dropped, the request goes out on a new one
+        assert await lean_docker.ping() == 'OK'
+        assert lean_docker.pool_stats.connects == 2
+
+    async def test_errors(self, lean_docker: AsyncDocker):
+        with pytest.raises(httpx.HTTPStatusError) as e:
+            await lean_docker.transport.client.get('/containers/missing/json')
+        assert e.value.response.status_code == 404
+        assert 'message' in e.value.response.json()
+
+        # the connection went back to the pool with the error's body read
+        assert await lean_docker.ping() == 'OK'
+        assert lean_docker.pool_stats.connects == 1
+
+    async def test_request(self, lean_docker: AsyncDocker):
+        client = lean_docker.transport.client
+        request = client.build_request('GET', '/containers/json', params={'all': True, 'limit': None, 'id': ['a', 'b']})
+        assert request.target == '/containers/json?all=true&limit=&id=a&id=b'
+        assert request.url == httpx.URL('http://docker/containers/json?all=true&limit=&id=a&id=b')
+
+        response = await client.head('/_ping')
+        assert response.status_code == 200 and response.content == b''
+
+    async def test_abandoned_stream(self, lean_docker: AsyncDocker):
+        container = await lean_docker.containers.get('container0')
+        logs = await container.logs(stream=True, follow=True)
+        async for _ in logs:
+            break
+        await logs.aclose()
+
+        # the stream's connection is closed rather than reused in the middle of the body
+        stats = lean_docker.stream_pool_stats
+        assert (stats.in_flight, stats.connections) == (0, 0)
+
+    async def test_pool_timeout(self, fake_engine: FakeEngine):
+        fake_engine.latency = 0.2
+        docker = AsyncDocker(base_url=fake_engine.url, http='lean',
+                             pool=PoolSettings(max_connections=1, pool_timeout=0.05))
+        pings = [asyncio.create_task(docker.ping()) for _ in range(2)]
+        with pytest.raises(httpx.PoolTimeout):
+            await asyncio.gather(*pings)
+        assert docker.pool_stats.failed == 1
+
+        # gather doesn't cancel the ping still holding the connection
+        for ping in pings:
+            ping.cancel()
+        await asyncio.gather(*pings, return_exceptions=True)
+        await docker.aclose()
+
+    async def test_connect_error(self, tmp_path):
+        docker = AsyncDocker(base_url=f"unix://{tmp_path}/missing.sock", http='lean', pool=PoolSettings(retries=0))
+        with pytest.raises(httpx.ConnectError):
+            await docker.ping()
+        await docker.aclose()
+
+    async def test_cache(self, lean_docker: AsyncDocker):
+        cache = await lean_docker.enable_cache()
+        container = await lean_docker.containers.get('container0')
+        await lean_docker.containers.get('container0')
+        assert cache.stats.hits == 1
+
+        # writes through the client invalidate what they touch
+        await container.stop()
+        assert cache.get('container', container.id) is None
+
+    async def test_lean_requires_unix(self):
+        with pytest.raises(DockerException):
+            AsyncDocker(base_url="tcp://127.0.0.1:2375", http='lean')
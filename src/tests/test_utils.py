@@ -0,0 +1,55 @@
+import json
+import struct
+from dockerxxx.utils import JSONStreamDecoder, FrameDemuxer, demux_buffer, STDOUT, STDERR
+
+def frame(stream, data):
+    return struct.pack('>BxxxL', stream, len(data)) + data
+
+def decode(chunks):
+    decoder = JSONStreamDecoder()
+    documents = [json.loads(doc) for chunk in chunks for doc in decoder.feed(chunk)]
+    return documents + [json.loads(doc) for doc in decoder.flush()]
+
+class TestJSONStreamDecoder:
+    def test_one_document_per_chunk(self):
+        assert decode([b'{"a": 1}\n', b'{"b": 2}\n']) == [{'a': 1}, {'b': 2}]
+
+    def test_several_documents_per_chunk(self):
+        assert decode([b'{"a": 1}\n{"b": 2}\n{"c"', b': 3}\n']) == [{'a': 1}, {'b': 2}, {'c': 3}]
+
+    def test_document_split_across_chunks(self):
+        stream = b'{"status": "Downloading", "progressDetail": {"current": 1}}\n'
+        assert decode([stream[i:i + 3] for i in range(0, len(stream), 3)]) == [json.loads(stream)]
+
+    def test_unterminated_tail(self):
+        assert decode([b'{"a": 1}\n{"b"', b': 2}']) == [{'a': 1}, {'b': 2}]
+
+    def test_blank_lines(self):
+        assert decode([b'\n{"a": 1}\r\n', b'\n']) == [{'a': 1}]
+
+def demux(chunks, tty=False):
+    demuxer = FrameDemuxer(tty)
+    output = {STDOUT: b'', STDERR: b''}
+    for chunk in chunks:
+        for stream, data in demuxer.feed(chunk):
+            assert isinstance(data, memoryview)
+            output[stream] += data
+    return output[STDOUT], output[STDERR]
+
+class TestFrameDemuxer:
+    stream = frame(STDOUT, b'hello\n') + frame(STDERR, b'oops\n') + frame(STDOUT, b'') + frame(STDOUT, b'world\n')
+
+    def test_whole_buffer(self):
+        assert demux([self.stream]) == (b'hello\nworld\n', b'oops\n')
+        assert demux_buffer(self.stream, False) == b'hello\noops\nworld\n'
+
+    def test_split_at_every_byte(self):
+        chunks = [self.stream[i:i + 1] for i in range(len(self.stream))]
+        assert demux(chunks) == (b'hello\nworld\n', b'oops\n')
+
+    def test_header_split_across_chunks(self):
+        chunks = [self.stream[:3], self.stream[3:17], self.stream[17:]]
+        assert demux(chunks) == (b'hello\nworld\n', b'oops\n')
+
+    def test_tty(self):
+        assert demux([b'hello ', b'world'], tty=True) == (b'hello world', b'')